@@ -1,21 +1,86 @@
+"""
+Параметры бота из переменных окружения
+
+Параметры читаются при первом обращении к ним (например, config.BOT_TOKEN),
+а не при импорте модуля: файл .env загружается один раз при первом таком
+обращении, отсутствие обязательной переменной обнаруживается только тогда,
+когда она действительно нужна.
+"""
 import os
 from sys import argv
+from typing import Any, Callable, Dict
+
+_environment_loaded = False
+
+
+def load_environment() -> None:
+    """Загрузить переменные окружения из файла .env (однократно)"""
+    global _environment_loaded
+    if not _environment_loaded:
+        from dotenv import load as load_dotenv
+        load_dotenv('../.env')
+        _environment_loaded = True
+
+
+def _required(name: str, message: str) -> Callable[[], str]:
+    def getter() -> str:
+        if name not in os.environ:
+            raise Exception(message)
+        return os.environ[name]
+    return getter
+
+
+def _optional(name: str, default: Any = None, cast: Callable[[str], Any] = str) -> Callable[[], Any]:
+    def getter() -> Any:
+        value = os.getenv(name)
+        return cast(value) if value else default
+    return getter
+
+
+def _webhook_host() -> str:
+    if ('WEBHOOK_HOST' not in os.environ) and ('--webhook' in argv):
+        raise Exception('WEBHOOK_HOST environment variable is missing')
+    return os.getenv('WEBHOOK_HOST')
+
+
+_SETTINGS: Dict[str, Callable[[], Any]] = {
+    'BOT_TOKEN': _required('TG_BOT_TOKEN', 'TG_TOKEN_BOT environment variable is missing'),
+    'API_KEY': _required('RAPID_API_KEY', 'RAPID_API_KEY environment variable is missing'),
+    'HOTELS_API_URL': _optional('HOTELS_API_URL', 'https://hotels4.p.rapidapi.com'),
+    'TELEGRAM_API_URL': _optional('TELEGRAM_API_URL'),
+    'DATABASE_PATH': _optional('DATABASE_PATH', 'main.db'),
+    'HISTORY_MAX_ROWS_PER_USER': _optional('HISTORY_MAX_ROWS_PER_USER', 100, int),
+    'HISTORY_MAX_AGE_DAYS': _optional('HISTORY_MAX_AGE_DAYS', 180, int),
+    'DB_MAINTENANCE_INTERVAL': _optional('DB_MAINTENANCE_INTERVAL', 3600, int),
+    'WATCH_INTERVAL': _optional('WATCH_INTERVAL', 1800, int),
+    'NOTIFICATIONS_PER_SECOND': _optional('NOTIFICATIONS_PER_SECOND', 20, float),
+    'SHUTDOWN_TIMEOUT': _optional('SHUTDOWN_TIMEOUT', 20, float),
+    'SEARCH_DEADLINE': _optional('SEARCH_DEADLINE', 8, float),
+    'LOG_LEVEL': _optional('LOG_LEVEL', 'INFO'),
+    'LOG_FORMAT': _optional('LOG_FORMAT', 'json'),
+    'LOG_SAMPLE_RATE': _optional('LOG_SAMPLE_RATE', 0.1, float),
+    'URL_SECRET': lambda: __getattr__('BOT_TOKEN'),
+    'WEBHOOK_HOST': _webhook_host,
+    'WEBHOOK_URL': lambda: f'https://{__getattr__("WEBHOOK_HOST")}/{__getattr__("URL_SECRET")}',
+}
 
-from dotenv import load as load_dotenv
 
-load_dotenv('../.env')
+def __getattr__(name: str) -> Any:
+    """
+    Получить параметр при первом обращении и сохранить его в модуле
 
-if 'TG_BOT_TOKEN' not in os.environ:
-    raise Exception('TG_TOKEN_BOT environment variable is missing')
-if 'RAPID_API_KEY' not in os.environ:
-    raise Exception('RAPID_API_KEY environment variable is missing')
-if ('WEBHOOK_HOST' not in os.environ) and ('--webhook' in argv):
-    raise Exception('WEBHOOK_HOST environment variable is missing')
+    Raises:
+        AttributeError: если параметр не существует
+        Exception: если отсутствует обязательная переменная окружения
+    """
+    getter = _SETTINGS.get(name)
+    if getter is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    load_environment()
+    value = getter()
+    globals()[name] = value
+    return value
 
-BOT_TOKEN = os.getenv('TG_BOT_TOKEN')
-API_KEY = os.getenv('RAPID_API_KEY')
-DATABASE_PATH = os.getenv('DATABASE_PATH')
 
-URL_SECRET = BOT_TOKEN
-WEBHOOK_HOST = os.getenv('WEBHOOK_HOST')
-WEBHOOK_URL = f'https://{WEBHOOK_HOST}/{URL_SECRET}'
+def __dir__():
+    return sorted(set(globals()) | set(_SETTINGS))
@@ -0,0 +1,337 @@
+"""
+Локальный симулятор Hotels API для нагрузочного тестирования
+
+Реализует эндпоинты locations/v2/search, properties/list и
+properties/get-hotel-photos на синтетических данных, поддерживает
+искусственную задержку, ошибки и ответы 429, а также запись ответов
+настоящего API в файлы и их воспроизведение.
+
+Запуск:
+    python -m loadtest.hotels_simulator --port 8081 --latency 0.2 --error-rate 0.01
+    python -m loadtest.hotels_simulator --record recordings --api-key KEY
+    python -m loadtest.hotels_simulator --replay recordings
+
+После запуска укажите HOTELS_API_URL=http://localhost:8081 в файле .env
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+ENDPOINTS = ('locations/v2/search', 'properties/list', 'properties/get-hotel-photos')
+UPSTREAM_URL = 'https://hotels4.p.rapidapi.com'
+
+CITY_NAMES = ('Москва', 'Санкт-Петербург', 'Казань', 'Сочи', 'Калининград',
+              'London', 'Paris', 'Berlin', 'Rome', 'New York')
+STREET_NAMES = ('Lenina', 'Central', 'Park', 'Station', 'River', 'Market', 'Garden')
+HOTEL_WORDS = ('Grand', 'Plaza', 'Park', 'Central', 'Royal', 'City', 'Comfort', 'Lux')
+
+
+class SyntheticCatalog:
+    """
+    Детерминированный генератор городов, отелей и фотографий
+
+    Одинаковые запросы всегда получают одинаковые ответы, поэтому
+    результаты нагрузочных прогонов сопоставимы между собой.
+
+    Args:
+        cities: количество синтетических городов
+        hotels_per_city: количество отелей в каждом городе
+        photos_per_hotel: количество фотографий каждого отеля
+        seed: начальное значение генератора случайных чисел
+    """
+
+    def __init__(self,
+                 cities: int = 1000,
+                 hotels_per_city: int = 200,
+                 photos_per_hotel: int = 15,
+                 seed: int = 0):
+        """Конструктор класса"""
+        self.cities: int = cities
+        self.hotels_per_city: int = hotels_per_city
+        self.photos_per_hotel: int = photos_per_hotel
+        self.seed: int = seed
+        self.__hotels: Dict[int, List[Dict[str, Any]]] = {}
+
+    def city_name(self, destination_id: int) -> str:
+        """Получить название города по его destinationId"""
+        if destination_id < len(CITY_NAMES):
+            return CITY_NAMES[destination_id]
+        return f'City-{destination_id}'
+
+    def find_destination(self, query: str) -> Optional[int]:
+        """
+        Найти destinationId города по строке запроса
+
+        Известные названия городов сопоставляются напрямую, остальные
+        строки распределяются по синтетическим городам по хэшу.
+        """
+        query = query.strip().lower()
+        if not query:
+            return None
+        for destination_id, name in enumerate(CITY_NAMES):
+            if name.lower() == query:
+                return destination_id
+        digest = hashlib.sha1(f'{self.seed}:{query}'.encode()).digest()
+        return int.from_bytes(digest[:4], 'big') % self.cities
+
+    def hotels(self, destination_id: int) -> List[Dict[str, Any]]:
+        """Получить (и при первом обращении сгенерировать) отели города"""
+        hotels = self.__hotels.get(destination_id)
+        if hotels is None:
+            hotels = self.__generate_hotels(destination_id)
+            self.__hotels[destination_id] = hotels
+        return hotels
+
+    def photos(self, hotel_id: int, base_url: str) -> Dict[str, Any]:
+        """Получить ответ get-hotel-photos для отеля"""
+        hotel_images = [{'baseUrl': f'{base_url}/photos/{hotel_id}_{i}_{{size}}.jpg'}
+                        for i in range(self.photos_per_hotel)]
+        room_images = [{'images': [{'baseUrl': f'{base_url}/photos/{hotel_id}_room{i}_{{size}}.jpg'}]}
+                       for i in range(self.photos_per_hotel // 3)]
+        return {'hotelId': hotel_id, 'hotelImages': hotel_images, 'roomImages': room_images}
+
+    def __generate_hotels(self, destination_id: int) -> List[Dict[str, Any]]:
+        rnd = random.Random(self.seed * 1_000_003 + destination_id)
+        city = self.city_name(destination_id)
+        hotels = []
+        for i in range(self.hotels_per_city):
+            hotel_id = destination_id * 100_000 + i
+            price = rnd.randint(800, 40000)
+            distance = round(rnd.uniform(0.1, 25.0), 1)
+            hotels.append({
+                'id': hotel_id,
+                'name': f'{rnd.choice(HOTEL_WORDS)} {rnd.choice(HOTEL_WORDS)} Hotel #{i}',
+                'address': {'streetAddress': f'{rnd.choice(STREET_NAMES)} st., {rnd.randint(1, 200)}',
+                            'locality': city,
+                            'countryName': 'Simland'},
+                'ratePlan': {'price': {'current': f'{price:,} RUB', 'exactCurrent': float(price)}},
+                'landmarks': [{'label': 'Центр города', 'distance': f'{distance} км'}],
+            })
+        return hotels
+
+
+class HotelsSimulator:
+    """
+    aiohttp-приложение, имитирующее Hotels API
+
+    Args:
+        catalog: генератор синтетических данных
+        latency: базовая задержка ответа в секундах
+        jitter: максимальное случайное добавление к задержке в секундах
+        error_rate: доля ответов с кодом 500
+        throttle_rate: доля ответов с кодом 429
+        record_dir: каталог для записи ответов настоящего API
+        replay_dir: каталог с записанными ответами для воспроизведения
+        upstream_url: адрес настоящего API для режима записи
+        api_key: ключ Rapid API для режима записи
+    """
+
+    def __init__(self,
+                 catalog: SyntheticCatalog,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 throttle_rate: float = 0.0,
+                 record_dir: Optional[Path] = None,
+                 replay_dir: Optional[Path] = None,
+                 upstream_url: str = UPSTREAM_URL,
+                 api_key: Optional[str] = None):
+        """Конструктор класса"""
+        self.catalog = catalog
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.error_rate: float = error_rate
+        self.throttle_rate: float = throttle_rate
+        self.record_dir: Optional[Path] = record_dir
+        self.replay_dir: Optional[Path] = replay_dir
+        self.upstream_url: str = upstream_url.rstrip('/')
+        self.api_key: Optional[str] = api_key
+        self.stats: Counter = Counter()
+        self.__session: Optional[ClientSession] = None
+
+    def make_app(self) -> web.Application:
+        """Создать aiohttp-приложение симулятора"""
+        app = web.Application(middlewares=[self.faults_middleware])
+        for endpoint in ENDPOINTS:
+            app.router.add_get(f'/{endpoint}', self.handle)
+        app.router.add_get('/__stats', self.handle_stats)
+        app.on_cleanup.append(self.close)
+        return app
+
+    @web.middleware
+    async def faults_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """Добавить к ответу задержку и случайные отказы"""
+        if request.path == '/__stats':
+            return await handler(request)
+
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+
+        roll = random.random()
+        if roll < self.throttle_rate:
+            self.stats['429'] += 1
+            return web.json_response({'message': 'Too many requests'}, status=429)
+        if roll < self.throttle_rate + self.error_rate:
+            self.stats['500'] += 1
+            return web.json_response({'message': 'Internal error'}, status=500)
+        return await handler(request)
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Обработать запрос к одному из эндпоинтов API"""
+        endpoint = request.path.lstrip('/')
+        self.stats[endpoint] += 1
+        params = dict(request.query)
+
+        if self.replay_dir is not None:
+            path = recording_path(self.replay_dir, endpoint, params)
+            if not path.exists():
+                return web.json_response({'message': 'No recording'}, status=404)
+            return web.Response(body=path.read_bytes(), content_type='application/json')
+
+        if self.record_dir is not None:
+            status, body = await self.fetch_upstream(endpoint, params)
+            if status == 200:
+                path = recording_path(self.record_dir, endpoint, params)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(body)
+            return web.Response(body=body, status=status, content_type='application/json')
+
+        return web.json_response(self.synthetic_response(endpoint, params, request))
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        """Вернуть счетчики обработанных запросов"""
+        return web.json_response(dict(self.stats))
+
+    async def fetch_upstream(self, endpoint: str, params: Dict[str, str]) -> tuple:
+        """Выполнить запрос к настоящему API (режим записи)"""
+        if self.__session is None:
+            self.__session = ClientSession()
+        headers = {'x-rapidapi-host': 'hotels4.p.rapidapi.com',
+                   'x-rapidapi-key': self.api_key or ''}
+        async with self.__session.get(f'{self.upstream_url}/{endpoint}',
+                                      params=params, headers=headers) as response:
+            return response.status, await response.read()
+
+    def synthetic_response(self,
+                           endpoint: str,
+                           params: Dict[str, str],
+                           request: web.Request) -> Dict[str, Any]:
+        """Сформировать ответ эндпоинта на синтетических данных"""
+        if endpoint == 'locations/v2/search':
+            destination_id = self.catalog.find_destination(params.get('query', ''))
+            entities = []
+            if destination_id is not None:
+                entities.append({'destinationId': str(destination_id),
+                                 'name': self.catalog.city_name(destination_id),
+                                 'type': 'CITY'})
+            return {'term': params.get('query'),
+                    'suggestions': [{'group': 'CITY_GROUP', 'entities': entities}]}
+
+        if endpoint == 'properties/list':
+            results = self.list_properties(params)
+            return {'result': 'OK', 'data': {'body': {'searchResults': {'results': results}}}}
+
+        base_url = f'{request.scheme}://{request.host}'
+        return self.catalog.photos(int(params.get('id', 0)), base_url)
+
+    def list_properties(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        """Отфильтровать и отсортировать отели города по параметрам properties/list"""
+        hotels = self.catalog.hotels(int(params.get('destinationId', 0)) % self.catalog.cities)
+        check_in = params.get('checkIn')
+        if check_in:
+            hotels = [dated_price(hotel, check_in) for hotel in hotels]
+
+        price_min = float(params.get('priceMin', 0))
+        price_max = float(params.get('priceMax', 'inf'))
+        hotels = [hotel for hotel in hotels
+                  if price_min <= hotel['ratePlan']['price']['exactCurrent'] <= price_max]
+
+        sort_order = params.get('sortOrder', 'PRICE')
+        if sort_order == 'DISTANCE_FROM_LANDMARK':
+            hotels.sort(key=lambda hotel: float(hotel['landmarks'][0]['distance'].split()[0]))
+        else:
+            hotels.sort(key=lambda hotel: hotel['ratePlan']['price']['exactCurrent'],
+                        reverse=sort_order == 'PRICE_HIGHEST_FIRST')
+
+        page_size = int(params.get('pageSize', 25))
+        page_number = int(params.get('pageNumber', 1))
+        return hotels[(page_number - 1) * page_size:page_number * page_size]
+
+    async def close(self, app: web.Application) -> None:
+        """Закрыть HTTP-сессию режима записи"""
+        if self.__session is not None:
+            await self.__session.close()
+
+
+def dated_price(hotel: Dict[str, Any], check_in: str) -> Dict[str, Any]:
+    """
+    Пересчитать цену отеля для даты заезда
+
+    Цена детерминированно меняется от -20% до +20% в зависимости от отеля и
+    даты, чтобы поиск самых дешевых дат находил разные даты для разных отелей.
+    """
+    digest = hashlib.md5(f'{hotel["id"]}:{check_in}'.encode()).digest()
+    price = round(hotel['ratePlan']['price']['exactCurrent'] * (0.8 + digest[0] / 255 * 0.4))
+    return dict(hotel, ratePlan={'price': {'current': f'{price:,} RUB', 'exactCurrent': float(price)}})
+
+
+def recording_path(directory: Path, endpoint: str, params: Dict[str, str]) -> Path:
+    """
+    Получить путь к файлу с записанным ответом
+
+    Имя файла – хэш отсортированных параметров запроса, поэтому порядок
+    параметров не влияет на совпадение при воспроизведении.
+    """
+    query = json.dumps(sorted(params.items()), ensure_ascii=False)
+    digest = hashlib.sha1(query.encode()).hexdigest()
+    return directory / endpoint.replace('/', '_') / f'{digest}.json'
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Локальный симулятор Hotels API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--cities', type=int, default=1000)
+    parser.add_argument('--hotels-per-city', type=int, default=200)
+    parser.add_argument('--photos-per-hotel', type=int, default=15)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0.0, help='базовая задержка, сек.')
+    parser.add_argument('--jitter', type=float, default=0.0, help='случайная добавка к задержке, сек.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='доля ответов 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='доля ответов 429')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--record', type=Path, metavar='DIR', help='проксировать запросы и записывать ответы')
+    mode.add_argument('--replay', type=Path, metavar='DIR', help='воспроизводить записанные ответы')
+    parser.add_argument('--upstream', default=UPSTREAM_URL, help='адрес API для режима записи')
+    parser.add_argument('--api-key', help='ключ Rapid API для режима записи')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    catalog = SyntheticCatalog(cities=args.cities,
+                               hotels_per_city=args.hotels_per_city,
+                               photos_per_hotel=args.photos_per_hotel,
+                               seed=args.seed)
+    simulator = HotelsSimulator(catalog,
+                                latency=args.latency,
+                                jitter=args.jitter,
+                                error_rate=args.error_rate,
+                                throttle_rate=args.throttle_rate,
+                                record_dir=args.record,
+                                replay_dir=args.replay,
+                                upstream_url=args.upstream,
+                                api_key=args.api_key)
+    web.run_app(simulator.make_app(), host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,302 @@
+"""
+Генератор синтетической нагрузки на бота
+
+Поднимает поддельный Telegram Bot API (loadtest.telegram_simulator),
+разыгрывает через него многошаговые диалоги /lowprice, /highprice,
+/bestdeal и /compare от множества пользователей и выводит распределения
+задержек по командам и шагам, а также пропускную способность. Сценарии с
+суффиксом -quick выбирают параметры inline-кнопками вместо ввода текстом.
+
+Пример (в трех терминалах):
+    python -m loadtest.hotels_simulator --port 8081 --latency 0.2
+    python -m loadtest.load_generator --port 8082 --concurrency 200 --dialogs 5000
+    TELEGRAM_API_URL=http://127.0.0.1:8082 HOTELS_API_URL=http://127.0.0.1:8081 python main.py
+
+Параметр --spawn-bot запускает бота автоматически. В режиме --mode webhook
+обновления отправляются POST-запросом на --webhook-target. Параметр
+--ramp 10,50,100,200 последовательно увеличивает число одновременных
+пользователей и определяет потолок пропускной способности.
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence
+
+from aiohttp import web
+
+from .telegram_simulator import FakeTelegram
+
+CITIES = ('Москва', 'Санкт-Петербург', 'Казань', 'Сочи', 'London', 'Paris', 'Berlin', 'Rome')
+
+# Сценарии диалогов: команда и ответы пользователя на каждый шаг.
+# Ответ "@<шаг>:<номер>" – нажатие inline-кнопки с callback_data "qp:<шаг>:<номер>"
+SCRIPTS = {
+    'lowprice': ('/lowprice', '{city}', '{stay}', '{count}', '{photos}'),
+    'highprice': ('/highprice', '{city}', '{stay}', '{count}', '{photos}'),
+    'bestdeal': ('/bestdeal', '{city}', '{stay}', '{min_price}-{max_price}', '0.5-15', '{count}', '{photos}'),
+    'lowprice-quick': ('/lowprice', '{city}', '@adults:{adults}', '@stay:{stay_option}', '@preset:{preset}'),
+    'highprice-quick': ('/highprice', '{city}', '@adults:{adults}', '@stay:{stay_option}', '@preset:{preset}'),
+    'bestdeal-quick': ('/bestdeal', '{city}', '@adults:{adults}', '@stay:{stay_option}',
+                       '@price:{price_band}', '@dist:{dist_band}', '@preset:{preset}'),
+    'compare': ('/compare', '{cities}', '{count}', '{photos}'),
+    'compare-quick': ('/compare {cities}', '@preset:{preset}'),
+}
+# Количество отелей для кнопок шага preset (src.handlers.processes.quick_pick.PRESETS)
+PRESET_COUNTS = (3, 5, 3, 5)
+RESULT_MARKER = 'hotels.com/ho'
+FAILURE_MARKERS = ('Некорректный ввод', 'Ошибка', 'недоступен', 'ничего не найдено')
+
+
+class DialogFailed(Exception):
+    """Бот ответил ошибкой или не ответил за отведенное время"""
+
+
+class Metrics:
+    """Сборщик задержек по командам и шагам диалогов"""
+
+    def __init__(self):
+        """Конструктор класса"""
+        self.dialogs: Dict[str, List[float]] = defaultdict(list)
+        self.steps: Dict[str, List[float]] = defaultdict(list)
+        self.failures: Dict[str, int] = defaultdict(int)
+        self.started_at: float = time.monotonic()
+
+    @property
+    def completed(self) -> int:
+        return sum(len(values) for values in self.dialogs.values())
+
+    def report(self) -> str:
+        """Сформировать текстовый отчет"""
+        elapsed = time.monotonic() - self.started_at
+        lines = [f'Длительность: {elapsed:.1f} с, завершено диалогов: {self.completed}, '
+                 f'ошибок: {sum(self.failures.values())}, '
+                 f'пропускная способность: {self.completed / elapsed * 60:.0f} диалогов/мин',
+                 '',
+                 f'{"":28}{"n":>7}{"p50":>9}{"p90":>9}{"p99":>9}{"max":>9}']
+        for title, series in (('Диалог', self.dialogs), ('Шаг', self.steps)):
+            for name in sorted(series):
+                values = sorted(series[name])
+                lines.append(f'{title + " " + name:28}{len(values):>7}'
+                             + ''.join(f'{percentile(values, p):>9.3f}' for p in (50, 90, 99))
+                             + f'{values[-1]:>9.3f}')
+        for name, failures in sorted(self.failures.items()):
+            lines.append(f'Ошибки {name}: {failures}')
+        return '\n'.join(lines)
+
+
+def percentile(sorted_values: Sequence[float], percent: float) -> float:
+    """Получить перцентиль отсортированной последовательности"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))
+    return sorted_values[index]
+
+
+async def wait_reply(outbox: asyncio.Queue, timeout: float):
+    """Дождаться очередного сообщения бота в чате"""
+    try:
+        return await asyncio.wait_for(outbox.get(), timeout)
+    except asyncio.TimeoutError:
+        raise DialogFailed('timeout') from None
+
+
+def reply_text(method: str, result) -> str:
+    return result.get('text', '') if method in ('sendMessage', 'editMessageText') else ''
+
+
+async def run_dialog(fake: FakeTelegram,
+                     chat_id: int,
+                     command: str,
+                     rnd: random.Random,
+                     metrics: Metrics,
+                     step_timeout: float,
+                     think_time: float) -> None:
+    """
+    Провести один диалог пользователя с ботом
+
+    Задержка шага – время от сообщения пользователя до первого ответа
+    бота; для последнего шага – до получения всех карточек отелей.
+    """
+    results_count = rnd.randint(1, 5)
+    preset = rnd.randrange(len(PRESET_COUNTS))
+    if command.endswith('-quick'):
+        results_count = PRESET_COUNTS[preset]
+    min_price = rnd.choice((500, 1000, 2000))
+    check_in = datetime.date.today() + datetime.timedelta(days=rnd.randint(1, 30))
+    check_out = check_in + datetime.timedelta(days=rnd.randint(1, 5))
+    answers = [step.format(city=rnd.choice(CITIES),
+                           cities=', '.join(rnd.sample(CITIES, rnd.randint(2, 3))),
+                           count=results_count,
+                           photos=rnd.choice((0, 0, 3, 5)),
+                           min_price=min_price,
+                           max_price=min_price + rnd.choice((3000, 10000, 30000)),
+                           preset=preset,
+                           price_band=rnd.randrange(4),
+                           dist_band=rnd.choice((2, 3)),
+                           stay=f'{check_in:%d.%m}-{check_out:%d.%m} {rnd.randint(1, 4)}',
+                           adults=rnd.randint(2, 4),
+                           stay_option=rnd.randrange(4))
+               for step in SCRIPTS[command]]
+
+    outbox = fake.outbox(chat_id)
+    keyboard_message = None
+    dialog_started_at = time.monotonic()
+    try:
+        for number, answer in enumerate(answers):
+            if answer.startswith('@'):
+                if keyboard_message is None:
+                    raise DialogFailed('no keyboard')
+                sent_at = await fake.push_callback(chat_id, keyboard_message, 'qp:' + answer[1:])
+            else:
+                sent_at = await fake.push_message(chat_id, answer)
+            received_at, method, result = await wait_reply(outbox, step_timeout)
+            text = reply_text(method, result)
+            if isinstance(result, dict) and 'reply_markup' in result:
+                keyboard_message = result
+            if any(marker in text for marker in FAILURE_MARKERS):
+                raise DialogFailed(text.split('\n')[0])
+
+            if number == len(answers) - 1:
+                cards = 0
+                while cards < results_count:
+                    if RESULT_MARKER in text:
+                        cards += 1
+                    elif any(marker in text for marker in FAILURE_MARKERS):
+                        raise DialogFailed(text.split('\n')[0])
+                    if cards < results_count:
+                        received_at, method, result = await wait_reply(outbox, step_timeout)
+                        text = reply_text(method, result)
+                metrics.steps[f'{command}:search'].append(received_at - sent_at)
+            else:
+                metrics.steps[f'{command}:{number}'].append(received_at - sent_at)
+                # Бот регистрирует обработчик следующего шага уже после отправки
+                # подсказки, поэтому мгновенный ответ пользователя может его опередить
+                await asyncio.sleep(think_time * (0.5 + rnd.random()))
+    except DialogFailed:
+        metrics.failures[command] += 1
+    else:
+        metrics.dialogs[command].append(time.monotonic() - dialog_started_at)
+    finally:
+        fake.forget_chat(chat_id)
+
+
+async def virtual_user(fake: FakeTelegram,
+                       user_number: int,
+                       metrics: Metrics,
+                       deadline: float,
+                       dialogs_left: List[int],
+                       args: argparse.Namespace) -> None:
+    """Последовательно проводить диалоги от имени одного пользователя"""
+    rnd = random.Random(args.seed + user_number)
+    dialog_number = 0
+    while time.monotonic() < deadline and dialogs_left[0] > 0:
+        dialogs_left[0] -= 1
+        dialog_number += 1
+        # Каждый диалог ведется в новом чате, чтобы незавершенный после ошибки
+        # диалог не перехватил сообщения следующего
+        chat_id = 10_000_000 + user_number * 100_000 + dialog_number
+        command = rnd.choice(args.commands)
+        await run_dialog(fake, chat_id, command, rnd, metrics, args.step_timeout, args.think_time)
+
+
+async def run_stage(fake: FakeTelegram,
+                    concurrency: int,
+                    duration: float,
+                    dialogs: int,
+                    args: argparse.Namespace) -> Metrics:
+    """Запустить нагрузку с заданным числом одновременных пользователей"""
+    metrics = Metrics()
+    deadline = time.monotonic() + duration
+    dialogs_left = [dialogs]
+    await asyncio.gather(*(virtual_user(fake, number, metrics, deadline, dialogs_left, args)
+                           for number in range(concurrency)))
+    return metrics
+
+
+def spawn_bot(args: argparse.Namespace) -> subprocess.Popen:
+    """Запустить процесс бота, настроенный на поддельный Telegram API"""
+    env = dict(os.environ, TELEGRAM_API_URL=f'http://{args.host}:{args.port}')
+    if args.hotels_api_url:
+        env['HOTELS_API_URL'] = args.hotels_api_url
+    command = [sys.executable, 'main.py']
+    if args.mode == 'webhook':
+        env.setdefault('WEBHOOK_HOST', 'localhost')
+        command.append('--webhook')
+    return subprocess.Popen(command, env=env)
+
+
+async def main_async(args: argparse.Namespace) -> None:
+    fake = FakeTelegram(webhook_target=args.webhook_target if args.mode == 'webhook' else None)
+    runner = web.AppRunner(fake.make_app())
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.port).start()
+
+    bot_process = spawn_bot(args) if args.spawn_bot else None
+    try:
+        await asyncio.sleep(args.warmup)
+        if args.ramp:
+            ceiling = (0, 0.0)
+            for concurrency in args.ramp:
+                metrics = await run_stage(fake, concurrency, args.stage_duration, sys.maxsize, args)
+                throughput = metrics.completed / (time.monotonic() - metrics.started_at) * 60
+                print(f'\n=== {concurrency} одновременных пользователей ===\n{metrics.report()}')
+                if throughput > ceiling[1] * 1.05:
+                    ceiling = (concurrency, throughput)
+            print(f'\nПотолок пропускной способности: ~{ceiling[1]:.0f} диалогов/мин '
+                  f'(достигнут при {ceiling[0]} одновременных пользователях)')
+        else:
+            metrics = await run_stage(fake, args.concurrency, args.duration, args.dialogs, args)
+            print(metrics.report())
+        print(f'\nВызовы Bot API: {dict(fake.stats)}')
+        if not args.ramp and metrics.completed:
+            calls = sum(count for method, count in fake.stats.items()
+                        if method not in ('getUpdates', 'getMe', 'setWebhook', 'deleteWebhook'))
+            print(f'Вызовов Bot API на диалог: {calls / metrics.completed:.1f}')
+    finally:
+        if bot_process is not None:
+            bot_process.terminate()
+            bot_process.wait()
+        await runner.cleanup()
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Генератор синтетической нагрузки на бота')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8082, help='порт поддельного Bot API')
+    parser.add_argument('--mode', choices=('polling', 'webhook'), default='polling')
+    parser.add_argument('--webhook-target', default='http://127.0.0.1:8443/{token}',
+                        help='адрес webhook бота ({token} заменяется на TG_BOT_TOKEN)')
+    parser.add_argument('--concurrency', type=int, default=50, help='одновременных пользователей')
+    parser.add_argument('--dialogs', type=int, default=1000, help='всего диалогов')
+    parser.add_argument('--duration', type=float, default=600, help='максимальная длительность, с')
+    parser.add_argument('--ramp', type=lambda value: [int(x) for x in value.split(',')],
+                        help='ступени нагрузки через запятую, например 10,50,100')
+    parser.add_argument('--stage-duration', type=float, default=60, help='длительность ступени, с')
+    parser.add_argument('--commands', type=lambda value: value.split(','),
+                        default=list(SCRIPTS), help='команды через запятую')
+    parser.add_argument('--step-timeout', type=float, default=30)
+    parser.add_argument('--think-time', type=float, default=0.3, help='средняя пауза между шагами, с')
+    parser.add_argument('--warmup', type=float, default=1, help='пауза перед началом нагрузки, с')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--spawn-bot', action='store_true', help='запустить main.py автоматически')
+    parser.add_argument('--hotels-api-url', help='HOTELS_API_URL для запускаемого бота')
+    args = parser.parse_args(argv)
+    args.webhook_target = args.webhook_target.replace('{token}', os.getenv('TG_BOT_TOKEN', ''))
+    unknown = set(args.commands) - set(SCRIPTS)
+    if unknown:
+        parser.error(f'unknown commands: {", ".join(sorted(unknown))}')
+    return args
+
+
+def main() -> None:
+    asyncio.run(main_async(parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+"""
+Профилирование памяти бота под синтетической нагрузкой
+
+Бот запускается в этом же процессе вместе с поддельным Telegram Bot API
+(loadtest.telegram_simulator) и симулятором Hotels API, чтобы
+tracemalloc видел его выделения памяти. Прогон состоит из трех этапов:
+
+1. прогрев – завершенные диалоги заполняют кэши и загружают модули;
+2. активные диалоги – пользователи начинают поиск (команда и город) и
+   не отвечают дальше, оставляя состояние диалога в памяти бота;
+3. установившийся режим – еще серия завершенных диалогов.
+
+После каждого этапа снимается снимок tracemalloc (только выделения кода
+бота и TeleBot, без симуляторов и aiohttp) и RSS процесса за вычетом
+памяти самого tracemalloc. В отчете – прирост памяти на 1000 активных
+диалогов, прирост за установившийся режим и строки кода, выделившие
+больше всего памяти.
+
+Параметр --check сравнивает результат с базовым (memory_baseline.json) и
+завершается с кодом 1, если прирост превышает базовый больше чем на
+--tolerance, или если количество хранимых обработчиков следующего шага
+превышает ограничение. Прирост RSS на 1000 диалогов зависит от их
+количества (память выделяется процессу крупными блоками), поэтому
+сравниваются только прогоны с тем же --conversations, что и у базового
+результата. Параметр --save-baseline записывает новый базовый результат.
+
+Пример:
+    python -m loadtest.memory_profile --conversations 2000
+    python -m loadtest.memory_profile --check
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import random
+import resource
+import tempfile
+import threading
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, Optional, Sequence
+
+from aiohttp import web
+
+from .hotels_simulator import HotelsSimulator, SyntheticCatalog
+from .load_generator import CITIES, DialogFailed, SCRIPTS, run_stage, wait_reply
+from .telegram_simulator import FakeTelegram
+
+BASELINE_PATH = Path(__file__).with_name('memory_baseline.json')
+SOURCE_DIR = Path(__file__).resolve().parent.parent / 'src'
+# Команды, которыми начинаются незавершенные диалоги
+OPEN_COMMANDS = ('/lowprice', '/highprice', '/bestdeal')
+# Метрики, которые сравниваются с базовым результатом
+CHECKED_METRICS = ('traced_per_1k_kib', 'rss_per_1k_kib')
+# Первый chat_id незавершенных диалогов (диалоги load_generator используют меньшие)
+OPEN_CHAT_ID = 900_000_000
+
+
+def current_rss() -> int:
+    """
+    Получить RSS процесса в байтах
+
+    На системах без /proc возвращается пиковый RSS.
+    """
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def take_snapshot(filters: Sequence[tracemalloc.Filter]) -> Dict[str, Any]:
+    """Собрать мусор и снять снимок tracemalloc и RSS"""
+    gc.collect()
+    snapshot = tracemalloc.take_snapshot().filter_traces(filters)
+    return {'snapshot': snapshot,
+            'traced': sum(stat.size for stat in snapshot.statistics('filename')),
+            'rss': current_rss() - tracemalloc.get_tracemalloc_memory()}
+
+
+def bot_filters() -> Sequence[tracemalloc.Filter]:
+    """Фильтры снимков: только код бота и TeleBot"""
+    import telebot
+
+    return (tracemalloc.Filter(True, str(SOURCE_DIR / '*')),
+            tracemalloc.Filter(True, os.path.join(os.path.dirname(telebot.__file__), '*')))
+
+
+async def open_conversation(fake: FakeTelegram, chat_id: int, rnd: random.Random, args: argparse.Namespace) -> bool:
+    """
+    Начать поиск и бросить его после выбора города
+
+    Returns:
+        True, если бот ответил на оба сообщения
+    """
+    outbox = fake.outbox(chat_id)
+    try:
+        for text in (rnd.choice(OPEN_COMMANDS), rnd.choice(CITIES)):
+            await fake.push_message(chat_id, text)
+            await wait_reply(outbox, args.step_timeout)
+            await asyncio.sleep(args.think_time * (0.5 + rnd.random()))
+    except DialogFailed:
+        return False
+    finally:
+        fake.forget_chat(chat_id)
+    return True
+
+
+async def open_conversations(fake: FakeTelegram, args: argparse.Namespace) -> int:
+    """Начать args.conversations незавершенных диалогов и вернуть количество успешных"""
+    numbers = iter(range(args.conversations))
+    opened = [0]
+
+    async def user(user_number: int) -> None:
+        rnd = random.Random(args.seed + user_number)
+        for number in numbers:
+            if await open_conversation(fake, OPEN_CHAT_ID + number, rnd, args):
+                opened[0] += 1
+
+    await asyncio.gather(*(user(number) for number in range(args.concurrency)))
+    return opened[0]
+
+
+def per_1k(value: int, count: int) -> float:
+    """Пересчитать прирост в байтах в КиБ на 1000 элементов"""
+    return value / max(count, 1) * 1000 / 1024
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    fake = FakeTelegram()
+    simulator = HotelsSimulator(SyntheticCatalog())
+    runners = []
+    for app, port in ((fake.make_app(), args.port), (simulator.make_app(), args.hotels_port)):
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, args.host, port).start()
+        runners.append(runner)
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ.update(TELEGRAM_API_URL=f'http://{args.host}:{args.port}',
+                          HOTELS_API_URL=f'http://{args.host}:{args.hotels_port}',
+                          DATABASE_PATH=os.path.join(directory, 'memory_profile.db'))
+        os.environ.setdefault('TG_BOT_TOKEN', '1:memory-profile')
+        os.environ.setdefault('RAPID_API_KEY', 'memory-profile')
+
+        from loguru import logger
+        logger.remove()
+        logger.add(lambda message: print(message, end=''), level=args.log_level)
+
+        from src import loader
+        from src.bot import NEXT_STEP_MAX_CHATS
+
+        bot = loader.setup()
+        polling = threading.Thread(target=bot.infinity_polling, name='polling', daemon=True,
+                                   kwargs=dict(timeout=5, long_polling_timeout=1, interval=0))
+        polling.start()
+        try:
+            tracemalloc.start()
+            filters = bot_filters()
+            await run_stage(fake, args.concurrency, args.duration, args.warmup_dialogs, args)
+            before = take_snapshot(filters)
+
+            opened = await open_conversations(fake, args)
+            active = take_snapshot(filters)
+            stored_handlers = bot.next_step_backend.chats
+
+            steady = await run_stage(fake, args.concurrency, args.duration, args.dialogs, args)
+            after = take_snapshot(filters)
+        finally:
+            bot.stop_polling()
+            tracemalloc.stop()
+            for runner in runners:
+                await runner.cleanup()
+
+    result = {
+        'conversations': opened,
+        'traced_per_1k_kib': round(per_1k(active['traced'] - before['traced'], opened), 1),
+        'rss_per_1k_kib': round(per_1k(active['rss'] - before['rss'], opened), 1),
+        'steady_traced_growth_kib': round((after['traced'] - active['traced']) / 1024, 1),
+        'stored_next_step_handlers': stored_handlers,
+    }
+
+    print(f'Незавершенных диалогов: {opened} из {args.conversations}, '
+          f'обработчиков следующего шага: {stored_handlers} (ограничение {NEXT_STEP_MAX_CHATS})\n'
+          f'На 1000 активных диалогов: tracemalloc {result["traced_per_1k_kib"]} КиБ, '
+          f'RSS {result["rss_per_1k_kib"]} КиБ\n'
+          f'Установившийся режим ({steady.completed} диалогов, ошибок {sum(steady.failures.values())}): '
+          f'прирост tracemalloc {result["steady_traced_growth_kib"]} КиБ\n'
+          f'Итого RSS: {after["rss"] / 2 ** 20:.1f} МиБ\n\n'
+          f'Больше всего памяти на активные диалоги выделили:')
+    for stat in active['snapshot'].compare_to(before['snapshot'], 'lineno')[:args.top]:
+        print(f'  {stat}')
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(result, indent=2) + '\n')
+        print(f'\nБазовый результат записан в {args.baseline}')
+    if not args.check:
+        return 0
+
+    problems = []
+    if opened < args.conversations:
+        problems.append(f'начато только {opened} диалогов из {args.conversations}')
+    if stored_handlers > min(opened, NEXT_STEP_MAX_CHATS):
+        problems.append(f'хранится {stored_handlers} обработчиков следующего шага')
+    baseline = json.loads(args.baseline.read_text())
+    for metric in CHECKED_METRICS:
+        limit = baseline[metric] * (1 + args.tolerance)
+        if result[metric] > limit:
+            problems.append(f'{metric} = {result[metric]} превышает {limit:.1f} (базовый {baseline[metric]})')
+    for problem in problems:
+        print(f'ОШИБКА: {problem}')
+    print('\nПроверка пройдена' if not problems else '')
+    return 1 if problems else 0
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Профилирование памяти бота под нагрузкой')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8092, help='порт поддельного Bot API')
+    parser.add_argument('--hotels-port', type=int, default=8091, help='порт симулятора Hotels API')
+    parser.add_argument('--conversations', type=int, default=2000, help='незавершенных диалогов')
+    parser.add_argument('--warmup-dialogs', type=int, default=100, help='завершенных диалогов для прогрева')
+    parser.add_argument('--dialogs', type=int, default=300, help='завершенных диалогов после активных')
+    parser.add_argument('--concurrency', type=int, default=50, help='одновременных пользователей')
+    parser.add_argument('--duration', type=float, default=600, help='максимальная длительность этапа, с')
+    parser.add_argument('--commands', type=lambda value: value.split(','),
+                        default=['lowprice', 'highprice', 'bestdeal', 'lowprice-quick', 'compare'],
+                        help='команды завершенных диалогов через запятую')
+    parser.add_argument('--step-timeout', type=float, default=30)
+    parser.add_argument('--think-time', type=float, default=0.05, help='средняя пауза между шагами, с')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=10, help='сколько строк кода показать')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое превышение базового')
+    parser.add_argument('--check', action='store_true', help='сравнить с базовым результатом')
+    parser.add_argument('--save-baseline', action='store_true', help='записать базовый результат')
+    parser.add_argument('--log-level', default='WARNING', help='уровень журнала бота')
+    args = parser.parse_args(argv)
+    unknown = set(args.commands) - set(SCRIPTS)
+    if unknown:
+        parser.error(f'unknown commands: {", ".join(sorted(unknown))}')
+    if args.check:
+        baseline_conversations = json.loads(args.baseline.read_text())['conversations']
+        if args.conversations != baseline_conversations:
+            parser.error(f'baseline was recorded with --conversations {baseline_conversations}, '
+                         f'run the check with the same value or save a new baseline')
+    return args
+
+
+def main() -> None:
+    raise SystemExit(asyncio.run(main_async(parse_args())))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""
+Проверка совместимости и сравнение реализаций хранилища
+
+Сначала на каждой реализации (см. tests.storage_conformance.BACKENDS)
+выполняется общий сценарий проверки; результаты должны совпадать между
+реализациями. Затем реализации нагружаются конкурентными операциями,
+типичными для поиска (чтение кэша file_id, запись в историю, чтение
+снимка), и выводятся пропускная способность, задержки операций и
+максимальная задержка цикла событий.
+
+Пример:
+    python -m loadtest.storage_benchmark --concurrency 50 --operations 5000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from src.utils.db_api import AsyncStorage
+from tests.storage_conformance import BACKENDS, CITIES, ConformanceError, check_conformance
+
+from .load_generator import percentile
+
+
+async def run_conformance(backends: Sequence[str]) -> bool:
+    """Проверить реализации и сравнить их результаты между собой"""
+    reference: Optional[Dict[str, Any]] = None
+    success = True
+    for name in backends:
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                async with BACKENDS[name](os.path.join(directory, 'conformance.db')) as storage:
+                    results = await check_conformance(storage)
+                if reference is not None and results != reference:
+                    raise ConformanceError('results differ from the first backend')
+                reference = reference or results
+            except ConformanceError as e:
+                success = False
+                print(f'{name:16} FAIL: {e}')
+            else:
+                print(f'{name:16} OK')
+    return success
+
+
+async def measure_loop_lag(stop: asyncio.Event, lags: List[float], interval: float = 0.005) -> None:
+    """Измерять, насколько позже запланированного просыпается цикл событий"""
+    while not stop.is_set():
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started_at - interval)
+
+
+async def worker(storage: AsyncStorage, number: int, operations: List[int], latencies: List[float]) -> None:
+    """Выполнять операции, типичные для завершения поиска"""
+    user_id = 100 + number
+    iteration = 0
+    while operations[0] > 0:
+        operations[0] -= 1
+        iteration += 1
+        urls = [f'https://photos/{number}/{iteration}/{index}' for index in range(5)]
+        started_at = time.perf_counter()
+        await storage.select_photo_file_ids(urls)
+        await storage.add_to_history(user_id, 'lowprice', CITIES[iteration % len(CITIES)],
+                                     destination_id='1000', params={'count': 5},
+                                     results=[{'id': index, 'name': f'Отель {index}'} for index in range(5)])
+        await storage.select_history_entry(user_id)
+        await storage.save_photo_file_ids({url: f'file-{url}' for url in urls[:2]})
+        latencies.append(time.perf_counter() - started_at)
+
+
+async def run_benchmark(name: str, concurrency: int, operations: int) -> str:
+    """Нагрузить реализацию и вернуть строку отчета"""
+    with tempfile.TemporaryDirectory() as directory:
+        async with BACKENDS[name](os.path.join(directory, 'benchmark.db')) as storage:
+            await storage.migrate()
+            latencies: List[float] = []
+            lags: List[float] = []
+            stop = asyncio.Event()
+            lag_task = asyncio.ensure_future(measure_loop_lag(stop, lags))
+
+            started_at = time.perf_counter()
+            left = [operations]
+            await asyncio.gather(*(worker(storage, number, left, latencies) for number in range(concurrency)))
+            elapsed = time.perf_counter() - started_at
+            stop.set()
+            await lag_task
+
+    latencies.sort()
+    lags.sort()
+    return (f'{name:16}{len(latencies) / elapsed:>10.0f}'
+            + ''.join(f'{percentile(latencies, p) * 1000:>10.1f}' for p in (50, 99))
+            + f'{(lags[-1] if lags else 0) * 1000:>12.1f}')
+
+
+async def main_async(args: argparse.Namespace) -> int:
+    if not await run_conformance(args.backends):
+        return 1
+    if args.check:
+        return 0
+
+    print(f'\nконкурентность {args.concurrency}, операций {args.operations}\n'
+          f'{"":16}{"опер/с":>10}{"p50, мс":>10}{"p99, мс":>10}{"лаг, мс":>12}')
+    for name in args.backends:
+        print(await run_benchmark(name, args.concurrency, args.operations))
+    return 0
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Проверка и сравнение реализаций хранилища')
+    parser.add_argument('--backends', type=lambda value: value.split(','), default=list(BACKENDS),
+                        help='реализации через запятую')
+    parser.add_argument('--concurrency', type=int, default=50, help='одновременных задач')
+    parser.add_argument('--operations', type=int, default=2000, help='всего операций')
+    parser.add_argument('--check', action='store_true', help='только проверка совместимости')
+    args = parser.parse_args(argv)
+    unknown = set(args.backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f'unknown backends: {", ".join(sorted(unknown))}')
+    return args
+
+
+def main() -> None:
+    raise SystemExit(asyncio.run(main_async(parse_args())))
+
+
+if __name__ == '__main__':
+    main()
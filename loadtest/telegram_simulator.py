@@ -0,0 +1,217 @@
+"""
+Локальная замена Telegram Bot API для нагрузочного тестирования
+
+Поддерживает методы, которые использует бот: getMe, getUpdates,
+setWebhook, deleteWebhook, sendMessage, sendMediaGroup, editMessageText,
+editMessageReplyMarkup, deleteMessage и answerCallbackQuery. Остальные методы отвечают успехом.
+Обновления доставляются боту через getUpdates (polling) или POST-запросом
+на адрес webhook.
+
+Обычно сервер запускается из loadtest.load_generator, который сам
+формирует обновления и следит за ответами бота. Для запуска бота с этим
+сервером укажите TELEGRAM_API_URL=http://localhost:8082 в файле .env
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+from aiohttp import ClientSession, web
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'TeleHotels', 'username': 'telehotels_bot'}
+
+
+class FakeTelegram:
+    """
+    Состояние поддельного Telegram Bot API
+
+    Args:
+        webhook_target: адрес, на который доставляются обновления в режиме
+            webhook вместо зарегистрированного ботом (например, когда бот
+            регистрирует https-адрес Ngrok, а слушает локальный порт)
+    """
+
+    def __init__(self, webhook_target: Optional[str] = None):
+        """Конструктор класса"""
+        self.webhook_target: Optional[str] = webhook_target
+        self.webhook_url: Optional[str] = None
+        self.stats: Dict[str, int] = defaultdict(int)
+        self.__update_ids = count(1)
+        self.__message_ids = count(1)
+        self.__updates: List[Dict[str, Any]] = []
+        self.__new_updates = asyncio.Event()
+        self.__outboxes: Dict[int, asyncio.Queue] = defaultdict(asyncio.Queue)
+        self.__session: Optional[ClientSession] = None
+
+    def make_app(self) -> web.Application:
+        """Создать aiohttp-приложение сервера"""
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        app.on_cleanup.append(self.close)
+        return app
+
+    def outbox(self, chat_id: int) -> asyncio.Queue:
+        """
+        Получить очередь сообщений, отправленных ботом в чат
+
+        Каждый элемент – кортеж (время получения, метод, результат метода).
+        """
+        return self.__outboxes[chat_id]
+
+    def forget_chat(self, chat_id: int) -> None:
+        """Удалить очередь сообщений завершенного диалога"""
+        self.__outboxes.pop(chat_id, None)
+
+    async def push_message(self, chat_id: int, text: str) -> float:
+        """
+        Отправить боту текстовое сообщение от пользователя
+
+        Args:
+            chat_id: идентификатор чата (совпадает с идентификатором пользователя)
+            text: текст сообщения
+
+        Returns:
+            Время отправки (time.monotonic)
+        """
+        message = {'message_id': next(self.__message_ids),
+                   'date': int(time.time()),
+                   'chat': {'id': chat_id, 'type': 'private'},
+                   'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User',
+                            'username': f'user{chat_id}'},
+                   'text': text}
+        if text.startswith('/'):
+            command = text.split()[0]
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        return await self.push_update({'message': message})
+
+    async def push_callback(self, chat_id: int, message: Dict[str, Any], data: str) -> float:
+        """
+        Отправить боту нажатие inline-кнопки
+
+        Args:
+            chat_id: идентификатор чата
+            message: сообщение бота, к которому относится кнопка
+            data: callback_data кнопки
+
+        Returns:
+            Время отправки (time.monotonic)
+        """
+        callback = {'id': str(next(self.__update_ids)),
+                    'from': {'id': chat_id, 'is_bot': False, 'first_name': 'User',
+                             'username': f'user{chat_id}'},
+                    'message': message,
+                    'chat_instance': str(chat_id),
+                    'data': data}
+        return await self.push_update({'callback_query': callback})
+
+    async def push_update(self, update: Dict[str, Any]) -> float:
+        """Доставить обновление боту (через очередь getUpdates или webhook)"""
+        update['update_id'] = next(self.__update_ids)
+        sent_at = time.monotonic()
+        target = self.webhook_target or self.webhook_url
+        if target:
+            if self.__session is None:
+                self.__session = ClientSession()
+            async with self.__session.post(target, json=update) as response:
+                await response.read()
+        else:
+            self.__updates.append(update)
+            self.__new_updates.set()
+        return sent_at
+
+    async def handle(self, request: web.Request) -> web.Response:
+        """Обработать вызов метода Bot API"""
+        method = request.match_info['method']
+        self.stats[method] += 1
+        params = dict(request.query)
+        if request.method == 'POST':
+            params.update({key: value for key, value in (await request.post()).items()
+                           if isinstance(value, str)})
+
+        handler = getattr(self, f'method_{method.lower()}', None)
+        result = await handler(params) if handler else True
+        return web.json_response({'ok': True, 'result': result})
+
+    async def method_getme(self, params: Dict[str, str]) -> Dict[str, Any]:
+        return BOT_USER
+
+    async def method_getupdates(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        offset = int(params.get('offset', 0))
+        limit = int(params.get('limit', 100))
+        timeout = float(params.get('timeout', 0))
+
+        self.__updates = [update for update in self.__updates if update['update_id'] >= offset]
+        if not self.__updates and timeout:
+            self.__new_updates.clear()
+            try:
+                await asyncio.wait_for(self.__new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.__updates[:limit]
+
+    async def method_setwebhook(self, params: Dict[str, str]) -> bool:
+        self.webhook_url = params.get('url') or None
+        return True
+
+    async def method_deletewebhook(self, params: Dict[str, str]) -> bool:
+        self.webhook_url = None
+        return True
+
+    async def method_sendmessage(self, params: Dict[str, str]) -> Dict[str, Any]:
+        message = self.__bot_message(params, text=params.get('text', ''))
+        if 'reply_markup' in params:
+            message['reply_markup'] = json.loads(params['reply_markup'])
+        self.__deliver(int(params['chat_id']), 'sendMessage', message)
+        return message
+
+    async def method_editmessagetext(self, params: Dict[str, str]) -> Dict[str, Any]:
+        message = self.__bot_message(params, text=params.get('text', ''))
+        message['message_id'] = int(params['message_id'])
+        if 'reply_markup' in params:
+            message['reply_markup'] = json.loads(params['reply_markup'])
+        self.__deliver(int(params['chat_id']), 'editMessageText', message)
+        return message
+
+    async def method_editmessagereplymarkup(self, params: Dict[str, str]) -> Dict[str, Any]:
+        message = self.__bot_message(params)
+        message['message_id'] = int(params['message_id'])
+        if 'reply_markup' in params:
+            message['reply_markup'] = json.loads(params['reply_markup'])
+        self.__deliver(int(params['chat_id']), 'editMessageReplyMarkup', message)
+        return message
+
+    async def method_sendmediagroup(self, params: Dict[str, str]) -> List[Dict[str, Any]]:
+        messages = []
+        for item in json.loads(params['media']):
+            file_id = item['media'] if not item['media'].startswith('http') \
+                else f'fake-{abs(hash(item["media"]))}'
+            message = self.__bot_message(params)
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id,
+                                 'width': 800, 'height': 600}]
+            messages.append(message)
+        self.__deliver(int(params['chat_id']), 'sendMediaGroup', messages)
+        return messages
+
+    async def method_deletemessage(self, params: Dict[str, str]) -> bool:
+        return True
+
+    async def method_answercallbackquery(self, params: Dict[str, str]) -> bool:
+        return True
+
+    def __bot_message(self, params: Dict[str, str], **fields) -> Dict[str, Any]:
+        return {'message_id': next(self.__message_ids),
+                'date': int(time.time()),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'},
+                'from': BOT_USER,
+                **fields}
+
+    def __deliver(self, chat_id: int, method: str, result: Any) -> None:
+        self.__outboxes[chat_id].put_nowait((time.monotonic(), method, result))
+
+    async def close(self, app: Optional[web.Application] = None) -> None:
+        """Закрыть HTTP-сессию доставки webhook"""
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
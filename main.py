@@ -1,25 +1,59 @@
+import signal
+import time
 from sys import argv
 
-from aiohttp import web
 from loguru import logger
 
-import src.handlers
-from src.loader import bot
+from data import config
+from src import loader
+from src.utils.logs import setup_logging
+
+
+def stop_on_signals(bot) -> None:
+    """
+    Остановить polling по сигналу SIGINT или SIGTERM
+
+    Повторный сигнал завершает процесс сразу, не дожидаясь обработчиков.
+    """
+    def handler(signum, frame):
+        logger.info('Получен сигнал {}, остановка бота', signal.Signals(signum).name)
+        for number in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(number, signal.SIG_DFL)
+        bot.stop_polling()
+
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, handler)
+
 
 if __name__ == '__main__':
+    # Импорт модулей выше не создает компонентов бота (см. src.loader),
+    # поэтому время запуска отсчитывается от начала подготовки
+    started_at = time.perf_counter()
+    setup_logging(level=config.LOG_LEVEL,
+                  serialize=config.LOG_FORMAT == 'json',
+                  sample_rate=config.LOG_SAMPLE_RATE)
+    bot = loader.setup()
+    loader.compaction_job.start()
+    loader.notification_sender.start()
+    loader.watch_scheduler.start()
     bot.delete_webhook()
+    logger.info(f'Бот готов к работе за {time.perf_counter() - started_at:.3f} с '
+                f'(подробный отчет об импорте: python -X importtime main.py)')
 
     if '--webhook' in argv[1:]:
-        from data.config import WEBHOOK_URL
-        from src.loader import app
+        from aiohttp import web
 
         logger.info('Запуск бота (Webhook-метод)')
-        bot.set_webhook(url=WEBHOOK_URL)
+        bot.set_webhook(url=config.WEBHOOK_URL)
         web.run_app(
-            app,
+            loader.make_webhook_app(),
             host='0.0.0.0',
             port=8443
         )
     else:
         logger.info('Запуск бота (Polling-метод)')
-        bot.infinity_polling(interval=5)
+        stop_on_signals(bot)
+        # Короткий long polling, чтобы после сигнала остановки не ждать
+        # ответа getUpdates дольше нескольких секунд
+        bot.infinity_polling(interval=5, long_polling_timeout=5)
+        loader.shutdown(config.SHUTDOWN_TIMEOUT, confirm_updates=True)
@@ -0,0 +1,164 @@
+from threading import Condition, Lock
+from typing import List
+
+from loguru import logger
+from telebot import TeleBot
+from telebot.handler_backends import HandlerBackend
+from telebot.types import Message
+
+from src.utils.cache import LRUCache
+
+# Сколько чатов с незавершенным диалогом хранить и как долго (сек.) ждать ответа
+NEXT_STEP_MAX_CHATS = 10000
+NEXT_STEP_TTL = 30 * 60
+# Сколько обработчиков следующего шага хранить для одного чата
+NEXT_STEP_HANDLERS_PER_CHAT = 1
+
+
+class BoundedHandlerBackend(HandlerBackend):
+    """
+    Хранилище обработчиков следующего шага с ограниченным размером
+
+    Стандартное хранилище TeleBot хранит обработчики (а с ними и параметры
+    диалога) до ответа пользователя, то есть бесконечно для брошенных
+    диалогов. Здесь обработчики хранятся не дольше ttl, при переполнении
+    вытесняются чаты, дольше всего не отвечавшие, а для одного чата
+    хранятся только последние обработчики: новый диалог заменяет брошенный.
+
+    Args:
+        maxsize: максимальное количество чатов
+        ttl: время жизни обработчиков в секундах
+        per_chat: максимальное количество обработчиков одного чата
+    """
+
+    def __init__(self,
+                 maxsize: int = NEXT_STEP_MAX_CHATS,
+                 ttl: float = NEXT_STEP_TTL,
+                 per_chat: int = NEXT_STEP_HANDLERS_PER_CHAT):
+        """Конструктор класса"""
+        super().__init__(handlers=LRUCache(maxsize=maxsize, ttl=ttl))
+        self.per_chat: int = per_chat
+        self.__lock = Lock()
+
+    def register_handler(self, handler_group_id, handler) -> None:
+        with self.__lock:
+            handlers = self.handlers.get(handler_group_id, [])
+            self.handlers.set(handler_group_id, [*handlers, handler][-self.per_chat:])
+
+    def clear_handlers(self, handler_group_id) -> None:
+        with self.__lock:
+            self.handlers.pop(handler_group_id)
+
+    def get_handlers(self, handler_group_id) -> list:
+        with self.__lock:
+            return self.handlers.pop(handler_group_id)
+
+    @property
+    def chats(self) -> int:
+        """Количество чатов с сохраненными обработчиками"""
+        return len(self.handlers)
+
+
+class HotelsBot(TeleBot):
+    """
+    TeleBot с исправлениями, необходимыми боту
+
+    Бот считает обработчики, которые выполняются или ждут своей очереди в
+    пуле потоков, чтобы при остановке дождаться их завершения (см. shutdown).
+    """
+
+    def __init__(self, token: str, **kwargs):
+        """Конструктор класса; по умолчанию используется BoundedHandlerBackend"""
+        kwargs.setdefault('next_step_backend', BoundedHandlerBackend())
+        super().__init__(token, **kwargs)
+        self.__in_flight = 0
+        self.__idle = Condition()
+
+    @property
+    def in_flight(self) -> int:
+        """Количество незавершенных обработчиков"""
+        return self.__in_flight
+
+    def _exec_task(self, task, *args, **kwargs) -> None:
+        if not self.threaded:
+            task(*args, **kwargs)
+            return
+        with self.__idle:
+            self.__in_flight += 1
+        super()._exec_task(self.__tracked, task, *args, **kwargs)
+
+    def __tracked(self, task, *args, **kwargs) -> None:
+        try:
+            task(*args, **kwargs)
+        finally:
+            with self.__idle:
+                self.__in_flight -= 1
+                self.__idle.notify_all()
+
+    def drain(self, timeout: float) -> bool:
+        """
+        Дождаться завершения всех обработчиков
+
+        Returns:
+            True, если обработчики завершились за timeout секунд
+        """
+        with self.__idle:
+            return self.__idle.wait_for(lambda: self.__in_flight == 0, timeout)
+
+    def shutdown(self, timeout: float) -> bool:
+        """
+        Прекратить прием обновлений и дождаться завершения обработчиков
+
+        Пул потоков обработчиков останавливается, только если все они
+        завершились: зависший обработчик не блокирует остановку, а
+        завершается вместе с процессом.
+
+        Returns:
+            True, если обработчики завершились за timeout секунд
+        """
+        self.stop_polling()
+        drained = self.drain(timeout)
+        if drained and self.threaded:
+            self.worker_pool.close()
+        return drained
+
+    def confirm_updates(self) -> None:
+        """
+        Подтвердить получение обработанных обновлений (режим polling)
+
+        Telegram считает обновления полученными только после следующего
+        вызова getUpdates со смещением больше их update_id. Без этого
+        вызова последняя пачка обновлений перед остановкой была бы
+        получена повторно после перезапуска. Вызывается после завершения
+        всех обработчиков (см. loader.shutdown). Ошибка запроса не прерывает
+        остановку бота.
+        """
+        if not self.last_update_id:
+            return
+        try:
+            # long_polling_timeout=0 TeleBot заменяет значением по умолчанию (10 с)
+            self.get_updates(offset=self.last_update_id + 1, limit=1, timeout=5, long_polling_timeout=1)
+        except Exception as e:
+            logger.warning('Не удалось подтвердить получение обновлений: {}', e)
+
+    def _notify_next_handlers(self, new_messages: List[Message]) -> None:
+        """
+        Передать сообщения обработчикам следующего шага
+
+        В TeleBot сообщения удаляются из списка прямо во время его обхода,
+        из-за чего при получении нескольких сообщений за один запрос
+        getUpdates каждое второе из них пропускается и попадает в обычные
+        обработчики. Здесь список обходится полностью.
+
+        Args:
+            new_messages: новые сообщения; обработанные удаляются из списка
+        """
+        remaining = []
+        for message in new_messages:
+            handlers = self.next_step_backend.get_handlers(message.chat.id)
+            if not handlers:
+                remaining.append(message)
+                continue
+            for handler in handlers:
+                self._exec_task(handler['callback'], message, *handler['args'], **handler['kwargs'])
+        new_messages[:] = remaining
@@ -1 +1,2 @@
+from .exceptions import UndefinedLocale, CircuitOpen, DeadlineExceeded
 from .requester import *
@@ -0,0 +1,182 @@
+from collections import deque
+from threading import Lock
+from time import monotonic
+from typing import Any, Dict
+
+from .exceptions import CircuitOpen
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель для одного эндпоинта Hotels API
+
+    Хранит результаты последних запросов в скользящем окне. Если доля
+    неудачных или слишком медленных запросов превышает порог, выключатель
+    размыкается и все запросы сразу завершаются исключением CircuitOpen.
+    По прошествии reset_timeout выключатель переходит в полуоткрытое
+    состояние и пропускает ограниченное число пробных запросов: успешные
+    пробы замыкают его обратно, неудачная – снова размыкает. Результаты
+    запросов, начатых до размыкания и завершившихся в разомкнутом
+    состоянии, не учитываются.
+
+    Args:
+        name: имя эндпоинта (используется в сообщениях и метриках)
+        window_size: размер скользящего окна (количество запросов)
+        min_calls: минимальное число запросов в окне для оценки порогов
+        failure_rate: допустимая доля неудачных запросов (0..1)
+        slow_call_rate: допустимая доля медленных запросов (0..1)
+        slow_call_duration: длительность запроса (сек.), после которой он считается медленным
+        reset_timeout: время (сек.) в разомкнутом состоянии до пробных запросов
+        half_open_calls: количество пробных запросов в полуоткрытом состоянии
+    """
+
+    def __init__(self,
+                 name: str,
+                 window_size: int = 20,
+                 min_calls: int = 5,
+                 failure_rate: float = 0.5,
+                 slow_call_rate: float = 0.8,
+                 slow_call_duration: float = 5.0,
+                 reset_timeout: float = 30.0,
+                 half_open_calls: int = 2):
+        """Конструктор класса"""
+        self.name: str = name
+        self.min_calls: int = min_calls
+        self.failure_rate: float = failure_rate
+        self.slow_call_rate: float = slow_call_rate
+        self.slow_call_duration: float = slow_call_duration
+        self.reset_timeout: float = reset_timeout
+        self.half_open_calls: int = half_open_calls
+
+        self.__calls: deque = deque(maxlen=window_size)
+        self.__state: str = CLOSED
+        self.__opened_at: float = 0.0
+        self.__probes_left: int = 0
+        self.__probe_successes: int = 0
+        self.__rejected: int = 0
+        self.__lock = Lock()
+
+    @property
+    def state(self) -> str:
+        """Текущее состояние выключателя: closed, open или half_open"""
+        with self.__lock:
+            self.__refresh_state()
+            return self.__state
+
+    def before_call(self) -> None:
+        """
+        Проверить, можно ли выполнить запрос
+
+        Raises:
+            CircuitOpen: если выключатель разомкнут или лимит пробных запросов исчерпан
+        """
+        with self.__lock:
+            self.__refresh_state()
+            if self.__state == CLOSED:
+                return
+            if self.__state == HALF_OPEN and self.__probes_left > 0:
+                self.__probes_left -= 1
+                return
+            self.__rejected += 1
+        raise CircuitOpen(f'circuit for "{self.name}" is open')
+
+    def on_success(self, duration: float) -> None:
+        """
+        Зафиксировать успешный запрос
+
+        Args:
+            duration: длительность запроса в секундах
+        """
+        slow = duration >= self.slow_call_duration
+        with self.__lock:
+            if self.__state == OPEN:
+                return
+            if self.__state == HALF_OPEN:
+                if slow:
+                    self.__open()
+                    return
+                self.__probe_successes += 1
+                if self.__probe_successes >= self.half_open_calls:
+                    self.__close()
+                return
+            self.__calls.append((True, slow))
+            self.__evaluate()
+
+    def on_failure(self, duration: float) -> None:
+        """
+        Зафиксировать неудачный запрос
+
+        Args:
+            duration: длительность запроса в секундах
+        """
+        slow = duration >= self.slow_call_duration
+        with self.__lock:
+            if self.__state == OPEN:
+                return
+            if self.__state == HALF_OPEN:
+                self.__open()
+                return
+            self.__calls.append((False, slow))
+            self.__evaluate()
+
+    def on_cancel(self) -> None:
+        """
+        Зафиксировать запрос, прерванный не по вине эндпоинта
+
+        Например, по крайнему сроку вызывающего кода. Запрос не попадает в
+        окно, а в полуоткрытом состоянии пробный запрос возвращается, чтобы
+        выключатель не остался без проб.
+        """
+        with self.__lock:
+            if self.__state == HALF_OPEN:
+                self.__probes_left = min(self.__probes_left + 1, self.half_open_calls)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Получить состояние выключателя для метрик
+
+        Returns:
+            Словарь с состоянием, количеством запросов в окне,
+            долями неудачных и медленных запросов и числом отклоненных запросов
+        """
+        with self.__lock:
+            self.__refresh_state()
+            calls = len(self.__calls)
+            failures = sum(1 for ok, _ in self.__calls if not ok)
+            slow = sum(1 for _, is_slow in self.__calls if is_slow)
+            return {'name': self.name,
+                    'state': self.__state,
+                    'calls': calls,
+                    'failure_rate': failures / calls if calls else 0.0,
+                    'slow_call_rate': slow / calls if calls else 0.0,
+                    'rejected': self.__rejected}
+
+    def __refresh_state(self) -> None:
+        """Перевести разомкнутый выключатель в полуоткрытое состояние по таймауту"""
+        if self.__state == OPEN and monotonic() - self.__opened_at >= self.reset_timeout:
+            self.__state = HALF_OPEN
+            self.__probes_left = self.half_open_calls
+            self.__probe_successes = 0
+
+    def __evaluate(self) -> None:
+        """Разомкнуть выключатель, если превышен один из порогов"""
+        calls = len(self.__calls)
+        if calls < self.min_calls:
+            return
+        failures = sum(1 for ok, _ in self.__calls if not ok)
+        slow = sum(1 for _, is_slow in self.__calls if is_slow)
+        if failures / calls >= self.failure_rate or slow / calls >= self.slow_call_rate:
+            self.__open()
+
+    def __open(self) -> None:
+        self.__state = OPEN
+        self.__opened_at = monotonic()
+        self.__calls.clear()
+
+    def __close(self) -> None:
+        self.__state = CLOSED
+        self.__calls.clear()
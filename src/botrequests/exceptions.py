@@ -1,7 +1,16 @@
 """
 Исключения, использующиеся в botrequests
 """
+import requests
 
 
 class UndefinedLocale(Exception):
     """Не удалось определить локаль"""
+
+
+class CircuitOpen(Exception):
+    """Запрос отклонен: автоматический выключатель эндпоинта разомкнут"""
+
+
+class DeadlineExceeded(requests.Timeout):
+    """Запрос не выполнен: истек срок, отведенный на поиск"""
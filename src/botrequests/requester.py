@@ -1,47 +1,153 @@
 from datetime import date, timedelta
-from typing import Optional, Dict, List, Any, Union
+from itertools import chain, islice
+from time import monotonic
+from typing import Optional, Dict, List, Any, Union, Iterator, Tuple, Callable, Sequence
 
 import requests
 from loguru import logger
 
-from src.utils.locale_from_string import locale_from_string
-from .exceptions import UndefinedLocale
+from src.utils.cache import LRUCache
+from src.utils.deadline import Deadline
+from src.utils.fan_out import FanOut
+from src.utils.normalization import NormalizedCity, normalize_city
+from .circuit_breaker import CircuitBreaker
+from .exceptions import DeadlineExceeded, UndefinedLocale
+
+API_HOST = 'hotels4.p.rapidapi.com'
+API_URL = f'https://{API_HOST}'
+ENDPOINTS = ('locations/v2/search', 'properties/list', 'properties/get-hotel-photos')
+
+# Таймауты (сек.) на установку соединения и чтение ответа
+REQUEST_TIMEOUT = (3.05, 10)
+# Меньше этого времени (сек.) до крайнего срока запрос не отправляется
+MIN_REQUEST_TIME = 0.1
+# Коды ответа, которые считаются отказом эндпоинта
+FAILURE_STATUS_CODES = (429, 500, 502, 503, 504)
+# Бот показывает не больше 10 фотографий, поэтому остальные не хранятся
+PHOTOS_INDEX_LIMIT = 10
+# Время (сек.), в течение которого списки отелей берутся из кэша
+LISTINGS_TTL = 15 * 60
+# Максимальное количество одновременных запросов при переборе дат
+FAN_OUT_WORKERS = 8
 
 
 class HotelsRequester:
     """
     Класс для работы с запросами в Hotels API
+
+    Каждый эндпоинт защищен собственным автоматическим выключателем
+    (CircuitBreaker): при деградации API запросы к нему сразу завершаются
+    исключением CircuitOpen, не занимая потоки обработчиков.
+
+    Методы запросов принимают необязательный крайний срок (Deadline):
+    таймауты запроса сокращаются до оставшегося времени, а после его
+    истечения запросы к API не отправляются (DeadlineExceeded). Данные из
+    кэша возвращаются и после истечения срока.
+
+    Args:
+        api_key: ключ доступа к Rapid API
+        base_url: адрес Hotels API (например, локального симулятора для нагрузочных тестов)
+        breaker_options: параметры для CircuitBreaker каждого эндпоинта
     """
 
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, base_url: str = API_URL, **breaker_options):
         self.__api_key: str = api_key
+        self.base_url: str = base_url.rstrip('/')
+        self.__session = requests.Session()
+        self.__breakers: Dict[str, CircuitBreaker] = {
+            endpoint: CircuitBreaker(endpoint, **breaker_options)
+            for endpoint in ENDPOINTS
+        }
+        self.__destinations = LRUCache(maxsize=4096, ttl=24 * 60 * 60)
+        self.__photos = LRUCache(maxsize=4096, ttl=6 * 60 * 60)
+        self.__listings = LRUCache(maxsize=2048, ttl=LISTINGS_TTL)
+        self.__fan_out = FanOut(max_workers=FAN_OUT_WORKERS, name='hotels-fan-out')
+
+    def close(self) -> None:
+        """Закрыть HTTP-сессию и остановить пул потоков перебора дат"""
+        self.__fan_out.shutdown(wait=False)
+        self.__session.close()
+
+    def circuit_states(self) -> List[Dict[str, Any]]:
+        """
+        Получить состояния автоматических выключателей эндпоинтов для метрик
+
+        Returns:
+            Список словарей (см. CircuitBreaker.snapshot)
+        """
+        return [breaker.snapshot() for breaker in self.__breakers.values()]
 
     def make_request(self,
-                     url: str,
-                     params: Dict[str, Any]) -> requests.Response:
+                     endpoint: str,
+                     params: Dict[str, Any],
+                     deadline: Optional[Deadline] = None) -> requests.Response:
         """
         Отправить get-запрос к Hotels.com
 
         Args:
-            url: целевой URL-адрес
+            endpoint: путь эндпоинта относительно base_url
             params: параметры запроса
+            deadline: крайний срок запроса (None – только REQUEST_TIMEOUT)
 
         Returns:
             Объект Response
+
+        Raises:
+            CircuitOpen: если выключатель эндпоинта разомкнут
+            DeadlineExceeded: если срок истек до запроса или во время него
+            requests.RequestException: при ошибке соединения, таймауте или ответе с кодом отказа
         """
         headers = {
-            'x-rapidapi-host': 'hotels4.p.rapidapi.com',
+            'x-rapidapi-host': API_HOST,
             'x-rapidapi-key': self.__api_key
         }
-
-        response = requests.get(url, headers=headers, params=params)
+        timeout = REQUEST_TIMEOUT
+        if deadline is not None:
+            remaining = deadline.remaining
+            if remaining <= MIN_REQUEST_TIME:
+                raise DeadlineExceeded(f'no time left for "{endpoint}"')
+            timeout = (min(REQUEST_TIMEOUT[0], remaining), min(REQUEST_TIMEOUT[1], remaining))
+        breaker = self.__breakers[endpoint]
+        breaker.before_call()
+
+        started_at = monotonic()
+        try:
+            response = self.__session.get(f'{self.base_url}/{endpoint}', headers=headers,
+                                          params=params, timeout=timeout)
+            if response.status_code in FAILURE_STATUS_CODES:
+                response.raise_for_status()
+        except requests.Timeout as e:
+            duration = monotonic() - started_at
+            stage = 0 if isinstance(e, requests.ConnectTimeout) else 1
+            clipped = timeout[stage] < REQUEST_TIMEOUT[stage]
+            if clipped and duration < breaker.slow_call_duration:
+                # Крайний срок оставил меньше времени, чем нужно исправному
+                # эндпоинту: таймаут не учитывается выключателем
+                breaker.on_cancel()
+            else:
+                # Эндпоинт не ответил за время, достаточное для исправного
+                # запроса, даже если таймаут был сокращен крайним сроком
+                breaker.on_failure(duration)
+            if clipped:
+                raise DeadlineExceeded(f'"{endpoint}" did not respond in {timeout[stage]:.1f} s') from e
+            raise
+        except requests.RequestException:
+            breaker.on_failure(monotonic() - started_at)
+            raise
+        breaker.on_success(monotonic() - started_at)
         return response
 
     def request_bestdeal(self,
                          destination_id: str,
                          count: int,
                          min_price: int,
-                         max_price: int) -> List[Dict[str, Any]]:
+                         max_price: int,
+                         locale: str = 'ru_RU',
+                         check_in: Optional[date] = None,
+                         check_out: Optional[date] = None,
+                         adults: int = 1,
+                         deadline: Optional[Deadline] = None,
+                         page: int = 1) -> List[Dict[str, Any]]:
         """
         Сделать запрос на ближайшие к центру отели в определенном диапазоне цен
 
@@ -50,39 +156,40 @@ class HotelsRequester:
             count: количество отелей в результате
             min_price: мин. значение диапазона цены
             max_price: макс. значение диапазона цены
+            locale: локаль результатов ("ru_RU" или "en_US")
+            check_in: дата заезда (по умолчанию – сегодня)
+            check_out: дата выезда (по умолчанию – на следующий день после заезда)
+            adults: количество взрослых гостей
+            deadline: крайний срок запроса
+            page: номер страницы результатов, начиная с 1
 
         Returns:
             Результат запроса в виде списка словарей
         """
         landmark_id = destination_id
-        check_in = date.today()
-        check_out = check_in + timedelta(days=1)
 
-        url = 'https://hotels4.p.rapidapi.com/properties/list'
         query_params = {'destinationId': destination_id,
-                        'pageNumber': '1',
+                        'pageNumber': str(page),
                         'pageSize': count,
-                        'checkIn': check_in,
-                        'checkOut': check_out,
-                        'adults1': '1',
+                        **stay_params(check_in, check_out, adults),
                         'sortOrder': 'DISTANCE_FROM_LANDMARK',
                         'landmarkIds': landmark_id,
                         'priceMin': min_price,
                         'priceMax': max_price,
-                        'locale': 'ru_RU',
+                        'locale': locale,
                         'currency': 'RUB'}
 
-        try:
-            response = self.make_request(url, query_params).json()
-        except (requests.ConnectionError, requests.Timeout) as e:
-            logger.error(f'Ошибка при отправке запроса (bestdeal): {e}')
-            raise
-        return response['data']['body']['searchResults']['results']
+        return self.list_properties(query_params, 'bestdeal', deadline)
 
     def request_by_price(self,
                          sort_order: str,
                          destination_id: str,
-                         count: int, ) -> List[Dict[str, Any]]:
+                         count: int,
+                         locale: str = 'ru_RU',
+                         check_in: Optional[date] = None,
+                         check_out: Optional[date] = None,
+                         adults: int = 1,
+                         deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
         """
         Запросить отели города с сортировкой по цене
 
@@ -90,6 +197,11 @@ class HotelsRequester:
             sort_order: порядок сортировки. "low" – от меньшего к большему; "high" – от большего к меньшему
             destination_id: destinationId города
             count: количество отелей в результате
+            locale: локаль результатов ("ru_RU" или "en_US")
+            check_in: дата заезда (по умолчанию – сегодня)
+            check_out: дата выезда (по умолчанию – на следующий день после заезда)
+            adults: количество взрослых гостей
+            deadline: крайний срок запроса
 
         Returns:
             Результат запроса в виде списка словарей
@@ -101,78 +213,271 @@ class HotelsRequester:
             raise ValueError('invalid value, "low" or "high" is expected')
 
         sort_order = 'PRICE' if sort_order == 'low' else 'PRICE_HIGHEST_FIRST'
-        check_in = date.today()
-        check_out = check_in + timedelta(days=1)
 
-        url = 'https://hotels4.p.rapidapi.com/properties/list'
         query_params = {'destinationId': destination_id,
                         'sortOrder': sort_order,
                         'pageSize': count,
-                        'checkIn': check_in.strftime('%Y-%m-%d'),
-                        'checkOut': check_out.strftime('%Y-%m-%d'),
+                        **stay_params(check_in, check_out, adults),
                         'pageNumber': '1',
-                        'adults1': '1',
-                        'locale': 'ru_RU',
+                        'locale': locale,
                         'currency': 'RUB'}
 
+        return self.list_properties(query_params, 'by_price', deadline)
+
+    def list_properties(self,
+                        query_params: Dict[str, Any],
+                        label: str,
+                        deadline: Optional[Deadline] = None) -> List[Dict[str, Any]]:
+        """
+        Запросить список отелей (properties/list) с кэшированием
+
+        Ответы кэшируются на LISTINGS_TTL по всем параметрам запроса, то есть
+        по городу, датам, гостям, сортировке и фильтрам. В кэше и в
+        результате остаются только поля, нужные боту (см. compact_listing).
+
+        Args:
+            query_params: параметры запроса
+            label: название запроса для журнала
+            deadline: крайний срок запроса
+
+        Returns:
+            Результат запроса в виде списка словарей
+        """
+        cache_key = tuple(sorted((key, str(value)) for key, value in query_params.items()))
+        results = self.__listings.get(cache_key)
+        if results is not None:
+            return results
+
         try:
-            response = self.make_request(url, query_params).json()
+            response = self.make_request('properties/list', query_params, deadline).json()
         except requests.RequestException as e:
-            logger.error(f'Ошибка при отправке запроса (by_price): {e}')
+            logger.error('Ошибка при отправке запроса ({}): {}', label, e)
             raise
-        return response['data']['body']['searchResults']['results']
+        results = [compact_listing(hotel) for hotel in response['data']['body']['searchResults']['results']]
+        self.__listings.set(cache_key, results)
+        return results
+
+    def request_cheapest_dates(self,
+                               search: Callable[..., List[Dict[str, Any]]],
+                               windows: Sequence[Tuple[date, date]],
+                               count: int,
+                               reverse: bool = False,
+                               **search_params) -> List[Dict[str, Any]]:
+        """
+        Найти для отелей самые дешевые даты среди нескольких окон
+
+        Запросы для всех окон выполняются параллельно (не больше
+        FAN_OUT_WORKERS одновременно на весь бот) и кэшируются как обычные
+        запросы списка отелей. Для каждого отеля остается самое дешевое
+        окно, результаты упорядочиваются по цене.
 
-    def request_photos(self, hotel_id: Union[str, int]) -> List[str]:
+        Args:
+            search: метод запроса (request_by_price или request_bestdeal)
+            windows: окна дат (дата заезда, дата выезда)
+            count: количество отелей в результате
+            reverse: упорядочить по убыванию цены
+            search_params: остальные параметры метода search (в том числе
+                deadline – общий срок для всех окон)
+
+        Returns:
+            Результаты в формате properties/list; у каждого элемента есть
+            ключ "stay" с датами заезда и выезда ("checkIn", "checkOut")
+
+        Raises:
+            CircuitOpen, requests.RequestException: если не удалось выполнить
+                ни одного запроса
+        """
+        def search_window(window: Tuple[date, date]) -> List[Dict[str, Any]]:
+            check_in, check_out = window
+            return search(count=count, check_in=check_in, check_out=check_out, **search_params)
+
+        cheapest: Dict[Any, Dict[str, Any]] = {}
+        results = self.__fan_out.map(search_window, windows)
+        for (check_in, check_out), hotels, error in results:
+            if error is not None:
+                logger.warning('Не удалось получить отели на {}: {}', check_in, error)
+                continue
+            for hotel in hotels:
+                known = cheapest.get(hotel['id'])
+                if known is None or hotel_price(hotel) < hotel_price(known):
+                    cheapest[hotel['id']] = dict(hotel, stay={'checkIn': check_in.isoformat(),
+                                                              'checkOut': check_out.isoformat()})
+
+        if not cheapest and results and all(result.error is not None for result in results):
+            raise results[0].error
+        return sorted(cheapest.values(), key=hotel_price, reverse=reverse)[:count]
+
+    def request_photos(self,
+                       hotel_id: Union[str, int],
+                       size: str = 'w',
+                       deadline: Optional[Deadline] = None) -> List[str]:
         """
         Запросить фотографии отеля
 
         Args:
             hotel_id: идентификатор отеля
+            size: код размера изображения для подстановки в шаблон ссылки
+            deadline: крайний срок запроса
 
         Returns:
             Результат запроса (список с ссылками на изображения)
         """
-        url = 'https://hotels4.p.rapidapi.com/properties/get-hotel-photos'
+        return list(self.iter_photos(hotel_id, size=size, deadline=deadline))
+
+    def iter_photos(self,
+                    hotel_id: Union[str, int],
+                    limit: Optional[int] = None,
+                    size: str = 'w',
+                    deadline: Optional[Deadline] = None) -> Iterator[str]:
+        """
+        Лениво получить ссылки на фотографии отеля
+
+        Индекс фотографий отеля запрашивается у API один раз и хранится в
+        кэше в виде шаблонов ссылок, а размер подставляется только в те
+        ссылки, которые действительно были запрошены.
+
+        Args:
+            hotel_id: идентификатор отеля
+            limit: максимальное количество ссылок (None – все доступные)
+            size: код размера изображения для подстановки в шаблон ссылки
+            deadline: крайний срок запроса индекса фотографий
+
+        Returns:
+            Генератор ссылок на изображения
+        """
+        templates = self.photo_index(hotel_id, deadline)
+        for template in islice(templates, limit):
+            yield template.replace('{size}', size)
+
+    def photo_index(self,
+                    hotel_id: Union[str, int],
+                    deadline: Optional[Deadline] = None) -> Tuple[str, ...]:
+        """
+        Получить индекс фотографий отеля (шаблоны ссылок с "{size}")
+
+        Args:
+            hotel_id: идентификатор отеля
+            deadline: крайний срок запроса
+
+        Returns:
+            Кортеж шаблонов ссылок, не длиннее PHOTOS_INDEX_LIMIT
+        """
+        cache_key = str(hotel_id)
+        templates = self.__photos.get(cache_key)
+        if templates is not None:
+            return templates
+
         query_params = {'id': hotel_id}
 
         try:
-            response = self.make_request(url, query_params).json()
+            response = self.make_request('properties/get-hotel-photos', query_params, deadline).json()
+        except DeadlineExceeded:
+            raise
         except requests.RequestException as e:
-            logger.error(f'Ошибка во время запроса фотографий: {e}')
+            logger.error('Ошибка во время запроса фотографий: {}', e)
             raise
 
-        result = []
-        for image in response['hotelImages']:
-            image_link = image['baseUrl'].replace('{size}', 'w')
-            result.append(image_link)
-        for image in response['roomImages']:
-            image_link = image['images'][0]['baseUrl'].replace('{size}', 'w')
-            result.append(image_link)
+        hotel_images = (image['baseUrl'] for image in response['hotelImages'])
+        room_images = (image['images'][0]['baseUrl'] for image in response['roomImages'])
+        templates = tuple(islice(chain(hotel_images, room_images), PHOTOS_INDEX_LIMIT))
 
-        return result
+        self.__photos.set(cache_key, templates)
+        return templates
 
-    def search_destination(self, city_name: str) -> Optional[str]:
+    def search_destination(self,
+                           city: Union[str, NormalizedCity],
+                           deadline: Optional[Deadline] = None) -> Optional[str]:
         """
         Поиск местоположения в Hotels API по названию города
 
+        Найденные destinationId кэшируются по каноническому ключу города,
+        поэтому повторные запросы того же города (в том числе в другом
+        написании) не обращаются к API, даже при разомкнутом выключателе.
+
         Args:
-            :param city_name: название города в свободном формате
+            city: название города в свободном формате или результат normalize_city
+            deadline: крайний срок запроса
 
         Returns:
             destinationId (str) или None, если местоположение не было найдено
 
         Raises:
             UndefinedLocale: если не удалось определить локаль строки с наименованием города
+            CircuitOpen: если выключатель эндпоинта разомкнут, а в кэше нет результата
         """
-        locale = locale_from_string(city_name)
-        if not locale:
+        if isinstance(city, str):
+            city = normalize_city(city)
+        if city is None:
             raise UndefinedLocale('failed to determine locale')
 
-        url = 'https://hotels4.p.rapidapi.com/locations/v2/search'
-        query_params = {'query': city_name, 'locale': locale}
+        destination_id = self.__destinations.get(city.key)
+        if destination_id is not None:
+            return destination_id
+
+        query_params = {'query': city.text, 'locale': city.locale}
 
-        response = self.make_request(url, query_params).json()
+        response = self.make_request('locations/v2/search', query_params, deadline).json()
         try:
-            return response['suggestions'][0]['entities'][0]['destinationId']
+            destination_id = response['suggestions'][0]['entities'][0]['destinationId']
         except (KeyError, IndexError):
             return None
+        self.__destinations.set(city.key, destination_id)
+        return destination_id
+
+
+def stay_params(check_in: Optional[date] = None,
+                check_out: Optional[date] = None,
+                adults: int = 1) -> Dict[str, str]:
+    """
+    Параметры дат проживания и гостей для properties/list
+
+    Args:
+        check_in: дата заезда (по умолчанию – сегодня)
+        check_out: дата выезда (по умолчанию – на следующий день после заезда)
+        adults: количество взрослых гостей
+
+    Returns:
+        Словарь с ключами checkIn, checkOut и adults1
+    """
+    check_in = check_in or date.today()
+    check_out = check_out or check_in + timedelta(days=1)
+    return {'checkIn': check_in.isoformat(),
+            'checkOut': check_out.isoformat(),
+            'adults1': str(adults)}
+
+
+def compact_listing(hotel: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Оставить в элементе properties/list только поля, которые использует бот
+
+    Элемент ответа API содержит десятки полей (отзывы, координаты,
+    миниатюры и т.д.), а кэш списков хранит тысячи элементов. Отсутствующие
+    в ответе поля не добавляются.
+
+    Returns:
+        Словарь с полями id, name, address, landmarks и ratePlan.price
+    """
+    compact = {key: hotel[key] for key in ('id', 'name') if key in hotel}
+    if 'address' in hotel:
+        compact['address'] = {key: value for key, value in hotel['address'].items()
+                              if key in ('streetAddress', 'locality', 'countryName')}
+    if 'landmarks' in hotel:
+        compact['landmarks'] = [{'label': landmark.get('label'), 'distance': landmark.get('distance')}
+                                for landmark in hotel['landmarks']]
+    price = (hotel.get('ratePlan') or {}).get('price')
+    if price is not None:
+        compact['ratePlan'] = {'price': {key: price[key] for key in ('current', 'exactCurrent') if key in price}}
+    return compact
+
+
+def hotel_price(hotel: Dict[str, Any]) -> float:
+    """
+    Получить цену отеля из элемента properties/list
+
+    Returns:
+        Цена или бесконечность, если у отеля нет цены (например, нет мест)
+    """
+    try:
+        return float(hotel['ratePlan']['price']['exactCurrent'])
+    except (KeyError, TypeError, ValueError):
+        return float('inf')
@@ -1,7 +1,41 @@
-from .bestdeal import on_bestdeal
-from .help import on_help
-from .highprice import on_highprice
-from .lowprice import on_lowprice
-from .start import on_start
-from .history import on_history
-from .any_message import on_any_message
+def register_handlers(bot) -> None:
+    """
+    Зарегистрировать обработчики сообщений бота
+
+    Модули обработчиков не обращаются к компонентам из src.loader при
+    импорте: бот передается сюда явно, а остальные компоненты берутся из
+    loader при обработке сообщения. Обработчики проверяются в порядке
+    регистрации, поэтому on_any_message регистрируется последним.
+
+    Args:
+        bot: объект бота
+    """
+    from .any_message import on_any_message
+    from .bestdeal import on_bestdeal
+    from .compare import on_compare
+    from .help import on_help
+    from .highprice import on_highprice
+    from .history import on_history
+    from .lowprice import on_lowprice
+    from .processes.quick_pick import CALLBACK_PREFIX
+    from .quick_pick import on_quick_pick
+    from .repeat import on_repeat
+    from .start import on_start
+    from .stats import on_mystats, on_top
+    from .watch import on_unwatch, on_watch, on_watches
+
+    bot.register_message_handler(on_bestdeal, commands=['bestdeal'])
+    bot.register_message_handler(on_help, commands=['help'])
+    bot.register_message_handler(on_highprice, commands=['highprice'])
+    bot.register_message_handler(on_lowprice, commands=['lowprice'])
+    bot.register_message_handler(on_start, commands=['start'])
+    bot.register_message_handler(on_history, commands=['history'])
+    bot.register_message_handler(on_repeat, regexp=r'^/repeat(_\d+)?$')
+    bot.register_message_handler(on_top, commands=['top'])
+    bot.register_message_handler(on_mystats, commands=['mystats'])
+    bot.register_message_handler(on_compare, commands=['compare'])
+    bot.register_callback_query_handler(on_quick_pick, func=lambda call: call.data.startswith(CALLBACK_PREFIX))
+    bot.register_message_handler(on_watch, regexp=r'^/watch(_\d+)?(\s+\d+)?$')
+    bot.register_message_handler(on_watches, commands=['watches'])
+    bot.register_message_handler(on_unwatch, regexp=r'^/unwatch(_\d+)?$')
+    bot.register_message_handler(on_any_message, func=lambda message: True)
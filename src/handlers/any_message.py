@@ -1,18 +1,19 @@
 from loguru import logger
 from telebot.types import Message
 
-from src.loader import bot
+from src import loader
+from src.utils.logs import search_context
 
 
-@bot.message_handler(func=lambda x: True)
 def on_any_message(msg: Message) -> None:
     """Обработчик любого непредвиденного сообщения"""
     sender = msg.from_user
-    log_text = f'Пользователь {sender.username}({sender.id}) прислал сообщение: {msg.text}'
-    logger.info(log_text)
+    with search_context({}):
+        logger.info('Пользователь {}({}) прислал непредвиденное сообщение', sender.username, sender.id)
+        logger.debug('Текст сообщения: {!r}', msg.text)
 
-    chat_id = msg.chat.id
-    text = 'Я тебя не понимаю.\n' \
-           'Лучше взгляни на то, что я умею: /help'
+        chat_id = msg.chat.id
+        text = 'Я тебя не понимаю.\n' \
+               'Лучше взгляни на то, что я умею: /help'
 
-    bot.send_message(chat_id, text)
+        loader.bot.send_message(chat_id, text)
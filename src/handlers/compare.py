@@ -0,0 +1,28 @@
+from loguru import logger
+from telebot.types import Message
+
+from src import loader
+from src.utils.logs import search_context
+from .processes import compare_ask_cities_step
+from .processes.compare import CITIES_PROMPT, choose_cities
+
+
+def on_compare(msg: Message) -> None:
+    """
+    Обработчик команды `/compare`
+
+    Города можно перечислить сразу после команды: `/compare Москва, Казань`.
+    """
+    sender = msg.from_user
+    params = {}
+    with search_context(params):
+        logger.info('Пользователь {}({}) прислал команду "/compare"', sender.username, sender.id)
+
+        chat_id = msg.chat.id
+
+        _, _, cities = msg.text.partition(' ')
+        if cities.strip():
+            choose_cities(chat_id, cities, params)
+            return
+        sent_message = loader.bot.send_message(chat_id, CITIES_PROMPT)
+        loader.bot.register_next_step_handler(sent_message, compare_ask_cities_step, params)
@@ -1,24 +1,30 @@
 from loguru import logger
 from telebot.types import Message
 
-from src.loader import bot
+from src import loader
+from src.utils.logs import search_context
 
 
-@bot.message_handler(commands=['help'])
 def on_help(msg: Message) -> None:
     """Обработчик команды `/help`"""
     sender = msg.from_user
-    log_text = f'Пользователь {sender.username}({sender.id}) прислал команду "/help"'
-    logger.info(log_text)
+    with search_context({}):
+        logger.info('Пользователь {}({}) прислал команду "/help"', sender.username, sender.id)
 
-    chat_id = msg.chat.id
-    text = 'Просто набери одну из команд, а дальше я тебя сориентирую.\n' \
-           'Команды:\n' \
-           '    &#128073; /start – начать работу с ботом;\n' \
-           '    &#128073; /help – посмотреть эту подсказку;\n' \
-           '    &#128073; /lowprice – найти самые дешевые отели в городе;\n' \
-           '    &#128073; /highprice – найти самые дорогие отели в городе;\n' \
-           '    &#128073; /bestdeal – найти отели по заданной цене и отдаленности от центра города;\n' \
-           '    &#128073; /history – посмотреть историю поиска.'
+        chat_id = msg.chat.id
+        text = 'Просто набери одну из команд, а дальше я тебя сориентирую.\n' \
+               'Команды:\n' \
+               '    &#128073; /start – начать работу с ботом;\n' \
+               '    &#128073; /help – посмотреть эту подсказку;\n' \
+               '    &#128073; /lowprice – найти самые дешевые отели в городе;\n' \
+               '    &#128073; /highprice – найти самые дорогие отели в городе;\n' \
+               '    &#128073; /bestdeal – найти отели по заданной цене и отдаленности от центра города;\n' \
+               '    &#128073; /compare – сравнить самые дешевые отели нескольких городов;\n' \
+               '    &#128073; /history – посмотреть историю поиска;\n' \
+               '    &#128073; /repeat – повторить последний поиск;\n' \
+               '    &#128073; /watch &lt;цена&gt; – сообщить, когда в последнем поиске появятся отели дешевле;\n' \
+               '    &#128073; /watches – посмотреть подписки на снижение цен;\n' \
+               '    &#128073; /mystats – посмотреть свою статистику поиска;\n' \
+               '    &#128073; /top – посмотреть самые популярные города (за все время и за неделю).'
 
-    bot.send_message(chat_id, text)
+        loader.bot.send_message(chat_id, text)
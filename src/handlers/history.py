@@ -1,26 +1,33 @@
 from loguru import logger
 from telebot.types import Message
 
-from src.loader import bot, database
+from src import loader
+from src.utils.logs import search_context
+
+# Сколько последних запросов показывать
+HISTORY_PAGE_SIZE = 20
 
 
-@bot.message_handler(commands=['history'])
 def on_history(msg: Message) -> None:
     """Обработчик команды `/history`"""
     sender = msg.from_user
-    chat_id = msg.chat.id
-    log_text = f'Пользователь {sender.username}({sender.id}) прислал команду "/history"'
-    logger.info(log_text)
+    with search_context({}):
+        chat_id = msg.chat.id
+        logger.info('Пользователь {}({}) прислал команду "/history"', sender.username, sender.id)
 
-    history = database.select_from_history(user_id=sender.id)
+        history = loader.database.select_recent_history(user_id=sender.id, limit=HISTORY_PAGE_SIZE)
 
-    if len(history) == 0:
-        text = 'История пока что пуста ;(\n' \
-               'Хороший повод попробовать одну из моих команд: /help'
-        bot.send_message(chat_id, text)
-        return
+        if len(history) == 0:
+            text = 'История пока что пуста ;(\n' \
+                   'Хороший повод попробовать одну из моих команд: /help'
+            loader.bot.send_message(chat_id, text)
+            return
 
-    history_strings = (f'  • /{elem["command"]} – {elem["city"]}' for elem in history)
+        history_strings = (f'  • /{elem["command"]} – {elem["city"]}'
+                           + (f' (повторить: /repeat_{elem["id"]})' if elem['destination_id'] else '')
+                           for elem in history)
 
-    text = '\n'.join(('История запросов: ', *history_strings))
-    bot.send_message(chat_id, text)
+        title = 'История запросов: ' if len(history) < HISTORY_PAGE_SIZE \
+            else f'Последние {HISTORY_PAGE_SIZE} запросов: '
+        text = '\n'.join((title, *history_strings))
+        loader.bot.send_message(chat_id, text)
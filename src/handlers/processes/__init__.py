@@ -1,2 +1,6 @@
 from .search_by_price import ask_city_step as price_ask_city_step
+from .search_by_price import show_hotels as price_show_hotels
 from .search_best_deal import ask_city_step as bestdeal_ask_city_step
+from .search_best_deal import show_hotels as bestdeal_show_hotels
+from .compare import ask_cities_step as compare_ask_cities_step
+from .compare import show_hotels as compare_show_hotels
@@ -0,0 +1,138 @@
+"""
+Карточки отелей для сообщений с результатами поиска
+"""
+import re
+from datetime import date
+from html import escape
+from typing import Any, Dict, NamedTuple, Optional
+
+from src.utils.cache import LRUCache
+
+DEFAULT_LOCALE = 'ru_RU'
+CITY_CENTER_LABELS = frozenset(('Центр города', 'City center'))
+DISTANCE_PATTERN = re.compile(r'^\s*(\d+(?:[.,]\d+)?)\s*(\w*)')
+KILOMETERS_PER_MILE = 1.609344
+
+CARD_TEMPLATES = {
+    'ru_RU': '\n'.join((
+        '<b>{name}</b>',
+        '🏢 <b>Адрес:</b> {address}',
+        '🎯 <b>От центра города:</b> {center_distance}',
+        '💲 <b>Цена:</b> {price}/сутки{stay}',
+        '🔗 <a href="https://ru.hotels.com/ho{id}">Больше информации на сайте</a>'
+    )),
+    'en_US': '\n'.join((
+        '<b>{name}</b>',
+        '🏢 <b>Address:</b> {address}',
+        '🎯 <b>From the city center:</b> {center_distance}',
+        '💲 <b>Price:</b> {price}/night{stay}',
+        '🔗 <a href="https://hotels.com/ho{id}">More information on the website</a>'
+    )),
+}
+NOT_FOUND_TEXT = {'ru_RU': 'не найдено', 'en_US': 'not found'}
+# Строка с датами, если отель найден в режиме самых дешевых дат
+STAY_TEMPLATES = {'ru_RU': '\n📅 <b>Даты:</b> {stay}', 'en_US': '\n📅 <b>Dates:</b> {stay}'}
+
+_rendered_cards = LRUCache(maxsize=4096, ttl=60 * 60)
+
+
+class HotelRecord(NamedTuple):
+    """
+    Разобранный результат поиска отеля
+
+    Строковые поля с суффиксом _html уже экранированы для parse_mode="HTML".
+    Поля stay_html и locale добавлены последними со значениями по умолчанию,
+    чтобы снимки результатов из истории, сохраненные без них, оставались
+    читаемыми. locale задается, когда отели одного ответа найдены в разных
+    локалях (например, при сравнении городов), и заменяет локаль запроса.
+    """
+    id: str
+    name: str
+    name_html: str
+    address_html: str
+    price_html: str
+    center_distance_html: Optional[str]
+    stay_html: Optional[str] = None
+    locale: Optional[str] = None
+
+
+def parse_hotel(elem: Dict[str, Any]) -> HotelRecord:
+    """
+    Разобрать элемент результата запроса к API
+
+    Args:
+        elem: элемент списка результатов properties/list
+
+    Returns:
+        Объект HotelRecord
+    """
+    address = ', '.join((elem['address']['streetAddress'],
+                         elem['address']['locality'],
+                         elem['address']['countryName']))
+    center_distance = next((landmark['distance'] for landmark in elem['landmarks']
+                            if landmark['label'] in CITY_CENTER_LABELS), None)
+    stay = elem.get('stay')
+    stay_html = stay and '{:%d.%m.%Y} – {:%d.%m.%Y}'.format(date.fromisoformat(stay['checkIn']),
+                                                          date.fromisoformat(stay['checkOut']))
+
+    return HotelRecord(id=str(elem['id']),
+                       name=elem['name'],
+                       name_html=escape(elem['name']),
+                       address_html=escape(address),
+                       price_html=escape(str(elem['ratePlan']['price']['current'])),
+                       center_distance_html=center_distance and escape(center_distance),
+                       stay_html=stay_html)
+
+
+def center_distance_km(elem: Dict[str, Any]) -> Optional[float]:
+    """
+    Получить расстояние от отеля до центра города в километрах
+
+    Args:
+        elem: элемент списка результатов properties/list
+
+    Returns:
+        Расстояние или None, если оно не указано или не распознано
+        (например, "1,2 км", "0.7 miles")
+    """
+    distance = next((landmark['distance'] for landmark in elem.get('landmarks', ())
+                     if landmark['label'] in CITY_CENTER_LABELS), None)
+    match = DISTANCE_PATTERN.match(distance or '')
+    if match is None:
+        return None
+    value = float(match.group(1).replace(',', '.'))
+    return value * KILOMETERS_PER_MILE if match.group(2).lower().startswith('mi') else value
+
+
+def render_card(record: HotelRecord, locale: str = DEFAULT_LOCALE) -> str:
+    """
+    Сформировать текст карточки отеля
+
+    Готовые карточки кэшируются по (id отеля, цена, даты, локаль), поэтому
+    часто показываемые отели не форматируются заново.
+
+    Args:
+        record: разобранный результат поиска
+        locale: локаль пользователя ("ru_RU" или "en_US"), если она не
+            задана в record.locale
+
+    Returns:
+        Текст сообщения в формате HTML
+    """
+    locale = record.locale or locale
+    if locale not in CARD_TEMPLATES:
+        locale = DEFAULT_LOCALE
+
+    cache_key = (record.id, record.price_html, record.stay_html, locale)
+    card = _rendered_cards.get(cache_key)
+    if card is None:
+        card = CARD_TEMPLATES[locale].format(
+            id=record.id,
+            name=record.name_html,
+            address=record.address_html,
+            center_distance=record.center_distance_html or NOT_FOUND_TEXT[locale],
+            price=record.price_html,
+            stay=STAY_TEMPLATES[locale].format(stay=record.stay_html) if record.stay_html else ''
+        )
+        _rendered_cards.set(cache_key, card)
+    return card
@@ -0,0 +1,271 @@
+"""
+Сравнение самых дешевых отелей нескольких городов
+
+Города обрабатываются параллельно: сначала для всех ищутся destinationId,
+затем запрашиваются списки отелей по возрастанию цены. Списки
+объединяются в один рейтинг по цене, поэтому поиск длится примерно
+столько же, сколько поиск в самом медленном из городов, а не их сумму.
+
+В параметрах запроса города хранятся списком "cities" (название,
+destinationId и локаль каждого), а в "city" и "destination_id" – через
+запятую, как они показываются в истории.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from loguru import logger
+from telebot.types import Message
+
+from data import config
+from src import loader, utils
+from src.botrequests import CircuitOpen, hotel_price
+from src.utils.db_api.queries import CITIES_SEPARATOR
+from src.utils.logs import traced
+from . import quick_pick
+from .cards import parse_hotel
+from .search_best_deal import build_messages, send_results, save_to_history
+
+REQ_PARAMS_TYPE = Dict[str, Any]
+
+MIN_CITIES = 2
+MAX_CITIES = 3
+CITIES_SEPARATOR_PATTERN = re.compile(r'\s*[,;\n]\s*')
+CITIES_PROMPT = f'Отправь мне от {MIN_CITIES} до {MAX_CITIES} городов через запятую, ' \
+                f'и я покажу самые дешевые отели среди них.\n' \
+                f'Например: <code>Москва, Казань, Сочи</code>'
+
+
+def parse_cities(text: str) -> List[str]:
+    """
+    Разобрать список городов, введенный через запятую
+
+    Повторы (без учета регистра) и пустые элементы отбрасываются.
+    """
+    cities = []
+    for city in CITIES_SEPARATOR_PATTERN.split(text.strip()):
+        if city and city.casefold() not in (elem.casefold() for elem in cities):
+            cities.append(city)
+    return cities
+
+
+def resolve_city(name: str, deadline: Optional[utils.Deadline] = None) -> Optional[Dict[str, str]]:
+    """
+    Найти destinationId города
+
+    Returns:
+        Словарь с ключами city, destination_id и locale или None, если
+        город не найден
+
+    Raises:
+        CircuitOpen, requests.RequestException: при недоступности сервиса
+    """
+    city = utils.normalize_city(name)
+    if city is None:
+        return None
+    destination_id = loader.requester.search_destination(city, deadline=deadline)
+    if destination_id is None:
+        return None
+    return {'city': city.text, 'destination_id': destination_id, 'locale': city.locale}
+
+
+@traced
+def ask_cities_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
+    """
+    Запросить список городов для сравнения
+
+    Args:
+        msg: обрабатываемое сообщение
+        params: параметры запроса
+    """
+    chat_id = msg.chat.id
+    reply = msg.text
+
+    user = msg.from_user
+    logger.debug('Запрос городов для сравнения ({} – {}), ответ: {}', user.username, user.id, reply)
+
+    choose_cities(chat_id, reply or '', params)
+
+
+@traced
+def choose_cities(chat_id: int, text: str, params: REQ_PARAMS_TYPE) -> None:
+    """
+    Найти города из списка и перейти к выбору количества отелей
+
+    При ошибке ввод списка городов запрашивается повторно.
+
+    Args:
+        chat_id: идентификатор чата
+        text: список городов через запятую
+        params: параметры запроса
+    """
+    names = parse_cities(text)
+    if not MIN_CITIES <= len(names) <= MAX_CITIES:
+        text = f'Некорректный ввод: нужно от {MIN_CITIES} до {MAX_CITIES} разных городов через запятую.\n' \
+               f'Попробуй еще раз'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_cities_step, params)
+        return
+
+    deadline = utils.Deadline(config.SEARCH_DEADLINE)
+    results = loader.compare_fan_out.map(lambda name: resolve_city(name, deadline), names)
+    errors = [result.error for result in results if result.error is not None]
+    not_found = [result.item for result in results if result.error is None and result.value is None]
+    if errors:
+        if any(isinstance(error, CircuitOpen) for error in errors):
+            text = 'Сервис Hotels.com сейчас недоступен.\n' \
+                   'Попробуй еще раз через пару минут'
+        else:
+            text = 'Ошибка: неудачная попытка соединения во время поиска городов.\n' \
+                   'Попробуй еще раз'
+            logger.error('Ошибка при запросе destinationId: {}', errors[0])
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_cities_step, params)
+        return
+    if not_found:
+        text = f'Некорректный ввод: не удалось найти {", ".join(not_found)}.\n' \
+               f'Попробуй набрать что-то другое'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_cities_step, params)
+        return
+
+    cities = [result.value for result in results]
+    params['cities'] = cities
+    params['city'] = CITIES_SEPARATOR.join(elem['city'] for elem in cities)
+    params['destination_id'] = ','.join(elem['destination_id'] for elem in cities)
+    # Локаль первого города используется там, где нужна одна локаль на весь
+    # запрос; карточки отелей показываются в локали своего города
+    params['locale'] = cities[0]['locale']
+
+    sent_message = quick_pick.send_step(chat_id, 'preset', 'compare', params)
+    loader.bot.register_next_step_handler(sent_message, ask_count_step, params)
+
+
+@traced
+def ask_count_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
+    """
+    Запросить количество отелей для поиска
+
+    Args:
+        msg: обрабатываемое сообщение
+        params: параметры запроса
+    """
+    chat_id = msg.chat.id
+    reply = msg.text
+
+    user = msg.from_user
+    logger.debug('Запрос количества отелей ({} – {}), ответ: {}', user.username, user.id, reply)
+
+    try:
+        params['results_count'] = int(reply)
+    except ValueError:
+        text = 'Некорректный ввод: требуется число.'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_count_step, params)
+        return
+    if not 0 < params['results_count'] <= 5:
+        text = 'Некорректный ввод: число должно быть в диапазоне от 1 до 5 включительно.'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_count_step, params)
+        return
+
+    text = 'Из фотографий я могу показать 10 штук. Сколько ты хочешь увидеть?\n' \
+           'Если фото не нужны, то просто отправь <code>0</code>'
+    sent_message = loader.bot.send_message(chat_id, text)
+    loader.bot.register_next_step_handler(sent_message, ask_photos_step, params)
+
+
+@traced
+def ask_photos_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
+    """
+    Запросить количество фото
+
+    Args:
+        msg: обрабатываемое сообщение
+        params: параметры запроса
+    """
+    chat_id = msg.chat.id
+    reply = msg.text
+
+    user = msg.from_user
+    logger.debug('Запрос количества фото ({} – {}), ответ: {}', user.username, user.id, reply)
+
+    try:
+        params['photos_count'] = int(reply)
+    except ValueError:
+        text = 'Некорректный ввод: требуется число.'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_photos_step, params)
+        return
+    if not 0 <= params['photos_count'] <= 10:
+        text = 'Некорректный ввод: число должно быть в диапазоне от 0 до 10 включительно.'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_photos_step, params)
+        return
+
+    show_hotels(params, chat_id)
+
+
+@traced
+def show_hotels(req_params: REQ_PARAMS_TYPE, chat_id: int, announce: bool = True) -> None:
+    """
+    Показать объединенные результаты поиска по всем городам
+
+    Если часть городов не удалось запросить, показываются результаты
+    остальных и сообщается, какие города пропущены.
+
+    Args:
+        req_params: параметры запроса
+        chat_id: идентификатор чата
+        announce: показывать ли сообщение "Поиск…" на время запроса
+    """
+    quick_pick.forget(chat_id)
+    count = req_params['results_count']
+    deadline = utils.Deadline(config.SEARCH_DEADLINE)
+
+    def search_city(city: Dict[str, str]) -> List[Dict[str, Any]]:
+        return loader.requester.request_by_price(sort_order='low',
+                                                 destination_id=city['destination_id'],
+                                                 count=count,
+                                                 locale=city['locale'],
+                                                 deadline=deadline)
+
+    status_message = loader.bot.send_message(chat_id, 'Поиск…') if announce else None
+    try:
+        logger.info('Отправка запросов сравнения городов для {chat_id}: {city}', chat_id=chat_id, city=req_params['city'])
+        results = loader.compare_fan_out.map(search_city, req_params['cities'])
+    finally:
+        if status_message is not None:
+            loader.bot.delete_message(chat_id, status_message.id)
+
+    failed = [result for result in results if result.error is not None]
+    for result in failed:
+        logger.error('Ошибка при поисковом запросе отелей ({}): {}', result.item['city'], result.error)
+    if len(failed) == len(results):
+        if any(isinstance(result.error, CircuitOpen) for result in failed):
+            text = 'Сервис Hotels.com сейчас недоступен.\n' \
+                   'Попробуй повторить поиск через пару минут.'
+        else:
+            text = 'Произошла ошибка при соединении с Hotels.com\n' \
+                   'Попробуй еще раз.'
+        loader.bot.send_message(chat_id, text)
+        return
+    logger.info('Запросы сравнения для {chat_id} выполнены, ошибок: {errors}', chat_id=chat_id, errors=len(failed))
+
+    search_results = sorted(((elem, result.item['locale'])
+                             for result in results if result.error is None for elem in result.value),
+                            key=lambda pair: hotel_price(pair[0]))[:count]
+    if failed:
+        text = f'Не удалось получить отели: {", ".join(result.item["city"] for result in failed)}.\n' \
+               f'Показываю результаты по остальным городам.'
+        loader.bot.send_message(chat_id, text)
+    if not search_results:
+        text = 'По твоему запросу ничего не найдено.\n' \
+               'Попробуй указать другие города: /compare'
+        loader.bot.send_message(chat_id, text)
+        return
+
+    records = [parse_hotel(elem)._replace(locale=locale) for elem, locale in search_results]
+    messages = build_messages(records, req_params['photos_count'], req_params['locale'], deadline)
+    send_results(chat_id, messages)
+
+    save_to_history(chat_id, 'compare', req_params, records)
@@ -0,0 +1,248 @@
+"""
+Быстрый выбор параметров поиска inline-кнопками
+
+Каждый шаг диалога поиска отправляется одним сообщением с подсказкой и
+inline-клавиатурой готовых вариантов. Нажатие кнопки обрабатывается
+запросом обратного вызова (см. src.handlers.quick_pick): сообщение шага
+редактируется на месте, а не отправляется заново. Ввод текстом на каждом
+шаге по-прежнему работает – для него регистрируется обработчик
+следующего шага.
+
+Состояние диалога хранится по идентификатору чата; callback_data кнопки
+содержит только шаг и номер варианта: "qp:<шаг>:<номер>". Кнопки
+количества гостей ("qp:adults:<гостей>") не меняют шаг, а только отмечают
+выбор на клавиатуре шага stay.
+"""
+from html import escape
+from typing import Any, Dict, List, Optional, Tuple
+
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from src import loader
+from src.utils.cache import LRUCache
+from .stay import MAX_ADULTS, STAY_OPTIONS, describe_stay
+
+CALLBACK_PREFIX = 'qp:'
+# Время (сек.), в течение которого кнопки диалога остаются действительными
+WIZARD_TTL = 30 * 60
+RECENT_CITIES_LIMIT = 4
+
+PRICE_BANDS: Tuple[Tuple[int, int], ...] = ((0, 2000), (2000, 5000), (5000, 10000), (10000, 30000))
+DISTANCE_BANDS: Tuple[Tuple[float, float], ...] = ((0.0, 1.0), (0.0, 3.0), (0.0, 10.0), (0.0, 50.0))
+# Готовые сочетания (количество отелей, количество фото)
+PRESETS: Tuple[Tuple[int, int], ...] = ((3, 0), (5, 0), (3, 3), (5, 5))
+
+CITY_PROMPT = 'Отправь мне имя города, в котором я буду искать отель для тебя.\n' \
+              'Ты можешь писать на русском или английском языке.\n' \
+              'Например: <code>Москва</code> или <code>Moscow</code>'
+PROMPTS = {
+    'stay': 'Когда заезд и сколько гостей?\n'
+            'Выбери даты и количество гостей кнопками или введи их в формате '
+            '"ДД.ММ-ДД.ММ гостей".\n'
+            'Например: <code>20.11-23.11 2</code>',
+    'price': 'Выбери ценовой диапазон за одного человека в сутки '
+             'или введи свой в формате "мин_цена-макс_цена".\n'
+             'Например: <code>700-1500</code>',
+    'dist': 'Выбери отдаленность отеля от центра (км) '
+            'или введи свой диапазон в формате "мин-макс".\n'
+            'Например: <code>0.5-2.0</code>',
+    'preset': 'Сколько отелей и фотографий показать?\n'
+              'Выбери вариант или отправь количество отелей (до 5-ти), '
+              'тогда я отдельно спрошу про фото.',
+}
+
+_wizards = LRUCache(maxsize=10000, ttl=WIZARD_TTL)
+
+
+def remember(chat_id: int, message_id: int, step: str, command: str,
+             params: Dict[str, Any], **options) -> None:
+    """
+    Сохранить состояние диалога после отправки сообщения шага
+
+    Args:
+        chat_id: идентификатор чата
+        message_id: сообщение шага с клавиатурой
+        step: шаг, варианты которого показаны на клавиатуре
+        command: поисковая команда
+        params: накопленные параметры запроса
+        options: дополнительные данные шага (например, список городов)
+    """
+    _wizards.set(chat_id, dict(options, message_id=message_id, step=step, command=command, params=params))
+
+
+def wizard(chat_id: int) -> Optional[Dict[str, Any]]:
+    """Получить состояние диалога чата (None, если его нет или оно устарело)"""
+    return _wizards.get(chat_id)
+
+
+def forget(chat_id: int) -> None:
+    """Удалить состояние завершенного диалога"""
+    _wizards.pop(chat_id)
+
+
+def is_current(state: Optional[Dict[str, Any]], message_id: int, step: Optional[str]) -> bool:
+    """
+    Проверить, что нажатая кнопка относится к текущему шагу диалога
+
+    Кнопки устаревают, когда диалог завершен, истек WIZARD_TTL, шаг уже
+    пройден или пользователь продолжил диалог вводом текста.
+    """
+    if state is None or state['message_id'] != message_id:
+        return False
+    return (step == state['step']
+            or (step == 'last' and state['step'] == 'city')
+            or (step == 'adults' and state['step'] == 'stay'))
+
+
+def is_valid_choice(state: Dict[str, Any], step: str, number: int) -> bool:
+    """
+    Проверить, что номер варианта из callback_data есть на клавиатуре шага
+
+    callback_data приходит от клиента, поэтому номер проверяется перед
+    обращением к спискам вариантов.
+    """
+    if step == 'adults':
+        return 1 <= number <= MAX_ADULTS
+    if step == 'last':
+        return number == 0 and state.get('last') is not None
+    options = {
+        'city': state.get('cities') or (),
+        'stay': STAY_OPTIONS,
+        'price': PRICE_BANDS,
+        'dist': DISTANCE_BANDS,
+        'preset': PRESETS,
+    }.get(step, ())
+    return 0 <= number < len(options)
+
+
+def parse_callback(data: str) -> Tuple[str, int]:
+    """
+    Разобрать callback_data кнопки
+
+    Returns:
+        Шаг и номер выбранного варианта
+
+    Raises:
+        ValueError: если данные кнопки имеют неверный формат
+    """
+    _, step, number = data.split(':')
+    return step, int(number or 0)
+
+
+def keyboard(step: str, labels: List[str], row_width: int = 2) -> InlineKeyboardMarkup:
+    """Собрать клавиатуру вариантов шага"""
+    markup = InlineKeyboardMarkup(row_width=row_width)
+    markup.add(*(InlineKeyboardButton(label, callback_data=f'{CALLBACK_PREFIX}{step}:{number}')
+                 for number, label in enumerate(labels)))
+    return markup
+
+
+def step_keyboard(step: str, params: Dict[str, Any]) -> InlineKeyboardMarkup:
+    """Клавиатура шагов stay, price, dist и preset"""
+    if step == 'stay':
+        markup = keyboard(step, list(STAY_OPTIONS))
+        selected = params.get('adults', 1)
+        markup.row(*(InlineKeyboardButton(f'✅ {adults}' if adults == selected else f'👤 {adults}',
+                                          callback_data=f'{CALLBACK_PREFIX}adults:{adults}')
+                     for adults in range(1, MAX_ADULTS + 1)))
+        return markup
+    if step == 'price':
+        labels = [f'до {max_price}' if not min_price else f'{min_price}–{max_price}'
+                  for min_price, max_price in PRICE_BANDS]
+    elif step == 'dist':
+        labels = [f'до {max_dist:g} км' for _, max_dist in DISTANCE_BANDS]
+    else:
+        labels = [f'отелей: {count}, ' + (f'фото: {photos}' if photos else 'без фото')
+                  for count, photos in PRESETS]
+    return keyboard(step, labels)
+
+
+def describe(params: Dict[str, Any]) -> str:
+    """Краткое описание параметров поиска для кнопок и сообщений"""
+    parts = [params['city']]
+    if 'check_in' in params:
+        parts.append(describe_stay(params))
+    if 'min_price' in params:
+        parts.append(f'{params["min_price"]}–{params["max_price"]}')
+        parts.append(f'{params["min_dist"]:g}–{params["max_dist"]:g} км')
+    parts.append(f'отелей: {params["results_count"]}')
+    parts.append(f'фото: {params["photos_count"]}' if params['photos_count'] else 'без фото')
+    return ' · '.join(parts)
+
+
+def last_search(user_id: int, command: str) -> Optional[Dict[str, Any]]:
+    """
+    Получить параметры последнего поиска пользователя, подходящего команде
+
+    Поиски /lowprice и /highprice взаимозаменяемы: меняется только порядок
+    сортировки. Сравнения нескольких городов (/compare) не предлагаются.
+
+    Returns:
+        Параметры запроса или None, если повторить нечего
+    """
+    entry = loader.database.select_history_entry(user_id=user_id)
+    if entry is None or entry['destination_id'] is None or entry['params'] is None:
+        return None
+    if entry['command'] == 'compare' or (command == 'bestdeal') != (entry['command'] == 'bestdeal'):
+        return None
+
+    params = dict(entry['params'], city=entry['city'], destination_id=entry['destination_id'])
+    if command != 'bestdeal':
+        params['sort_order'] = command[:-len('price')]
+    return params
+
+
+def send_city_step(chat_id: int, user_id: int, command: str,
+                   params: Optional[Dict[str, Any]] = None) -> Message:
+    """
+    Отправить запрос города с кнопками недавних городов и последнего поиска
+
+    Args:
+        chat_id: идентификатор чата
+        user_id: id Telegram-пользователя
+        command: поисковая команда
+        params: начальные параметры запроса
+
+    Returns:
+        Отправленное сообщение (для регистрации обработчика ввода текстом)
+    """
+    params = {} if params is None else params
+    cities = loader.database.select_user_recent_cities(user_id, RECENT_CITIES_LIMIT)
+    last = last_search(user_id, command)
+
+    text = CITY_PROMPT
+    markup = None
+    if cities or last:
+        text += '\nИли выбери один из вариантов ниже.'
+        markup = keyboard('city', cities, row_width=2)
+        if last:
+            markup.row(InlineKeyboardButton(f'🔁 {describe(last)}', callback_data=f'{CALLBACK_PREFIX}last:0'))
+
+    sent_message = loader.bot.send_message(chat_id, text, reply_markup=markup)
+    remember(chat_id, sent_message.id, 'city', command, params, cities=cities, last=last)
+    return sent_message
+
+
+def send_step(chat_id: int, step: str, command: str, params: Dict[str, Any],
+              message_id: Optional[int] = None) -> Message:
+    """
+    Показать шаг stay, price, dist или preset с клавиатурой вариантов
+
+    Args:
+        chat_id: идентификатор чата
+        step: шаг диалога
+        command: поисковая команда
+        params: накопленные параметры запроса
+        message_id: сообщение, которое нужно отредактировать вместо отправки нового
+
+    Returns:
+        Сообщение шага (для регистрации обработчика ввода текстом)
+    """
+    text = f'<b>{escape(params["city"])}</b>\n{PROMPTS[step]}'
+    if message_id is None:
+        message = loader.bot.send_message(chat_id, text, reply_markup=step_keyboard(step, params))
+    else:
+        message = loader.bot.edit_message_text(text, chat_id=chat_id, message_id=message_id,
+                                               reply_markup=step_keyboard(step, params))
+    remember(chat_id, message.id, step, command, params)
+    return message
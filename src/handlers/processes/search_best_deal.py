@@ -1,65 +1,111 @@
 import re
-from typing import Dict, Union, List
+from typing import Dict, Union, List, Any, Optional
 
 import requests
 from loguru import logger
-from telebot.apihelper import ApiException
+from telebot.apihelper import ApiException, ApiTelegramException
 from telebot.types import Message, InputMediaPhoto
 
-from src import utils
-from src.loader import bot, requester, database
+from data import config
+from src import loader, utils
+from src.botrequests import CircuitOpen, DeadlineExceeded
+from src.utils.logs import traced
+from . import quick_pick
+from .cards import DEFAULT_LOCALE, HotelRecord, parse_hotel, render_card
+from .stay import MAX_ADULTS, MAX_NIGHTS, parse_stay, stay_windows
 
 REQ_PARAMS_TYPE = Dict[str, Union[str, int]]
-BUILT_MESSAGES_TYPE = List[Dict[str, Union[str, List[InputMediaPhoto]]]]
+BUILT_MESSAGES_TYPE = List[Dict[str, Union[str, List[InputMediaPhoto], List[str]]]]
 
+PRICE_RANGE_PATTERN = re.compile(r'^\d+-\d+$')
+DISTANCE_RANGE_PATTERN = re.compile(r'^\d+\.*\d*-\d+\.*\d*$')
+NUMBER_PATTERN = re.compile(r'\d+\.*\d*')
 
-def ask_city_step(msg: Message) -> None:
+
+@traced
+def ask_city_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     """
     Запросить город поиска у пользователя
 
     Args:
         msg: обрабатываемое сообщение
+        params: параметры запроса
     """
     chat_id = msg.chat.id
     reply = msg.text
 
     user = msg.from_user
-    logger.info(f'Запрос города ({user.username} – {user.id}), ответ: {reply}')
+    logger.debug('Запрос города ({} – {}), ответ: {}', user.username, user.id, reply)
 
-    if utils.locale_from_string(reply) is None:
+    city = utils.normalize_city(reply)
+    if city is None:
         text = 'Некорректный ввод: не получилось определить язык сообщения.\n' \
                'Попробуй еще раз'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_city_step)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_city_step, params)
         return
 
     try:
-        destination_id = requester.search_destination(reply)
-    except (requests.ConnectionError, requests.Timeout) as e:
+        destination_id = loader.requester.search_destination(city, deadline=utils.Deadline(config.SEARCH_DEADLINE))
+    except CircuitOpen:
+        text = 'Сервис Hotels.com сейчас недоступен.\n' \
+               'Попробуй еще раз через пару минут'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_city_step, params)
+        return
+    except requests.RequestException as e:
         text = 'Ошибка: неудачная попытка соединения во время поиска города.\n' \
                'Попробуй еще раз'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_city_step)
-        logger.error(f'Ошибка при запросе destinationId: {e}')
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_city_step, params)
+        logger.error('Ошибка при запросе destinationId: {}', e)
         return
 
     if destination_id is None:
         text = 'Некорректный ввод: не удалось найти город по твоему запросу.\n' \
                'Попробуй набрать что-то другое'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_city_step)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_city_step, params)
         return
-    params = dict()
     params['destination_id'] = destination_id
-    params['city'] = reply
+    params['city'] = city.text
+    params['locale'] = city.locale
+
+    sent_message = quick_pick.send_step(chat_id, 'stay', 'bestdeal', params)
+    loader.bot.register_next_step_handler(sent_message, ask_stay_step, params)
+
+
+@traced
+def ask_stay_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
+    """
+    Запросить даты проживания и количество гостей
+
+    Args:
+        msg: обрабатываемое сообщение
+        params: параметры запроса
+    """
+    chat_id = msg.chat.id
+    reply = msg.text
 
-    text = 'Введи желаемый ценовой диапазон поиска в формате "мин_цена-макс_цена".\n' \
-           'Например: <code>700-1500</code>\n' \
-           '(Имеется ввиду цена за одного человека в сутки)'
-    sent_message = bot.send_message(chat_id, text)
-    bot.register_next_step_handler(sent_message, ask_price_range_step, params)
+    user = msg.from_user
+    logger.debug('Запрос дат проживания ({} – {}), ответ: {}', user.username, user.id, reply)
+
+    stay = parse_stay(reply or '')
+    if stay is None:
+        text = 'Некорректный ввод: даты должны быть в формате "ДД.ММ-ДД.ММ гостей".\n' \
+               f'Выезд позже заезда, но не больше чем на {MAX_NIGHTS} ночей, ' \
+               f'гостей от 1 до {MAX_ADULTS}.\n' \
+               'Например: <code>20.11-23.11 2</code>'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_stay_step, params)
+        return
+    params.update(stay)
 
+    sent_message = quick_pick.send_step(chat_id, 'price', 'bestdeal', params)
+    loader.bot.register_next_step_handler(sent_message, ask_price_range_step, params)
 
+
+@traced
 def ask_price_range_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     """
     Запросить диапазон цен у пользователя
@@ -72,34 +118,33 @@ def ask_price_range_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     reply = msg.text
 
     user = msg.from_user
-    logger.info(f'Запрос диапазона цен ({user.username} – {user.id}), ответ: {reply}')
+    logger.debug('Запрос диапазона цен ({} – {}), ответ: {}', user.username, user.id, reply)
 
-    if not re.fullmatch(r'^\d+-\d+$', reply):
+    if not PRICE_RANGE_PATTERN.fullmatch(reply):
         text = 'Ошибка: некорректный ввод диапазона цен.\n' \
                'Диапазон должен быть в формате: "мин-макс".\n' \
                'Например: 300-1200'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_price_range_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_price_range_step, params)
         return
 
-    min_price, max_price = map(int, re.findall(r'\d+', reply))
+    min_price, max_price = map(int, NUMBER_PATTERN.findall(reply))
     if not (0 <= min_price < max_price):
         text = 'Ошибка: некорректный ввод диапазона цен.\n' \
                'Минимальная цена должна быть меньше максимальной, ' \
                'цены должны быть больше нуля'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_price_range_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_price_range_step, params)
         return
 
     params['min_price'] = min_price
     params['max_price'] = max_price
 
-    text = 'Введи диапазон отдаленности (км) отеля от центра в формате: мин_макс.\n' \
-           'Например: 0.5-2.0'
-    sent_message = bot.send_message(chat_id, text)
-    bot.register_next_step_handler(sent_message, ask_distance_range_step, params)
+    sent_message = quick_pick.send_step(chat_id, 'dist', 'bestdeal', params)
+    loader.bot.register_next_step_handler(sent_message, ask_distance_range_step, params)
 
 
+@traced
 def ask_distance_range_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     """
     Запросить диапазон отдаленности отеля от центра
@@ -112,33 +157,33 @@ def ask_distance_range_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     reply = msg.text
 
     user = msg.from_user
-    logger.info(f'Запрос диапазона расстояния от центра ({user.username} – {user.id}), ответ: {reply}')
+    logger.debug('Запрос диапазона расстояния от центра ({} – {}), ответ: {}', user.username, user.id, reply)
 
-    if not re.fullmatch(r'^\d+\.*\d*-\d+\.*\d*$', reply):
+    if not DISTANCE_RANGE_PATTERN.fullmatch(reply):
         text = 'Ошибка: некорректный ввод.\n' \
                'Диапазон должен быть в формате: мин-макс.\n' \
                'Например: 0.5-3.0'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_distance_range_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_distance_range_step, params)
         return
 
-    min_dist, max_dist = map(float, re.findall(r'\d+\.*\d*', reply))
+    min_dist, max_dist = map(float, NUMBER_PATTERN.findall(reply))
     if not (0 <= min_dist < max_dist):
         text = 'Ошибка: некорректный ввод диапазона.\n' \
                'Минимальное значение должно быть меньше максимального, ' \
                'значение не может быть отрицательным'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_price_range_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_price_range_step, params)
         return
 
     params['min_dist'] = min_dist
     params['max_dist'] = max_dist
 
-    text = 'Я могу вывести до 5-ти отелей. Сколько ты хочешь увидеть?'
-    sent_message = bot.send_message(chat_id, text)
-    bot.register_next_step_handler(sent_message, ask_count_step, params)
+    sent_message = quick_pick.send_step(chat_id, 'preset', 'bestdeal', params)
+    loader.bot.register_next_step_handler(sent_message, ask_count_step, params)
 
 
+@traced
 def ask_count_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     """
     Запросить количество отелей для поиска
@@ -151,27 +196,28 @@ def ask_count_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     reply = msg.text
 
     user = msg.from_user
-    logger.info(f'Запрос количества отелей ({user.username} – {user.id}), ответ: {reply}')
+    logger.debug('Запрос количества отелей ({} – {}), ответ: {}', user.username, user.id, reply)
 
     try:
         params['results_count'] = int(reply)
     except ValueError:
         text = 'Некорректный ввод: требуется число.'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_count_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_count_step, params)
         return
     if not 0 < params['results_count'] <= 5:
         text = 'Некорректный ввод: число должно быть в диапазоне от 1 до 5 включительно.'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_count_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_count_step, params)
         return
 
     text = 'Из фотографий я могу показать 10 штук. Сколько ты хочешь увидеть?\n' \
            'Если фото не нужны, то просто отправь <code>0</code>'
-    sent_message = bot.send_message(chat_id, text)
-    bot.register_next_step_handler(sent_message, ask_photos_step, params)
+    sent_message = loader.bot.send_message(chat_id, text)
+    loader.bot.register_next_step_handler(sent_message, ask_photos_step, params)
 
 
+@traced
 def ask_photos_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     """
     Запросить количество фото
@@ -184,124 +230,232 @@ def ask_photos_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     reply = msg.text
 
     user = msg.from_user
-    logger.info(f'Запрос количества фото ({user.username} – {user.id}), ответ: {reply}')
+    logger.debug('Запрос количества фото ({} – {}), ответ: {}', user.username, user.id, reply)
 
     try:
         params['photos_count'] = int(reply)
     except ValueError:
         text = 'Некорректный ввод: требуется число.'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_photos_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_photos_step, params)
         return
     if not 0 <= params['photos_count'] <= 10:
         text = 'Некорректный ввод: число должно быть в диапазоне от 0 до 10 включительно.'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_count_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_count_step, params)
         return
 
     show_hotels(params, chat_id)
 
 
-def show_hotels(req_params: REQ_PARAMS_TYPE, chat_id: int) -> None:
+@traced
+def show_hotels(req_params: REQ_PARAMS_TYPE, chat_id: int, announce: bool = True) -> None:
     """
     Показать результаты поиска пользователю
 
     Args:
         req_params: параметры запроса
         chat_id: идентификатор чата
+        announce: показывать ли сообщение "Поиск…" на время запроса
+            (не нужно, если об этом уже сообщает сообщение шага диалога)
     """
-    status_message = bot.send_message(chat_id, 'Поиск…')
+    quick_pick.forget(chat_id)
+    deadline = utils.Deadline(config.SEARCH_DEADLINE)
+    status_message = loader.bot.send_message(chat_id, 'Поиск…') if announce else None
     try:
-        logger.info(f'Отправка поискового запроса отеля для {chat_id}')
-        search_results = requester.request_bestdeal(destination_id=req_params['destination_id'],
-                                                    count=req_params['results_count'],
-                                                    min_price=req_params['min_price'],
-                                                    max_price=req_params['max_price'])
-    except (ConnectionError, TimeoutError) as e:
-        logger.error(f'Ошибка при поисковом запросе отелей: {e}')
-        bot.send_message(chat_id, 'Произошла ошибка при соединении с Hotels.com\n'
-                                  'Попробуй еще раз.')
+        logger.info('Отправка поискового запроса отеля для {chat_id}', chat_id=chat_id)
+        windows = stay_windows(req_params)
+        search_params = dict(destination_id=req_params['destination_id'],
+                             min_price=req_params['min_price'],
+                             max_price=req_params['max_price'],
+                             locale=req_params['locale'],
+                             adults=req_params.get('adults', 1),
+                             deadline=deadline)
+        if len(windows) > 1:
+            search_results = loader.requester.request_cheapest_dates(
+                loader.requester.request_bestdeal, windows, req_params['results_count'], **search_params
+            )
+        else:
+            check_in, check_out = windows[0]
+            search_results = loader.requester.request_bestdeal(count=req_params['results_count'],
+                                                               check_in=check_in, check_out=check_out,
+                                                               **search_params)
+    except CircuitOpen:
+        loader.bot.send_message(chat_id, 'Сервис Hotels.com сейчас недоступен.\n'
+                                         'Попробуй повторить поиск через пару минут.')
+        return
+    except requests.RequestException as e:
+        logger.error('Ошибка при поисковом запросе отелей: {}', e)
+        loader.bot.send_message(chat_id, 'Произошла ошибка при соединении с Hotels.com\n'
+                                         'Попробуй еще раз.')
         return
     else:
-        logger.info(f'Запрос для {chat_id} успешно выполнен')
+        logger.info('Запрос для {chat_id} успешно выполнен', chat_id=chat_id)
     finally:
-        bot.delete_message(chat_id, status_message.id)
+        if status_message is not None:
+            loader.bot.delete_message(chat_id, status_message.id)
 
     if not search_results:
         text = f'По твоему запросу ничего не найдено.\n' \
                f'Попробуй указать другие параметры поиска: /bestdeal'
-        bot.send_message(chat_id, text)
+        loader.bot.send_message(chat_id, text)
         return
 
-    messages = build_messages(search_results, req_params['photos_count'])
+    records = [parse_hotel(elem) for elem in search_results]
+    messages = build_messages(records, req_params['photos_count'], req_params['locale'], deadline)
+    send_results(chat_id, messages)
 
-    for message in messages:
-        try:
-            if message['photos'] is not None:
-                bot.send_media_group(chat_id=chat_id, media=message['photos'])
-            bot.send_message(chat_id=chat_id, text=message['text'], disable_web_page_preview=True)
-        except ApiException as e:
-            bot.send_message(chat_id, 'Ошибка при отправке сообщения…')
-            logger.error(f'Не удалось отправить сообщение (chat: {chat_id}): {e}')
-        else:
-            logger.info(f'Сообщение с результатами поиска успешно отправлено (chat: {chat_id})')
-
-    database.add_to_history(user_id=chat_id, command='bestdeal', city=req_params['city'])
+    save_to_history(chat_id, 'bestdeal', req_params, records)
 
 
-def build_messages(response: dict,
-                   photos_count: int) -> BUILT_MESSAGES_TYPE:
+def build_messages(records: List[HotelRecord],
+                   photos_count: int,
+                   locale: str = DEFAULT_LOCALE,
+                   deadline: Optional[utils.Deadline] = None) -> BUILT_MESSAGES_TYPE:
     """
     Собрать сообщения из результатов запроса поиска отелей
 
-    Принимает список результатов поиска и количество фото (если
-    требуется), формирует из них список словарей с текстом и
+    Принимает список разобранных результатов поиска и количество фото
+    (если требуется), формирует из них список словарей с текстом и
     списком InputMediaPhoto для отправки.
 
+    Оставшееся до deadline время делится поровну между отелями, фотографии
+    которых еще не запрошены, поэтому один медленный запрос не задерживает
+    весь ответ. Отели, фотографии которых не успели загрузиться,
+    показываются без них.
+
     Args:
-        response: результат запроса к API
+        records: результаты поиска, разобранные parse_hotel
         photos_count: количество фото, прикрепляемых к сообщению
+        locale: локаль карточек отелей
+        deadline: крайний срок поиска (None – без ограничения)
 
     Returns:
         Список сообщений для отправки
     """
 
-    messages = []
-    for elem in response:
-        name = elem['name']
-        address = ', '.join((elem['address']['streetAddress'],
-                             elem['address']['locality'],
-                             elem['address']['countryName']))
-        price = elem['ratePlan']['price']['current']
-        for landmark in elem['landmarks']:
-            if landmark['label'] in ('Центр города', 'City center'):
-                center_remoteness = landmark['distance']
-                break
-        else:
-            center_remoteness = 'не найдено'
-        link = f'https://ru.hotels.com/ho{elem["id"]}'
-
-        message_text = '\n'.join((
-            f'<b>{name}</b>',
-            f'🏢 <b>Адрес:</b> {address}',
-            f'🎯 <b>От центра города:</b> {center_remoteness}',
-            f'💲 <b>Цена:</b> {price}/сутки',
-            f'🔗 <a href="{link}">Больше информации на сайте</a>'
-        ))
+    photo_results: Dict[int, List[str]] = {}
+    late = 0
+    if photos_count:
+        for number, record in enumerate(records):
+            stage = deadline.split(len(records) - number) if deadline is not None else None
+            try:
+                photo_results[number] = list(loader.requester.iter_photos(record.id, limit=photos_count,
+                                                                          deadline=stage))
+            except CircuitOpen:
+                photo_results[number] = []
+            except DeadlineExceeded:
+                photo_results[number] = []
+                late += 1
+            except requests.RequestException as e:
+                logger.error('Ошибка при запросе фотографий: {}', e)
+
+    # Уже отправленные ранее фото передаются по file_id, чтобы Telegram
+    # не скачивал их повторно. file_id всех отелей выбираются одним запросом
+    file_ids = loader.database.select_photo_file_ids(
+        list({link: None for links in photo_results.values() for link in links})
+    )
 
+    messages = []
+    for number, record in enumerate(records):
         photos = None
+        photo_urls = None
         if photos_count:
-            try:
-                photo_results = requester.request_photos(elem['id'])
-            except (requests.ConnectionError, requests.Timeout) as e:
-                logger.error(f'Ошибка при запросе фотографий: {e}')
+            if number not in photo_results:
                 continue
+            photo_urls = photo_results[number]
+            photos = [InputMediaPhoto(media=file_ids.get(link, link), caption=record.name)
+                      for link in photo_urls] or None
 
-            if len(photo_results) > photos_count:
-                photo_results = photo_results[:photos_count]
-
-            photos = [InputMediaPhoto(media=link, caption=name)
-                      for link in photo_results]
+        messages.append({'text': render_card(record, locale), 'photos': photos, 'photo_urls': photo_urls})
 
-        messages.append({'text': message_text, 'photos': photos})
+    if late:
+        logger.warning('Истек срок поиска: отелей без фотографий – {} из {}', late, len(records))
     return messages
+
+
+def send_results(chat_id: int, messages: BUILT_MESSAGES_TYPE) -> None:
+    """
+    Отправить пользователю сообщения с результатами поиска
+
+    Args:
+        chat_id: идентификатор чата
+        messages: сообщения, собранные build_messages
+    """
+    for message in messages:
+        try:
+            if message['photos'] is not None:
+                send_photos(chat_id, message)
+            loader.bot.send_message(chat_id=chat_id, text=message['text'], disable_web_page_preview=True)
+        except ApiException as e:
+            loader.bot.send_message(chat_id, 'Ошибка при отправке сообщения…')
+            logger.error('Не удалось отправить сообщение (chat: {}): {}', chat_id, e)
+        else:
+            logger.info('Сообщение с результатами поиска успешно отправлено (chat: {chat_id})', chat_id=chat_id)
+
+
+def send_photos(chat_id: int, message: Dict[str, Any]) -> None:
+    """
+    Отправить фотографии отеля и запомнить их file_id
+
+    Если Telegram отклонил сохраненный ранее file_id как неверный
+    (400 "wrong file identifier"), фотографии отправляются повторно по
+    ссылкам. Остальные ошибки (429, 5xx и т. п.) передаются вызывающему коду.
+
+    Args:
+        chat_id: идентификатор чата
+        message: сообщение, собранное build_messages
+    """
+    photos = message['photos']
+    urls = message['photo_urls']
+
+    try:
+        sent_messages = loader.bot.send_media_group(chat_id=chat_id, media=photos)
+    except ApiTelegramException as e:
+        if not is_stale_file_id(e) or all(photo.media == url for photo, url in zip(photos, urls)):
+            raise
+        logger.warning('Telegram отклонил сохраненные file_id, повторная отправка по ссылкам: {}', e)
+        photos = [InputMediaPhoto(media=url, caption=photo.caption)
+                  for photo, url in zip(photos, urls)]
+        sent_messages = loader.bot.send_media_group(chat_id=chat_id, media=photos)
+
+    file_ids = {url: sent.photo[-1].file_id
+                for photo, url, sent in zip(photos, urls, sent_messages)
+                if photo.media == url and sent.photo}
+    loader.database.save_photo_file_ids(file_ids)
+
+
+def is_stale_file_id(error: ApiTelegramException) -> bool:
+    """
+    Проверить, отклонил ли Telegram file_id как неверный
+
+    Args:
+        error: ошибка Telegram Bot API
+
+    Returns:
+        True, если запрос можно повторить, заменив file_id ссылками
+    """
+    return error.error_code == 400 and 'file identifier' in str(error.description).lower()
+
+
+def save_to_history(chat_id: int,
+                    command: str,
+                    req_params: REQ_PARAMS_TYPE,
+                    records: List[HotelRecord]) -> None:
+    """
+    Сохранить поиск в историю вместе с параметрами и снимком результатов
+
+    Args:
+        chat_id: идентификатор чата
+        command: поисковая команда
+        req_params: параметры запроса
+        records: результаты поиска, разобранные parse_hotel
+    """
+    params = {key: value for key, value in req_params.items()
+              if key not in ('city', 'destination_id', 'search_id')}
+    loader.database.add_to_history(user_id=chat_id,
+                                   command=command,
+                                   city=req_params['city'],
+                                   destination_id=req_params['destination_id'],
+                                   params=params,
+                                   results=records)
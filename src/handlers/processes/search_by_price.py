@@ -2,17 +2,22 @@ from typing import Dict, Union, List
 
 import requests
 from loguru import logger
-from telebot.apihelper import ApiException
 from telebot.types import Message, InputMediaPhoto
 
-from src import utils
-from src.handlers.processes.search_best_deal import build_messages
-from src.loader import bot, requester, database
+from data import config
+from src import loader, utils
+from src.botrequests import CircuitOpen
+from src.handlers.processes import quick_pick
+from src.handlers.processes.cards import parse_hotel
+from src.handlers.processes.search_best_deal import build_messages, send_results, save_to_history
+from src.handlers.processes.stay import MAX_ADULTS, MAX_NIGHTS, parse_stay, stay_windows
+from src.utils.logs import traced
 
 REQ_PARAMS_TYPE = Dict[str, Union[str, int]]
-BUILT_MESSAGES_TYPE = List[Dict[str, Union[str, List[InputMediaPhoto]]]]
+BUILT_MESSAGES_TYPE = List[Dict[str, Union[str, List[InputMediaPhoto], List[str]]]]
 
 
+@traced
 def ask_city_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     """
     Запросить город поиска у пользователя
@@ -25,39 +30,77 @@ def ask_city_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     reply = msg.text
 
     user = msg.from_user
-    logger.info(f'Запрос города ({user.username} – {user.id}), ответ: {reply}')
+    logger.debug('Запрос города ({} – {}), ответ: {}', user.username, user.id, reply)
 
-    if utils.locale_from_string(reply) is None:
+    city = utils.normalize_city(reply)
+    if city is None:
         text = 'Некорректный ввод: не получилось определить язык сообщения.\n' \
                'Попробуй еще раз'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_city_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_city_step, params)
         return
 
     try:
-        destination_id = requester.search_destination(reply)
-    except (requests.ConnectionError, requests.Timeout) as e:
+        destination_id = loader.requester.search_destination(city, deadline=utils.Deadline(config.SEARCH_DEADLINE))
+    except CircuitOpen:
+        text = 'Сервис Hotels.com сейчас недоступен.\n' \
+               'Попробуй еще раз через пару минут'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_city_step, params)
+        return
+    except requests.RequestException as e:
         text = 'Ошибка: неудачная попытка соединения во время поиска города.\n' \
                'Попробуй еще раз'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_city_step)
-        logger.error(f'Ошибка при запросе destinationId: {e}')
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_city_step, params)
+        logger.error('Ошибка при запросе destinationId: {}', e)
         return
 
     if destination_id is None:
         text = 'Некорректный ввод: не удалось найти город по твоему запросу.\n' \
                'Попробуй набрать что-то другое'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_city_step)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_city_step, params)
         return
     params['destination_id'] = destination_id
-    params['city'] = reply
+    params['city'] = city.text
+    params['locale'] = city.locale
+
+    sent_message = quick_pick.send_step(chat_id, 'stay', f'{params["sort_order"]}price', params)
+    loader.bot.register_next_step_handler(sent_message, ask_stay_step, params)
+
+
+@traced
+def ask_stay_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
+    """
+    Запросить даты проживания и количество гостей
+
+    Args:
+        msg: обрабатываемое сообщение
+        params: параметры запроса
+    """
+    chat_id = msg.chat.id
+    reply = msg.text
+
+    user = msg.from_user
+    logger.debug('Запрос дат проживания ({} – {}), ответ: {}', user.username, user.id, reply)
+
+    stay = parse_stay(reply or '')
+    if stay is None:
+        text = 'Некорректный ввод: даты должны быть в формате "ДД.ММ-ДД.ММ гостей".\n' \
+               f'Выезд позже заезда, но не больше чем на {MAX_NIGHTS} ночей, ' \
+               f'гостей от 1 до {MAX_ADULTS}.\n' \
+               'Например: <code>20.11-23.11 2</code>'
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_stay_step, params)
+        return
+    params.update(stay)
 
-    text = 'Я могу вывести до 5-ти отелей. Сколько ты хочешь увидеть?'
-    sent_message = bot.send_message(chat_id, text)
-    bot.register_next_step_handler(sent_message, ask_count_step, params)
+    sent_message = quick_pick.send_step(chat_id, 'preset', f'{params["sort_order"]}price', params)
+    loader.bot.register_next_step_handler(sent_message, ask_count_step, params)
 
 
+@traced
 def ask_count_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     """
     Запросить количество отелей для поиска
@@ -70,27 +113,28 @@ def ask_count_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     reply = msg.text
 
     user = msg.from_user
-    logger.info(f'Запрос количества отелей ({user.username} – {user.id}), ответ: {reply}')
+    logger.debug('Запрос количества отелей ({} – {}), ответ: {}', user.username, user.id, reply)
 
     try:
         params['results_count'] = int(reply)
     except ValueError:
         text = 'Некорректный ввод: требуется число.'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_count_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_count_step, params)
         return
     if not 0 < params['results_count'] <= 5:
         text = 'Некорректный ввод: число должно быть в диапазоне от 1 до 5 включительно.'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_count_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_count_step, params)
         return
 
     text = 'Из фотографий я могу показать 10 штук. Сколько ты хочешь увидеть?\n' \
            'Если фото не нужны, то просто отправь <code>0</code>'
-    sent_message = bot.send_message(chat_id, text)
-    bot.register_next_step_handler(sent_message, ask_photos_step, params)
+    sent_message = loader.bot.send_message(chat_id, text)
+    loader.bot.register_next_step_handler(sent_message, ask_photos_step, params)
 
 
+@traced
 def ask_photos_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     """
     Запросить количество фото
@@ -103,66 +147,80 @@ def ask_photos_step(msg: Message, params: REQ_PARAMS_TYPE) -> None:
     reply = msg.text
 
     user = msg.from_user
-    logger.info(f'Запрос количества фото ({user.username} – {user.id}), ответ: {reply}')
+    logger.debug('Запрос количества фото ({} – {}), ответ: {}', user.username, user.id, reply)
 
     try:
         params['photos_count'] = int(reply)
     except ValueError:
         text = 'Некорректный ввод: требуется число.'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_photos_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_photos_step, params)
         return
     if not 0 <= params['photos_count'] <= 10:
         text = 'Некорректный ввод: число должно быть в диапазоне от 0 до 10 включительно.'
-        error_message = bot.send_message(chat_id, text)
-        bot.register_next_step_handler(error_message, ask_count_step, params)
+        error_message = loader.bot.send_message(chat_id, text)
+        loader.bot.register_next_step_handler(error_message, ask_count_step, params)
         return
 
     show_hotels(params, chat_id)
 
 
-def show_hotels(req_params: REQ_PARAMS_TYPE, chat_id: int) -> None:
+@traced
+def show_hotels(req_params: REQ_PARAMS_TYPE, chat_id: int, announce: bool = True) -> None:
     """
     Показать результаты поиска пользователю
 
     Args:
         req_params: параметры запроса
         chat_id: идентификатор чата
+        announce: показывать ли сообщение "Поиск…" на время запроса
+            (не нужно, если об этом уже сообщает сообщение шага диалога)
     """
-
-    status_message = bot.send_message(chat_id, 'Поиск…')
+    quick_pick.forget(chat_id)
+    deadline = utils.Deadline(config.SEARCH_DEADLINE)
+    status_message = loader.bot.send_message(chat_id, 'Поиск…') if announce else None
     try:
-        logger.info('Отправка поискового запроса отеля')
-        search_results = requester.request_by_price(sort_order=req_params['sort_order'],
-                                                    destination_id=req_params['destination_id'],
-                                                    count=req_params['results_count'])
-    except (requests.ConnectionError, requests.Timeout) as e:
-        logger.error(f'Ошибка при поисковом запросе отелей: {e}')
-        bot.send_message(chat_id, 'Произошла ошибка при соединении с Hotels.com\n'
-                                  'Попробуй еще раз.')
+        logger.info('Отправка поискового запроса отеля для {chat_id}', chat_id=chat_id)
+        windows = stay_windows(req_params)
+        search_params = dict(sort_order=req_params['sort_order'],
+                             destination_id=req_params['destination_id'],
+                             locale=req_params['locale'],
+                             adults=req_params.get('adults', 1),
+                             deadline=deadline)
+        if len(windows) > 1:
+            search_results = loader.requester.request_cheapest_dates(
+                loader.requester.request_by_price, windows, req_params['results_count'],
+                reverse=req_params['sort_order'] == 'high', **search_params
+            )
+        else:
+            check_in, check_out = windows[0]
+            search_results = loader.requester.request_by_price(count=req_params['results_count'],
+                                                               check_in=check_in, check_out=check_out,
+                                                               **search_params)
+    except CircuitOpen:
+        loader.bot.send_message(chat_id, 'Сервис Hotels.com сейчас недоступен.\n'
+                                         'Попробуй повторить поиск через пару минут.')
+        return
+    except requests.RequestException as e:
+        logger.error('Ошибка при поисковом запросе отелей: {}', e)
+        loader.bot.send_message(chat_id, 'Произошла ошибка при соединении с Hotels.com\n'
+                                         'Попробуй еще раз.')
         return
     else:
-        bot.delete_message(chat_id, status_message.id)
-        logger.info('Запрос успешно выполнен')
+        logger.info('Запрос для {chat_id} успешно выполнен', chat_id=chat_id)
+    finally:
+        if status_message is not None:
+            loader.bot.delete_message(chat_id, status_message.id)
 
     if not search_results:
         text = f'По твоему запросу ничего не найдено.\n' \
                f'Попробуй указать другие параметры поиска: /bestdeal'
-        bot.send_message(chat_id, text)
+        loader.bot.send_message(chat_id, text)
         return
 
-    messages = build_messages(search_results, req_params['photos_count'])
-
-    for message in messages:
-        try:
-            if message['photos'] is not None:
-                bot.send_media_group(chat_id=chat_id, media=message['photos'])
-            bot.send_message(chat_id=chat_id, text=message['text'], disable_web_page_preview=True)
-        except ApiException as e:
-            bot.send_message(chat_id, 'Ошибка при отправке сообщения…')
-            logger.error(f'Не удалось отправить сообщение (chat: {chat_id}): {e}')
-        else:
-            logger.info(f'Сообщение с результатами поиска успешно отправлено (chat: {chat_id})')
+    records = [parse_hotel(elem) for elem in search_results]
+    messages = build_messages(records, req_params['photos_count'], req_params['locale'], deadline)
+    send_results(chat_id, messages)
 
     command = f'{req_params["sort_order"]}price'
-    database.add_to_history(user_id=chat_id, command=command, city=req_params['city'])
+    save_to_history(chat_id, command, req_params, records)
@@ -0,0 +1,145 @@
+"""
+Даты проживания и количество гостей в параметрах поиска
+
+В параметрах запроса даты хранятся строками ISO ("check_in", "check_out"),
+чтобы они сохранялись в истории вместе с остальными параметрами. Флаг
+"flexible" включает поиск самых дешевых дат: проверяются FLEXIBLE_WINDOWS
+окон той же продолжительности, начиная с check_in.
+"""
+import re
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+MAX_ADULTS = 4
+MAX_NIGHTS = 30
+# Как далеко вперед (в днях) можно бронировать
+MAX_DAYS_AHEAD = 365
+# Количество окон дат, проверяемых в режиме самых дешевых дат
+FLEXIBLE_WINDOWS = 7
+
+STAY_PATTERN = re.compile(r'^(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?\s*-\s*(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?'
+                          r'(?:\s+(\d{1,2}))?$')
+
+STAY_OPTIONS = ('Сегодня, 1 ночь', 'Завтра, 1 ночь', 'Ближайшие выходные', 'Самые дешевые даты')
+
+
+def option_stay(number: int, today: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Получить даты для варианта из STAY_OPTIONS
+
+    Args:
+        number: номер варианта
+        today: текущая дата (по умолчанию – date.today())
+
+    Returns:
+        Словарь с ключами check_in, check_out и flexible
+    """
+    today = today or date.today()
+    if number == 1:
+        check_in = today + timedelta(days=1)
+        nights = 1
+    elif number == 2:
+        # Ближайшие пятница – воскресенье (сегодняшняя пятница тоже подходит)
+        check_in = today + timedelta(days=(4 - today.weekday()) % 7)
+        nights = 2
+    else:
+        check_in = today
+        nights = 1
+    return {'check_in': check_in.isoformat(),
+            'check_out': (check_in + timedelta(days=nights)).isoformat(),
+            'flexible': number == 3}
+
+
+def parse_stay(text: str, today: Optional[date] = None) -> Optional[Dict[str, Any]]:
+    """
+    Разобрать даты и количество гостей, введенные текстом
+
+    Формат: "ДД.ММ[.ГГГГ]-ДД.ММ[.ГГГГ] [гостей]", например "20.11-23.11 2".
+    Если год не указан, выбирается ближайшая будущая дата.
+
+    Args:
+        text: введенная строка
+        today: текущая дата (по умолчанию – date.today())
+
+    Returns:
+        Словарь с ключами check_in, check_out, flexible и adults (если
+        количество гостей указано) или None, если ввод некорректен
+    """
+    match = STAY_PATTERN.fullmatch(text.strip())
+    if match is None:
+        return None
+    today = today or date.today()
+    day_in, month_in, year_in, day_out, month_out, year_out, adults = match.groups()
+
+    try:
+        check_in = _nearest_date(int(day_in), int(month_in), year_in, today)
+        check_out = _nearest_date(int(day_out), int(month_out), year_out, check_in + timedelta(days=1))
+    except ValueError:
+        return None
+
+    nights = (check_out - check_in).days
+    if not (0 < nights <= MAX_NIGHTS and (check_in - today).days <= MAX_DAYS_AHEAD):
+        return None
+    stay = {'check_in': check_in.isoformat(), 'check_out': check_out.isoformat(), 'flexible': False}
+    if adults is not None:
+        if not 0 < int(adults) <= MAX_ADULTS:
+            return None
+        stay['adults'] = int(adults)
+    return stay
+
+
+def _nearest_date(day: int, month: int, year: Optional[str], not_before: date) -> date:
+    if year is not None:
+        result = date(int(year), month, day)
+        if result < not_before:
+            raise ValueError('date in the past')
+        return result
+    result = date(not_before.year, month, day)
+    return result if result >= not_before else date(not_before.year + 1, month, day)
+
+
+def stay_windows(params: Dict[str, Any], today: Optional[date] = None) -> List[Tuple[date, date]]:
+    """
+    Получить окна дат для запросов к API
+
+    Даты из старых поисков (например, при повторе из истории), которые
+    уже прошли, сдвигаются на сегодня с сохранением продолжительности.
+    Без дат в параметрах используется одна ночь с сегодняшнего дня.
+
+    Returns:
+        Список пар (дата заезда, дата выезда): одна пара или
+        FLEXIBLE_WINDOWS пар в режиме самых дешевых дат
+    """
+    today = today or date.today()
+    check_in = date.fromisoformat(params['check_in']) if params.get('check_in') else today
+    check_out = date.fromisoformat(params['check_out']) if params.get('check_out') else None
+    nights = (check_out - check_in).days if check_out else 1
+    check_in = max(check_in, today)
+
+    count = FLEXIBLE_WINDOWS if params.get('flexible') else 1
+    return [(check_in + timedelta(days=shift), check_in + timedelta(days=shift + nights))
+            for shift in range(count)]
+
+
+def stay_expired(params: Dict[str, Any], today: Optional[date] = None) -> bool:
+    """
+    Проверить, прошла ли дата заезда поиска с конкретными датами
+
+    В отличие от повтора поиска, подписка на снижение цен не сдвигает
+    прошедшие даты (см. stay_windows): пользователь подписывался на свои
+    даты. Поиски без дат и в режиме самых дешевых дат не истекают.
+    """
+    if params.get('flexible') or not params.get('check_in'):
+        return False
+    return date.fromisoformat(params['check_in']) < (today or date.today())
+
+
+def describe_stay(params: Dict[str, Any]) -> str:
+    """Краткое описание дат и гостей для кнопок и сообщений"""
+    windows = stay_windows(params)
+    check_in, check_out = windows[0]
+    if params.get('flexible'):
+        text = f'дешевые даты с {check_in:%d.%m} по {windows[-1][1]:%d.%m}'
+    else:
+        text = f'{check_in:%d.%m}–{check_out:%d.%m}'
+    return f'{text}, гостей: {params.get("adults", 1)}'
@@ -0,0 +1,159 @@
+from html import escape
+from typing import Any, Dict, Optional
+
+import requests
+from loguru import logger
+from telebot.types import CallbackQuery, Message
+
+from data import config
+from src import loader, utils
+from src.botrequests import CircuitOpen
+from src.utils.logs import search_context
+from .processes import bestdeal_show_hotels, compare_show_hotels, price_show_hotels, quick_pick, stay
+from .processes import compare, search_best_deal, search_by_price
+
+
+def on_quick_pick(call: CallbackQuery) -> None:
+    """
+    Обработчик нажатия кнопки быстрого выбора параметров поиска
+
+    Сообщение шага редактируется на месте: показывается следующий шаг
+    или, после выбора количества отелей и фото, описание запущенного поиска.
+    Записи журнала нажатия получают search_id поиска, к которому относится
+    кнопка, и попадают в выборку вместе с ним.
+    """
+    state = quick_pick.wizard(call.message.chat.id)
+    with search_context(state['params'] if state is not None else {}):
+        handle_choice(call, state)
+
+
+def handle_choice(call: CallbackQuery, state: Optional[Dict[str, Any]]) -> None:
+    """
+    Обработать нажатие кнопки для состояния диалога state
+
+    Args:
+        call: нажатие кнопки
+        state: состояние диалога чата (None, если его нет или оно устарело)
+    """
+    sender = call.from_user
+    chat_id = call.message.chat.id
+    message_id = call.message.message_id
+    logger.info('Пользователь {}({}) нажал кнопку "{}"', sender.username, sender.id, call.data)
+
+    try:
+        step, number = quick_pick.parse_callback(call.data)
+    except ValueError:
+        step, number = None, 0
+    if not quick_pick.is_current(state, message_id, step):
+        loader.bot.answer_callback_query(call.id, 'Этот выбор уже неактуален. Начни поиск заново')
+        return
+    if not quick_pick.is_valid_choice(state, step, number):
+        loader.bot.answer_callback_query(call.id, 'Такого варианта нет. Выбери кнопку из списка')
+        return
+    loader.bot.answer_callback_query(call.id)
+    # Кнопка заменяет ввод текстом на этом шаге
+    loader.bot.clear_step_handler_by_chat_id(chat_id)
+
+    command = state['command']
+    params = state['params']
+    if step == 'last':
+        params = dict(state['last'], search_id=params['search_id'])
+    elif step == 'city':
+        if not choose_city(call, state['cities'][number], command, params):
+            return
+        show_step(call, 'stay', command, params)
+        return
+    elif step == 'adults':
+        if params.get('adults', 1) != number:
+            params['adults'] = number
+            loader.bot.edit_message_reply_markup(chat_id, message_id,
+                                                 reply_markup=quick_pick.step_keyboard('stay', params))
+        register_text_step(call.message, 'stay', command, params)
+        return
+    elif step == 'stay':
+        params.update(stay.option_stay(number))
+        show_step(call, 'price' if command == 'bestdeal' else 'preset', command, params)
+        return
+    elif step == 'price':
+        params['min_price'], params['max_price'] = quick_pick.PRICE_BANDS[number]
+        show_step(call, 'dist', command, params)
+        return
+    elif step == 'dist':
+        params['min_dist'], params['max_dist'] = quick_pick.DISTANCE_BANDS[number]
+        show_step(call, 'preset', command, params)
+        return
+    else:
+        params['results_count'], params['photos_count'] = quick_pick.PRESETS[number]
+
+    loader.bot.edit_message_text(f'Поиск: {escape(quick_pick.describe(params))}…',
+                                 chat_id=chat_id, message_id=message_id)
+    if command == 'bestdeal':
+        bestdeal_show_hotels(params, chat_id, announce=False)
+    elif command == 'compare':
+        compare_show_hotels(params, chat_id, announce=False)
+    else:
+        price_show_hotels(params, chat_id, announce=False)
+
+
+def choose_city(call: CallbackQuery, city_name: str, command: str, params: dict) -> bool:
+    """
+    Найти destinationId выбранного кнопкой города
+
+    При ошибке сообщение шага заменяется текстом ошибки, а ввод города
+    текстом снова становится доступен.
+
+    Returns:
+        True, если город найден и записан в параметры запроса
+    """
+    chat_id = call.message.chat.id
+    city = utils.normalize_city(city_name)
+    destination_id = None
+    text = 'Некорректный ввод: не удалось найти город по твоему запросу.\n' \
+           'Попробуй набрать что-то другое'
+    try:
+        if city is not None:
+            destination_id = loader.requester.search_destination(city, deadline=utils.Deadline(config.SEARCH_DEADLINE))
+    except CircuitOpen:
+        text = 'Сервис Hotels.com сейчас недоступен.\n' \
+               'Попробуй еще раз через пару минут'
+    except requests.RequestException as e:
+        text = 'Ошибка: неудачная попытка соединения во время поиска города.\n' \
+               'Попробуй еще раз'
+        logger.error('Ошибка при запросе destinationId: {}', e)
+
+    if destination_id is None:
+        message = loader.bot.edit_message_text(text, chat_id=chat_id, message_id=call.message.message_id)
+        if command == 'bestdeal':
+            loader.bot.register_next_step_handler(message, search_best_deal.ask_city_step, params)
+        else:
+            loader.bot.register_next_step_handler(message, search_by_price.ask_city_step, params)
+        return False
+
+    params['destination_id'] = destination_id
+    params['city'] = city.text
+    params['locale'] = city.locale
+    return True
+
+
+def show_step(call: CallbackQuery, step: str, command: str, params: dict) -> None:
+    """Показать следующий шаг в том же сообщении и принять ввод текстом"""
+    message = quick_pick.send_step(call.message.chat.id, step, command, params,
+                                   message_id=call.message.message_id)
+    register_text_step(message, step, command, params)
+
+
+def register_text_step(message: Message, step: str, command: str, params: dict) -> None:
+    """Принять ввод текстом на шаге диалога вместо нажатия кнопки"""
+    if step == 'stay':
+        module = search_best_deal if command == 'bestdeal' else search_by_price
+        loader.bot.register_next_step_handler(message, module.ask_stay_step, params)
+    elif step == 'price':
+        loader.bot.register_next_step_handler(message, search_best_deal.ask_price_range_step, params)
+    elif step == 'dist':
+        loader.bot.register_next_step_handler(message, search_best_deal.ask_distance_range_step, params)
+    elif command == 'bestdeal':
+        loader.bot.register_next_step_handler(message, search_best_deal.ask_count_step, params)
+    elif command == 'compare':
+        loader.bot.register_next_step_handler(message, compare.ask_count_step, params)
+    else:
+        loader.bot.register_next_step_handler(message, search_by_price.ask_count_step, params)
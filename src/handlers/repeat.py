@@ -0,0 +1,63 @@
+from time import time
+
+from loguru import logger
+from telebot.types import Message
+
+from data import config
+from src import loader, utils
+from src.handlers.processes import bestdeal_show_hotels, compare_show_hotels, price_show_hotels
+from src.handlers.processes.cards import HotelRecord
+from src.handlers.processes.search_best_deal import build_messages, send_results
+from src.utils.logs import search_context
+
+# Время (сек.), в течение которого снимок результатов считается актуальным
+SNAPSHOT_TTL = 30 * 60
+
+
+def on_repeat(msg: Message) -> None:
+    """
+    Обработчик команд `/repeat` и `/repeat_<id>`
+
+    Повторяет поиск из истории без повторного диалога и без поиска города.
+    Если снимок результатов еще актуален, отели показываются из него,
+    иначе выполняется новый поиск с сохраненными параметрами.
+    """
+    sender = msg.from_user
+    context = {}
+    with search_context(context):
+        logger.info('Пользователь {}({}) прислал команду "{}"', sender.username, sender.id, msg.text)
+
+        chat_id = msg.chat.id
+        _, _, entry_id = msg.text.partition('_')
+        entry = loader.database.select_history_entry(user_id=sender.id,
+                                                     entry_id=int(entry_id) if entry_id else None)
+
+        if entry is None:
+            text = 'Не нашел такой поиск в твоей истории.\n' \
+                   'Посмотреть историю: /history'
+            loader.bot.send_message(chat_id, text)
+            return
+        if entry['destination_id'] is None or entry['params'] is None:
+            text = f'Этот поиск был сделан до появления повтора, его не получится повторить.\n' \
+                   f'Попробуй выполнить его заново: /{entry["command"]}'
+            loader.bot.send_message(chat_id, text)
+            return
+
+        req_params = dict(entry['params'], city=entry['city'], destination_id=entry['destination_id'],
+                          search_id=context['search_id'])
+
+        if entry['results'] and time() - entry['created_at'] < SNAPSHOT_TTL:
+            logger.info('Повтор поиска {} из снимка результатов (chat: {})', entry['id'], chat_id)
+            records = [HotelRecord(*record) for record in entry['results']]
+            messages = build_messages(records, req_params['photos_count'], req_params['locale'],
+                                      utils.Deadline(config.SEARCH_DEADLINE))
+            send_results(chat_id, messages)
+            return
+
+        logger.info('Повтор поиска {} с сохраненными параметрами (chat: {})', entry['id'], chat_id)
+        if entry['command'] == 'bestdeal':
+            bestdeal_show_hotels(req_params, chat_id)
+        elif entry['command'] == 'compare':
+            compare_show_hotels(req_params, chat_id)
+        else:
+            price_show_hotels(req_params, chat_id)
@@ -0,0 +1,56 @@
+from loguru import logger
+from telebot.types import Message
+
+from src import loader
+from src.utils.db_api.queries import TRENDING_DAYS
+from src.utils.logs import search_context
+
+
+def on_top(msg: Message) -> None:
+    """Обработчик команды `/top`"""
+    sender = msg.from_user
+    with search_context({}):
+        logger.info('Пользователь {}({}) прислал команду "/top"', sender.username, sender.id)
+
+        chat_id = msg.chat.id
+        top_cities = loader.database.select_top_cities(limit=10)
+        trending_cities = loader.database.select_trending_cities(limit=5)
+
+        if not top_cities:
+            text = 'Пока что никто ничего не искал.\n' \
+                   'Стань первым: /help'
+            loader.bot.send_message(chat_id, text)
+            return
+
+        cities_strings = (f'  {number}. {elem["city"]} – {elem["count"]}'
+                          for number, elem in enumerate(top_cities, start=1))
+        lines = ['Самые популярные города:', *cities_strings]
+        if trending_cities:
+            lines.append(f'\nЗа последние {TRENDING_DAYS} дней:')
+            lines.extend(f'  • {elem["city"]} – {elem["count"]}' for elem in trending_cities)
+        text = '\n'.join(lines)
+        loader.bot.send_message(chat_id, text)
+
+
+def on_mystats(msg: Message) -> None:
+    """Обработчик команды `/mystats`"""
+    sender = msg.from_user
+    with search_context({}):
+        logger.info('Пользователь {}({}) прислал команду "/mystats"', sender.username, sender.id)
+
+        chat_id = msg.chat.id
+        top_commands = loader.database.select_user_top_commands(user_id=sender.id, limit=1)
+        top_cities = loader.database.select_user_top_cities(user_id=sender.id, limit=5)
+
+        if not top_commands:
+            text = 'История пока что пуста ;(\n' \
+                   'Хороший повод попробовать одну из моих команд: /help'
+            loader.bot.send_message(chat_id, text)
+            return
+
+        favorite = top_commands[0]
+        cities_strings = (f'  • {elem["city"]} – {elem["count"]}' for elem in top_cities)
+        text = '\n'.join((f'Твоя любимая команда: /{favorite["command"]} ({favorite["count"]})',
+                          'Чаще всего ты искал отели в городах:',
+                          *cities_strings))
+        loader.bot.send_message(chat_id, text)
@@ -0,0 +1,120 @@
+from loguru import logger
+from telebot.types import Message
+
+from src import loader
+from src.utils.logs import search_context
+from src.utils.db_api.queries import WATCH_COMMANDS
+from src.watcher import WATCH_MAX_PAGES, WATCH_PAGE_SIZE
+from .processes import quick_pick
+from .processes.stay import stay_expired
+
+# Сколько подписок может быть у одного пользователя
+MAX_WATCHES_PER_USER = 5
+
+
+def on_watch(msg: Message) -> None:
+    """
+    Обработчик команд `/watch <цена>` и `/watch_<id> <цена>`
+
+    Подписывает пользователя на последний поиск /lowprice или /bestdeal из
+    истории (или на поиск с указанным id): бот пришлет уведомление, когда
+    в этом поиске появятся отели дешевле указанной цены за ночь.
+    """
+    sender = msg.from_user
+    with search_context({}):
+        logger.info('Пользователь {}({}) прислал команду "{}"', sender.username, sender.id, msg.text)
+
+        chat_id = msg.chat.id
+        command, _, threshold = msg.text.partition(' ')
+        _, _, entry_id = command.partition('_')
+        threshold = threshold.strip()
+
+        if not threshold or int(threshold) <= 0:
+            text = 'Укажи цену за ночь в рублях, ниже которой мне нужно тебя предупредить.\n' \
+                   'Например: <code>/watch 3000</code> – подписаться на последний поиск /lowprice или /bestdeal'
+            loader.bot.send_message(chat_id, text)
+            return
+
+        entry = loader.database.select_history_entry(user_id=sender.id,
+                                                     entry_id=int(entry_id) if entry_id else None)
+        if entry is None:
+            text = 'Не нашел такой поиск в твоей истории.\n' \
+                   'Посмотреть историю: /history'
+            loader.bot.send_message(chat_id, text)
+            return
+        if entry['command'] not in WATCH_COMMANDS or entry['destination_id'] is None or entry['params'] is None:
+            text = 'Подписаться можно только на поиск /lowprice или /bestdeal.\n' \
+                   'Выполни такой поиск и отправь команду еще раз'
+            loader.bot.send_message(chat_id, text)
+            return
+        if stay_expired(entry['params']):
+            text = 'Даты этого поиска уже прошли.\n' \
+                   'Выполни поиск на новые даты и отправь команду еще раз'
+            loader.bot.send_message(chat_id, text)
+            return
+        if len(loader.database.select_watches(user_id=sender.id)) >= MAX_WATCHES_PER_USER:
+            text = f'У тебя уже {MAX_WATCHES_PER_USER} подписок – это максимум.\n' \
+                   f'Отменить ненужные: /watches'
+            loader.bot.send_message(chat_id, text)
+            return
+
+        watch_id = loader.database.add_watch(user_id=sender.id,
+                                             command=entry['command'],
+                                             city=entry['city'],
+                                             destination_id=entry['destination_id'],
+                                             params=entry['params'],
+                                             threshold=int(threshold))
+        logger.info('Пользователь {} подписался на снижение цен: подписка {}', sender.id, watch_id)
+
+        description = quick_pick.describe(dict(entry['params'], city=entry['city']))
+        text = f'Готово! Сообщу, когда в поиске /{entry["command"]} ({description}) ' \
+               f'появятся отели дешевле {threshold} RUB за ночь.\n' \
+               f'Отменить подписку: /unwatch_{watch_id}'
+        if entry['command'] == 'bestdeal':
+            text += f'\n\nПроверяются не больше {WATCH_MAX_PAGES * WATCH_PAGE_SIZE} ближайших к центру отелей ' \
+                    f'в этом диапазоне цен.'
+        loader.bot.send_message(chat_id, text)
+
+
+def on_watches(msg: Message) -> None:
+    """Обработчик команды `/watches`"""
+    sender = msg.from_user
+    with search_context({}):
+        logger.info('Пользователь {}({}) прислал команду "/watches"', sender.username, sender.id)
+
+        chat_id = msg.chat.id
+        watches = loader.database.select_watches(user_id=sender.id)
+
+        if len(watches) == 0:
+            text = 'У тебя нет подписок на снижение цен.\n' \
+                   'Выполни поиск /lowprice или /bestdeal и отправь <code>/watch &lt;цена&gt;</code>'
+            loader.bot.send_message(chat_id, text)
+            return
+
+        watch_strings = (f'  • /{elem["command"]} – {elem["city"]}, дешевле {elem["threshold"]} RUB '
+                         f'(отменить: /unwatch_{elem["id"]})'
+                         for elem in watches)
+
+        text = '\n'.join(('Подписки на снижение цен: ', *watch_strings))
+        loader.bot.send_message(chat_id, text)
+
+
+def on_unwatch(msg: Message) -> None:
+    """Обработчик команд `/unwatch` (отменить все подписки) и `/unwatch_<id>`"""
+    sender = msg.from_user
+    with search_context({}):
+        logger.info('Пользователь {}({}) прислал команду "{}"', sender.username, sender.id, msg.text)
+
+        chat_id = msg.chat.id
+        _, _, watch_id = msg.text.partition('_')
+        deleted = loader.database.delete_watches(user_id=sender.id,
+                                                 watch_id=int(watch_id) if watch_id else None)
+
+        if deleted == 0:
+            text = 'Не нашел такой подписки.\n' \
+                   'Посмотреть подписки: /watches'
+        elif watch_id:
+            text = 'Подписка отменена.'
+        else:
+            text = f'Подписки отменены: {deleted}.'
+        loader.bot.send_message(chat_id, text)
@@ -1,28 +1,220 @@
-from sys import argv
+"""
+Компоненты бота и фабрика приложения
 
-from aiohttp import web
-from telebot import TeleBot
-from telebot.types import Update
+Импорт модуля не создает объектов и не обращается к сети или базе
+данных: bot, requester, database, пул запросов /compare (compare_fan_out)
+и фоновые потоки (compaction_job, notification_sender, watch_scheduler)
+создаются при первом обращении к ним (loader.bot). Модули обработчиков обращаются к компонентам только
+во время обработки сообщений. Подготовка к запуску – миграции базы
+данных и регистрация обработчиков – выполняется явно вызовом setup(),
+а остановка с освобождением ресурсов – вызовом shutdown().
+"""
+import threading
+import time
+from typing import Any, Callable, Dict
+
+from loguru import logger
 
 from data import config
-from src.botrequests import HotelsRequester
-from src.utils import db_api
 
-bot = TeleBot(token=config.BOT_TOKEN, parse_mode='HTML')
 
-requester = HotelsRequester(api_key=config.API_KEY)
+def _create_bot():
+    from telebot import apihelper
+
+    from src.bot import HotelsBot
+
+    if config.TELEGRAM_API_URL:
+        apihelper.API_URL = config.TELEGRAM_API_URL.rstrip('/') + '/bot{0}/{1}'
+    return HotelsBot(token=config.BOT_TOKEN, parse_mode='HTML')
+
+
+def _create_requester():
+    from src.botrequests import HotelsRequester
+
+    return HotelsRequester(api_key=config.API_KEY, base_url=config.HOTELS_API_URL)
+
+
+def _create_compare_fan_out():
+    from src.handlers.processes.compare import MAX_CITIES
+    from src.utils.fan_out import FanOut
+
+    # Отдельный пул: запросы сравнения не занимают общий пул перебора дат
+    # HotelsRequester и не могут заблокироваться в нем
+    return FanOut(max_workers=2 * MAX_CITIES, name='compare')
+
+
+def _create_database():
+    from src.utils import db_api
+
+    return db_api.Database(database_path=config.DATABASE_PATH)
+
+
+def _create_compaction_job():
+    from src.utils import db_api
+
+    return db_api.CompactionJob(database=__getattr__('database'),
+                                interval=config.DB_MAINTENANCE_INTERVAL,
+                                max_rows_per_user=config.HISTORY_MAX_ROWS_PER_USER,
+                                max_age_days=config.HISTORY_MAX_AGE_DAYS)
+
+
+def _create_notification_sender():
+    from src.notifications import NotificationSender
+
+    database = __getattr__('database')
+    return NotificationSender(bot=__getattr__('bot'),
+                              rate=config.NOTIFICATIONS_PER_SECOND,
+                              on_forbidden=lambda chat_id: database.delete_watches(chat_id))
+
+
+def _create_watch_scheduler():
+    from src.watcher import WatchScheduler
+
+    return WatchScheduler(database=__getattr__('database'),
+                          requester=__getattr__('requester'),
+                          sender=__getattr__('notification_sender'),
+                          interval=config.WATCH_INTERVAL)
+
+
+_FACTORIES: Dict[str, Callable[[], Any]] = {
+    'bot': _create_bot,
+    'requester': _create_requester,
+    'compare_fan_out': _create_compare_fan_out,
+    'database': _create_database,
+    'compaction_job': _create_compaction_job,
+    'notification_sender': _create_notification_sender,
+    'watch_scheduler': _create_watch_scheduler,
+}
+_lock = threading.RLock()
 
-database = db_api.Database(database_path=config.DATABASE_PATH)
-database.create_users_table()
-database.create_history_table()
 
+def __getattr__(name: str) -> Any:
+    """
+    Создать компонент при первом обращении и сохранить его в модуле
+
+    Raises:
+        AttributeError: если компонент не существует
+    """
+    factory = _FACTORIES.get(name)
+    if factory is None:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    with _lock:
+        if name not in globals():
+            globals()[name] = factory()
+    return globals()[name]
+
+
+def setup():
+    """
+    Подготовить бота к запуску
+
+    Применяет миграции базы данных и регистрирует обработчики сообщений.
+    Длительность каждого этапа выводится в журнал.
+
+    Returns:
+        Объект бота
+    """
+    started_at = time.perf_counter()
+    for migration in __getattr__('database').migrate():
+        logger.info('Применена миграция базы данных {}', migration)
+    migrated_at = time.perf_counter()
+
+    from src.handlers import register_handlers
+    register_handlers(__getattr__('bot'))
+    registered_at = time.perf_counter()
+
+    logger.info(f'Подготовка к запуску: миграции {migrated_at - started_at:.3f} с, '
+                f'обработчики {registered_at - migrated_at:.3f} с')
+    return __getattr__('bot')
+
+
+def shutdown(timeout: float, confirm_updates: bool = False) -> bool:
+    """
+    Остановить бота и освободить ресурсы
+
+    Проверка подписок прекращается сразу, затем бот перестает принимать
+    обновления и ждет завершения начатых обработчиков, отправляет
+    оставшиеся в очереди уведомления, останавливает фоновые потоки и
+    закрывает соединения. Ожидание занимает не больше timeout секунд;
+    компоненты, которые не были созданы, не создаются.
+
+    Получение обновлений подтверждается только после того, как все их
+    обработчики завершились: если ожидание прервано по timeout,
+    необработанные обновления будут получены повторно после перезапуска.
+
+    Args:
+        timeout: максимальное время ожидания в секундах
+        confirm_updates: подтвердить полученные обновления (режим polling)
+
+    Returns:
+        True, если все обработчики и уведомления завершились вовремя
+    """
+    started_at = time.monotonic()
+    deadline = started_at + timeout
+    created = globals()
+    completed = True
+
+    if 'watch_scheduler' in created:
+        created['watch_scheduler'].stop()
+    if 'bot' in created:
+        bot = created['bot']
+        if bot.shutdown(timeout):
+            if confirm_updates:
+                bot.confirm_updates()
+        else:
+            completed = False
+            logger.warning('За {} с не завершились обработчики: {}', timeout, bot.in_flight)
+    if 'notification_sender' in created:
+        sender = created['notification_sender']
+        if not sender.flush(max(deadline - time.monotonic(), 0)):
+            completed = False
+            logger.warning('Не отправлены уведомления: {}', sender.pending)
+        sender.stop()
+    if 'compaction_job' in created:
+        created['compaction_job'].stop()
+
+    for name in ('watch_scheduler', 'notification_sender', 'compaction_job'):
+        thread = created.get(name)
+        if thread is not None and thread.is_alive():
+            thread.join(max(deadline - time.monotonic(), 0))
+    if 'compare_fan_out' in created:
+        created['compare_fan_out'].shutdown(wait=False)
+    if 'requester' in created:
+        created['requester'].close()
+    if 'database' in created:
+        created['database'].close()
+
+    logger.info('Бот остановлен за {:.1f} с', time.monotonic() - started_at)
+    return completed
+
+
+def make_webhook_app():
+    """
+    Создать aiohttp-приложение для приема обновлений через Webhook
+
+    Returns:
+        Объект aiohttp.web.Application
+    """
+    import asyncio
+
+    from aiohttp import web
+    from telebot.types import Update
+
+    bot = __getattr__('bot')
 
-if '--webhook' in argv[1:]:
     async def webhook_handle(request):
         request_body_dict = await request.json()
         update = Update.de_json(request_body_dict)
         bot.process_new_updates([update])
         return web.Response()
 
+    async def on_shutdown(app):
+        # aiohttp уже перестал принимать соединения; ожидание обработчиков
+        # выполняется в отдельном потоке, чтобы не блокировать цикл событий
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, shutdown, config.SHUTDOWN_TIMEOUT)
+
     app = web.Application()
     app.router.add_post(f'/{config.URL_SECRET}', webhook_handle)
+    app.on_shutdown.append(on_shutdown)
+    return app
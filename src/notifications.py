@@ -0,0 +1,123 @@
+"""
+Отправка уведомлений пользователям с ограничением частоты
+
+Telegram ограничивает количество сообщений бота (около 30 в секунду на
+всех пользователей), поэтому уведомления, которые бот отправляет сам, а
+не в ответ на сообщение, ставятся в очередь и отправляются отдельным
+потоком не чаще заданной частоты. Ответ 429 приостанавливает отправку на
+указанное Telegram время.
+"""
+import queue
+import threading
+from time import monotonic, sleep
+from typing import Callable, Optional
+
+from loguru import logger
+from telebot import TeleBot
+from telebot.apihelper import ApiTelegramException
+
+from src.utils import TokenBucket
+
+# Сколько раз пытаться отправить уведомление после ответа 429
+MAX_ATTEMPTS = 3
+
+
+class NotificationSender(threading.Thread):
+    """
+    Поток отправки уведомлений из очереди
+
+    Args:
+        bot: объект бота
+        rate: максимальное количество сообщений в секунду
+        queue_size: максимальная длина очереди; при переполнении новые
+            уведомления отбрасываются
+        on_forbidden: вызывается с id чата, если пользователь заблокировал
+            бота (ответ 403)
+    """
+
+    def __init__(self,
+                 bot: TeleBot,
+                 rate: float,
+                 queue_size: int = 10000,
+                 on_forbidden: Optional[Callable[[int], None]] = None):
+        """Конструктор класса"""
+        super().__init__(name='notifications', daemon=True)
+        self.bot = bot
+        self.on_forbidden = on_forbidden
+        self.__bucket = TokenBucket(rate)
+        self.__queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.__stopped = threading.Event()
+
+    def notify(self, chat_id: int, text: str) -> bool:
+        """
+        Поставить уведомление в очередь
+
+        Returns:
+            False, если очередь переполнена и уведомление отброшено
+        """
+        try:
+            self.__queue.put_nowait((chat_id, text))
+        except queue.Full:
+            logger.warning('Очередь уведомлений переполнена, уведомление для {} отброшено', chat_id)
+            return False
+        return True
+
+    @property
+    def pending(self) -> int:
+        """Количество уведомлений в очереди"""
+        return self.__queue.qsize()
+
+    def run(self) -> None:
+        while not self.__stopped.is_set():
+            try:
+                chat_id, text = self.__queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            self.send(chat_id, text)
+
+    def send(self, chat_id: int, text: str) -> bool:
+        """
+        Отправить уведомление с учетом ограничения частоты
+
+        Returns:
+            True, если уведомление доставлено
+        """
+        for _ in range(MAX_ATTEMPTS):
+            self.__bucket.acquire()
+            try:
+                self.bot.send_message(chat_id, text, disable_web_page_preview=True)
+            except ApiTelegramException as e:
+                if e.error_code == 429:
+                    retry_after = e.result_json.get('parameters', {}).get('retry_after', 1)
+                    logger.warning('Telegram ограничил отправку уведомлений на {} с', retry_after)
+                    if self.__stopped.wait(retry_after):
+                        return False
+                    continue
+                if e.error_code == 403 and self.on_forbidden is not None:
+                    logger.info('Пользователь {} заблокировал бота, уведомления отключены', chat_id)
+                    self.on_forbidden(chat_id)
+                else:
+                    logger.error('Не удалось отправить уведомление (chat: {}): {}', chat_id, e)
+                return False
+            except Exception as e:
+                logger.error('Не удалось отправить уведомление (chat: {}): {}', chat_id, e)
+                return False
+            return True
+        logger.error('Уведомление для {} не отправлено: превышено число попыток', chat_id)
+        return False
+
+    def flush(self, timeout: float) -> bool:
+        """
+        Дождаться отправки уведомлений, оставшихся в очереди
+
+        Returns:
+            True, если очередь опустела за timeout секунд
+        """
+        deadline = monotonic() + timeout
+        while self.pending and self.is_alive() and monotonic() < deadline:
+            sleep(0.1)
+        return not self.pending
+
+    def stop(self) -> None:
+        """Остановить поток; уведомления, оставшиеся в очереди, не отправляются (см. flush)"""
+        self.__stopped.set()
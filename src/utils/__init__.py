@@ -1,2 +1,7 @@
 from .locale_from_string import locale_from_string
+from .normalization import NormalizedCity, detect_locale, normalize_city
 from .sleep_before_call import sleep_before_call
+from .cache import LRUCache
+from .deadline import Deadline
+from .fan_out import FanOut, FanOutResult
+from .rate_limit import TokenBucket
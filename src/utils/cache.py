@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Hashable, Optional
+
+
+class LRUCache:
+    """
+    Потокобезопасный LRU-кэш с ограниченным временем жизни записей
+
+    Args:
+        maxsize: максимальное количество записей в кэше
+        ttl: время жизни записи в секундах (None – без ограничения)
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: Optional[float] = None):
+        """Конструктор класса"""
+        self.maxsize: int = maxsize
+        self.ttl: Optional[float] = ttl
+        self.__data: OrderedDict = OrderedDict()
+        self.__lock = Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Получить значение по ключу
+
+        Args:
+            key: ключ записи
+            default: значение, возвращаемое при отсутствии записи
+
+        Returns:
+            Значение из кэша или default, если запись отсутствует или устарела
+        """
+        with self.__lock:
+            try:
+                value, expires_at = self.__data[key]
+            except KeyError:
+                return default
+            if expires_at is not None and expires_at <= monotonic():
+                del self.__data[key]
+                return default
+            self.__data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Сохранить значение в кэш, вытеснив самую старую запись при переполнении
+
+        Args:
+            key: ключ записи
+            value: сохраняемое значение
+        """
+        expires_at = monotonic() + self.ttl if self.ttl is not None else None
+        with self.__lock:
+            self.__data[key] = (value, expires_at)
+            self.__data.move_to_end(key)
+            while len(self.__data) > self.maxsize:
+                self.__data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Удалить запись из кэша и вернуть её значение"""
+        with self.__lock:
+            item = self.__data.pop(key, None)
+        return default if item is None else item[0]
+
+    def clear(self) -> None:
+        """Очистить кэш"""
+        with self.__lock:
+            self.__data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self.__data)
+
+
+_MISSING = object()
@@ -1 +1,5 @@
+from .aiosqlite_backend import AsyncDatabase
+from .base import AsyncStorage, Storage
+from .maintenance import CompactionJob
 from .sqlite import Database
+from .threaded import ThreadedStorage
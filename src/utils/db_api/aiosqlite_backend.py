@@ -0,0 +1,216 @@
+"""
+Асинхронное хранилище в базе данных SQLite на основе aiosqlite
+
+Пакет aiosqlite необязателен: он нужен только при использовании
+AsyncDatabase (pip install aiosqlite).
+"""
+import asyncio
+import sqlite3
+from time import time
+from typing import Any, Dict, List, Optional, Set
+
+try:
+    import aiosqlite
+except ImportError:  # pragma: no cover
+    aiosqlite = None
+
+from . import migrations, queries
+from .base import AsyncStorage
+from .queries import HISTORY_MAX_AGE_DAYS, HISTORY_MAX_ROWS_PER_USER, PHOTO_FILE_IDS_LIMIT
+
+
+class AsyncDatabase(AsyncStorage):
+    """
+    Асинхронное хранилище в базе данных SQLite
+
+    Команды выполняются в отдельном потоке aiosqlite через одно постоянное
+    соединение, поэтому цикл событий не блокируется. Изменяющие операции
+    выполняются в явных транзакциях и упорядочиваются блокировкой, чтобы
+    транзакции конкурентных задач не перемешивались на общем соединении.
+
+    Args:
+        database_path: относительный путь к файлу базы данных
+
+    Raises:
+        RuntimeError: если пакет aiosqlite не установлен
+    """
+
+    def __init__(self, database_path: str = 'main.db'):
+        """Конструктор класса"""
+        if aiosqlite is None:
+            raise RuntimeError('aiosqlite is not installed')
+        self.database_path: str = database_path
+        self.__connection: Optional['aiosqlite.Connection'] = None
+        self.__write_lock: Optional[asyncio.Lock] = None
+        self.__used_photo_urls: Set[str] = set()
+
+    async def open(self) -> None:
+        if self.__connection is None:
+            self.__connection = await aiosqlite.connect(self.database_path, isolation_level=None)
+            self.__write_lock = asyncio.Lock()
+
+    async def close(self) -> None:
+        if self.__connection is not None:
+            await self.__connection.close()
+            self.__connection = None
+
+    @property
+    def connection(self) -> 'aiosqlite.Connection':
+        if self.__connection is None:
+            raise RuntimeError('database is not opened')
+        return self.__connection
+
+    async def fetchall(self, sql_command: str, parameters: tuple = ()) -> List[Any]:
+        """Выполнить SQL-команду и вернуть все строки результата"""
+        return list(await self.connection.execute_fetchall(sql_command, parameters))
+
+    async def fetchone(self, sql_command: str, parameters: tuple = ()) -> Optional[Any]:
+        """Выполнить SQL-команду и вернуть первую строку результата"""
+        async with self.connection.execute(sql_command, parameters) as cursor:
+            return await cursor.fetchone()
+
+    async def execute_transaction(self, commands: List[queries.Command]) -> int:
+        """
+        Выполнить несколько SQL-команд в одной транзакции
+
+        Args:
+            commands: последовательность пар (строка SQL-команды, параметры)
+
+        Returns:
+            Суммарное количество измененных строк
+        """
+        changed = 0
+        async with self.__write_lock:
+            await self.connection.execute('BEGIN IMMEDIATE')
+            try:
+                for sql_command, parameters in commands:
+                    async with self.connection.execute(sql_command, parameters) as cursor:
+                        changed += max(cursor.rowcount, 0)
+            except BaseException:
+                await self.connection.execute('ROLLBACK')
+                raise
+            await self.connection.execute('COMMIT')
+        return changed
+
+    async def migrate(self) -> List[str]:
+        def apply() -> List[migrations.Migration]:
+            connection = sqlite3.connect(self.database_path, isolation_level=None)
+            try:
+                return migrations.migrate(connection)
+            finally:
+                connection.close()
+
+        applied = await asyncio.get_running_loop().run_in_executor(None, apply)
+        return [f'{migration.version}: {migration.description}' for migration in applied]
+
+    async def compact(self,
+                      max_rows_per_user: int = HISTORY_MAX_ROWS_PER_USER,
+                      max_age_days: int = HISTORY_MAX_AGE_DAYS,
+                      vacuum_pages: int = 1000) -> int:
+        min_created_at, min_day = queries.compact_bounds(max_age_days)
+        deleted = await self.execute_transaction([
+            (queries.DELETE_OLD_HISTORY, (min_created_at,)),
+            (queries.DELETE_EXCESS_HISTORY, (max_rows_per_user,)),
+        ])
+        await self.execute_transaction([(queries.DELETE_OLD_HISTORY_DAILY, (min_day,)),
+                                        *queries.expire_trending_commands()])
+        used_photo_urls, self.__used_photo_urls = self.__used_photo_urls, set()
+        commands = [(queries.TOUCH_PHOTO_FILE_ID, row)
+                    for row in queries.touch_photo_file_ids_rows(used_photo_urls, int(time()))]
+        commands.append((queries.EVICT_PHOTO_FILE_IDS, (PHOTO_FILE_IDS_LIMIT,)))
+        await self.execute_transaction(commands)
+        await self.connection.execute('PRAGMA optimize')
+        await self.fetchall(f'PRAGMA incremental_vacuum({int(vacuum_pages)})')
+        return deleted
+
+    async def add_user(self, user_id: int, username: str) -> None:
+        await self.execute_transaction([(queries.ADD_USER, (user_id, username))])
+
+    async def select_from_users(self, **parameters) -> List[dict]:
+        data = await self.fetchall(queries.select_from('users', parameters, queries.USERS_COLUMNS))
+        return [queries.user_row(elem) for elem in data]
+
+    async def add_to_history(self,
+                             user_id: int,
+                             command: str,
+                             city: str,
+                             destination_id: Optional[str] = None,
+                             params: Optional[Dict[str, Any]] = None,
+                             results: Optional[List[Any]] = None,
+                             created_at: Optional[int] = None) -> None:
+        await self.execute_transaction(queries.history_commands(user_id, command, city, destination_id,
+                                                                params, results, created_at))
+
+    async def select_top_cities(self, limit: int = 10) -> List[dict]:
+        data = await self.fetchall(queries.SELECT_TOP_CITIES, (limit,))
+        return [queries.city_count_row(elem) for elem in data]
+
+    async def select_trending_cities(self, limit: int = 10) -> List[dict]:
+        data = await self.fetchall(queries.SELECT_TRENDING_CITIES, (limit,))
+        return [queries.city_count_row(elem) for elem in data]
+
+    async def select_user_top_cities(self, user_id: int, limit: int = 5) -> List[dict]:
+        data = await self.fetchall(queries.SELECT_USER_TOP_CITIES, (user_id, limit))
+        return [queries.city_count_row(elem) for elem in data]
+
+    async def select_user_recent_cities(self, user_id: int, limit: int = 4) -> List[str]:
+        data = await self.fetchall(queries.SELECT_USER_RECENT_CITIES, (user_id, limit))
+        return [elem[0] for elem in data]
+
+    async def select_user_top_commands(self, user_id: int, limit: int = 3) -> List[dict]:
+        data = await self.fetchall(queries.SELECT_USER_TOP_COMMANDS, (user_id, limit))
+        return [queries.command_count_row(elem) for elem in data]
+
+    async def select_from_history(self, **parameters) -> List[dict]:
+        data = await self.fetchall(queries.select_from('history', parameters, queries.HISTORY_COLUMNS))
+        return [queries.history_row(elem) for elem in data]
+
+    async def select_recent_history(self, user_id: int, limit: int = 20) -> List[dict]:
+        data = await self.fetchall(queries.SELECT_RECENT_HISTORY, (user_id, limit))
+        return [queries.history_row(elem) for elem in data]
+
+    async def select_history_entry(self, user_id: int, entry_id: Optional[int] = None) -> Optional[dict]:
+        sql, parameters = queries.history_entry_query(user_id, entry_id)
+        return queries.history_entry_row(await self.fetchone(sql, parameters))
+
+    async def select_photo_file_ids(self, urls: List[str]) -> Dict[str, str]:
+        if not urls:
+            return {}
+        data = dict(await self.fetchall(queries.photo_file_ids_query(urls), tuple(urls)))
+        if len(self.__used_photo_urls) < PHOTO_FILE_IDS_LIMIT:
+            self.__used_photo_urls.update(data)
+        return data
+
+    async def save_photo_file_ids(self, file_ids: Dict[str, str]) -> None:
+        if not file_ids:
+            return
+        await self.execute_transaction([(queries.SAVE_PHOTO_FILE_ID, row)
+                                        for row in queries.photo_file_ids_rows(file_ids)])
+
+    async def add_watch(self,
+                        user_id: int,
+                        command: str,
+                        city: str,
+                        destination_id: str,
+                        params: Dict[str, Any],
+                        threshold: int) -> int:
+        parameters = queries.watch_parameters(user_id, command, city, destination_id, params, threshold)
+        async with self.__write_lock:
+            async with self.connection.execute(queries.INSERT_WATCH, parameters) as cursor:
+                return cursor.lastrowid
+
+    async def select_watches(self, user_id: Optional[int] = None) -> List[dict]:
+        if user_id is None:
+            data = await self.fetchall(queries.SELECT_WATCHES)
+        else:
+            data = await self.fetchall(queries.SELECT_USER_WATCHES, (user_id,))
+        return [queries.watch_row(elem) for elem in data]
+
+    async def delete_watches(self, user_id: int, watch_id: Optional[int] = None) -> int:
+        return await self.execute_transaction([queries.delete_watches_query(user_id, watch_id)])
+
+    async def select_watch_snapshot(self, watch_id: int) -> Dict[str, float]:
+        return dict(await self.fetchall(queries.SELECT_WATCH_SNAPSHOT, (watch_id,)))
+
+    async def save_watch_snapshot(self, watch_id: int, prices: Dict[str, float]) -> None:
+        await self.execute_transaction(queries.watch_snapshot_commands(watch_id, prices))
@@ -0,0 +1,220 @@
+"""
+Интерфейсы хранилища данных бота
+
+Storage – синхронный интерфейс, который используют обработчики (они
+выполняются в потоках TeleBot). AsyncStorage – тот же набор операций
+для кода, работающего в цикле событий asyncio: его реализации не должны
+блокировать цикл событий.
+"""
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+
+class Storage(ABC):
+    """Синхронное хранилище пользователей, истории поиска, подписок и кэшей"""
+
+    @abstractmethod
+    def migrate(self) -> List[str]:
+        """Привести схему к актуальной версии и вернуть описания примененных миграций"""
+
+    @abstractmethod
+    def compact(self, max_rows_per_user: int, max_age_days: int) -> int:
+        """Применить политику хранения истории и вернуть количество удаленных записей"""
+
+    @abstractmethod
+    def add_user(self, user_id: int, username: str) -> None:
+        """Добавить или обновить пользователя"""
+
+    @abstractmethod
+    def select_from_users(self, **parameters) -> List[dict]:
+        """Получить пользователей по заданным параметрам"""
+
+    @abstractmethod
+    def add_to_history(self,
+                       user_id: int,
+                       command: str,
+                       city: str,
+                       destination_id: Optional[str] = None,
+                       params: Optional[Dict[str, Any]] = None,
+                       results: Optional[List[Any]] = None,
+                       created_at: Optional[int] = None) -> None:
+        """Добавить элемент в историю поисковых запросов"""
+
+    @abstractmethod
+    def select_top_cities(self, limit: int = 10) -> List[dict]:
+        """Получить самые популярные города среди всех пользователей"""
+
+    @abstractmethod
+    def select_trending_cities(self, limit: int = 10) -> List[dict]:
+        """Получить самые популярные города за последние TRENDING_DAYS дней"""
+
+    @abstractmethod
+    def select_user_top_cities(self, user_id: int, limit: int = 5) -> List[dict]:
+        """Получить города, которые пользователь искал чаще всего"""
+
+    @abstractmethod
+    def select_user_recent_cities(self, user_id: int, limit: int = 4) -> List[str]:
+        """Получить города последних поисков пользователя без повторов"""
+
+    @abstractmethod
+    def select_user_top_commands(self, user_id: int, limit: int = 3) -> List[dict]:
+        """Получить команды, которые пользователь использовал чаще всего"""
+
+    @abstractmethod
+    def select_from_history(self, **parameters) -> List[dict]:
+        """Получить элементы истории по заданным параметрам"""
+
+    @abstractmethod
+    def select_recent_history(self, user_id: int, limit: int = 20) -> List[dict]:
+        """Получить последние limit элементов истории пользователя в порядке создания"""
+
+    @abstractmethod
+    def select_history_entry(self, user_id: int, entry_id: Optional[int] = None) -> Optional[dict]:
+        """Получить элемент истории вместе с параметрами и снимком результатов"""
+
+    @abstractmethod
+    def select_photo_file_ids(self, urls: List[str]) -> Dict[str, str]:
+        """Получить сохраненные file_id для ссылок на фото"""
+
+    @abstractmethod
+    def save_photo_file_ids(self, file_ids: Dict[str, str]) -> None:
+        """Сохранить file_id отправленных фотографий"""
+
+    @abstractmethod
+    def add_watch(self,
+                  user_id: int,
+                  command: str,
+                  city: str,
+                  destination_id: str,
+                  params: Dict[str, Any],
+                  threshold: int) -> int:
+        """Подписаться на снижение цены ниже threshold и вернуть id подписки"""
+
+    @abstractmethod
+    def select_watches(self, user_id: Optional[int] = None) -> List[dict]:
+        """Получить подписки пользователя (None – всех пользователей)"""
+
+    @abstractmethod
+    def delete_watches(self, user_id: int, watch_id: Optional[int] = None) -> int:
+        """Удалить подписку пользователя (None – все) и вернуть количество удаленных"""
+
+    @abstractmethod
+    def select_watch_snapshot(self, watch_id: int) -> Dict[str, float]:
+        """Получить цены отелей ниже порога при последней проверке подписки"""
+
+    @abstractmethod
+    def save_watch_snapshot(self, watch_id: int, prices: Dict[str, float]) -> None:
+        """Заменить снимок цен подписки"""
+
+    def close(self) -> None:
+        """Освободить ресурсы хранилища"""
+
+
+class AsyncStorage(ABC):
+    """Асинхронное хранилище с теми же операциями, что и Storage"""
+
+    async def __aenter__(self) -> 'AsyncStorage':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        """Подготовить хранилище к работе"""
+
+    async def close(self) -> None:
+        """Освободить ресурсы хранилища"""
+
+    @abstractmethod
+    async def migrate(self) -> List[str]:
+        """См. Storage.migrate"""
+
+    @abstractmethod
+    async def compact(self, max_rows_per_user: int, max_age_days: int) -> int:
+        """См. Storage.compact"""
+
+    @abstractmethod
+    async def add_user(self, user_id: int, username: str) -> None:
+        """См. Storage.add_user"""
+
+    @abstractmethod
+    async def select_from_users(self, **parameters) -> List[dict]:
+        """См. Storage.select_from_users"""
+
+    @abstractmethod
+    async def add_to_history(self,
+                             user_id: int,
+                             command: str,
+                             city: str,
+                             destination_id: Optional[str] = None,
+                             params: Optional[Dict[str, Any]] = None,
+                             results: Optional[List[Any]] = None,
+                             created_at: Optional[int] = None) -> None:
+        """См. Storage.add_to_history"""
+
+    @abstractmethod
+    async def select_top_cities(self, limit: int = 10) -> List[dict]:
+        """См. Storage.select_top_cities"""
+
+    @abstractmethod
+    async def select_trending_cities(self, limit: int = 10) -> List[dict]:
+        """См. Storage.select_trending_cities"""
+
+    @abstractmethod
+    async def select_user_top_cities(self, user_id: int, limit: int = 5) -> List[dict]:
+        """См. Storage.select_user_top_cities"""
+
+    @abstractmethod
+    async def select_user_recent_cities(self, user_id: int, limit: int = 4) -> List[str]:
+        """См. Storage.select_user_recent_cities"""
+
+    @abstractmethod
+    async def select_user_top_commands(self, user_id: int, limit: int = 3) -> List[dict]:
+        """См. Storage.select_user_top_commands"""
+
+    @abstractmethod
+    async def select_from_history(self, **parameters) -> List[dict]:
+        """См. Storage.select_from_history"""
+
+    @abstractmethod
+    async def select_recent_history(self, user_id: int, limit: int = 20) -> List[dict]:
+        """См. Storage.select_recent_history"""
+
+    @abstractmethod
+    async def select_history_entry(self, user_id: int, entry_id: Optional[int] = None) -> Optional[dict]:
+        """См. Storage.select_history_entry"""
+
+    @abstractmethod
+    async def select_photo_file_ids(self, urls: List[str]) -> Dict[str, str]:
+        """См. Storage.select_photo_file_ids"""
+
+    @abstractmethod
+    async def save_photo_file_ids(self, file_ids: Dict[str, str]) -> None:
+        """См. Storage.save_photo_file_ids"""
+
+    @abstractmethod
+    async def add_watch(self,
+                        user_id: int,
+                        command: str,
+                        city: str,
+                        destination_id: str,
+                        params: Dict[str, Any],
+                        threshold: int) -> int:
+        """См. Storage.add_watch"""
+
+    @abstractmethod
+    async def select_watches(self, user_id: Optional[int] = None) -> List[dict]:
+        """См. Storage.select_watches"""
+
+    @abstractmethod
+    async def delete_watches(self, user_id: int, watch_id: Optional[int] = None) -> int:
+        """См. Storage.delete_watches"""
+
+    @abstractmethod
+    async def select_watch_snapshot(self, watch_id: int) -> Dict[str, float]:
+        """См. Storage.select_watch_snapshot"""
+
+    @abstractmethod
+    async def save_watch_snapshot(self, watch_id: int, prices: Dict[str, float]) -> None:
+        """См. Storage.save_watch_snapshot"""
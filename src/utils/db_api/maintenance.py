@@ -0,0 +1,55 @@
+"""
+Фоновое обслуживание базы данных
+
+CompactionJob периодически применяет к истории политику хранения
+(Database.compact): удаляет старые и лишние записи, обновляет статистику
+планировщика запросов и возвращает освободившиеся страницы файлу базы.
+"""
+import threading
+
+from loguru import logger
+
+from .sqlite import Database
+
+
+class CompactionJob(threading.Thread):
+    """
+    Поток периодического обслуживания базы данных
+
+    Args:
+        database: обслуживаемая база данных
+        interval: интервал между запусками в секундах
+        max_rows_per_user: сколько последних записей истории хранить для пользователя
+        max_age_days: максимальный возраст записи истории в днях
+    """
+
+    def __init__(self,
+                 database: Database,
+                 interval: float,
+                 max_rows_per_user: int,
+                 max_age_days: int):
+        """Конструктор класса"""
+        super().__init__(name='db-compaction', daemon=True)
+        self.database = database
+        self.interval = interval
+        self.max_rows_per_user = max_rows_per_user
+        self.max_age_days = max_age_days
+        self.__stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.__stopped.wait(self.interval):
+            self.run_once()
+
+    def run_once(self) -> None:
+        """Выполнить одно обслуживание базы данных"""
+        try:
+            deleted = self.database.compact(max_rows_per_user=self.max_rows_per_user,
+                                            max_age_days=self.max_age_days)
+        except Exception as e:
+            logger.error('Ошибка обслуживания базы данных: {}', e)
+        else:
+            logger.info('Обслуживание базы данных: удалено записей истории: {}', deleted)
+
+    def stop(self) -> None:
+        """Остановить поток после текущего запуска"""
+        self.__stopped.set()
@@ -0,0 +1,212 @@
+"""
+Версионированные миграции схемы базы данных
+
+Текущая версия схемы хранится в PRAGMA user_version. Каждая миграция
+выполняется в отдельной транзакции вместе с обновлением версии, поэтому
+прерванный запуск не оставляет схему в промежуточном состоянии.
+Новые миграции добавляются только в конец списка MIGRATIONS.
+"""
+import sqlite3
+from typing import Callable, List, NamedTuple
+
+from .queries import TRENDING_DAYS, first_day
+
+
+class Migration(NamedTuple):
+    """
+    Миграция схемы
+
+    Attributes:
+        version: версия схемы после применения миграции
+        description: краткое описание
+        apply: функция, выполняющая миграцию на переданном соединении
+        transactional: выполнять ли миграцию в транзакции (VACUUM
+            и некоторые PRAGMA не работают внутри транзакции)
+    """
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection], None]
+    transactional: bool = True
+
+
+def create_base_tables(connection: sqlite3.Connection) -> None:
+    connection.execute('CREATE TABLE IF NOT EXISTS users ('
+                       'id int NOT NULL PRIMARY KEY,'
+                       'username varchar(255) NOT NULL'
+                       ')')
+    connection.execute('CREATE TABLE IF NOT EXISTS history ('
+                       'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,'
+                       'user_id int NOT NULL,'
+                       'command varchar(255) NOT NULL,'
+                       'city varchar(255) NOT NULL'
+                       ')')
+
+
+def add_history_search_columns(connection: sqlite3.Connection) -> None:
+    # Столбцы могли быть добавлены до появления миграций
+    columns = {elem[1] for elem in connection.execute('PRAGMA table_info(history)')}
+    new_columns = (('destination_id', 'varchar(255)'),
+                   ('params', 'text'),
+                   ('created_at', 'int'),
+                   ('results', 'text'))
+    for name, column_type in new_columns:
+        if name not in columns:
+            connection.execute(f'ALTER TABLE history ADD COLUMN {name} {column_type}')
+
+
+def create_photo_file_ids_table(connection: sqlite3.Connection) -> None:
+    connection.execute('CREATE TABLE IF NOT EXISTS photo_file_ids ('
+                       'url varchar(512) NOT NULL PRIMARY KEY,'
+                       'file_id varchar(255) NOT NULL,'
+                       'last_used int NOT NULL'
+                       ')')
+    connection.execute('CREATE INDEX IF NOT EXISTS photo_file_ids_last_used '
+                       'ON photo_file_ids (last_used)')
+
+
+def create_history_stats_tables(connection: sqlite3.Connection) -> None:
+    connection.execute('CREATE TABLE IF NOT EXISTS history_daily ('
+                       'day char(10) NOT NULL,'
+                       'user_id int NOT NULL,'
+                       'command varchar(255) NOT NULL,'
+                       'city varchar(255) NOT NULL,'
+                       'count int NOT NULL,'
+                       'PRIMARY KEY (day, user_id, command, city)'
+                       ')')
+    connection.execute('CREATE TABLE IF NOT EXISTS stats_user_city ('
+                       'user_id int NOT NULL,'
+                       'city varchar(255) NOT NULL,'
+                       'count int NOT NULL,'
+                       'PRIMARY KEY (user_id, city)'
+                       ')')
+    connection.execute('CREATE INDEX IF NOT EXISTS stats_user_city_count '
+                       'ON stats_user_city (user_id, count DESC)')
+    connection.execute('CREATE TABLE IF NOT EXISTS stats_user_command ('
+                       'user_id int NOT NULL,'
+                       'command varchar(255) NOT NULL,'
+                       'count int NOT NULL,'
+                       'PRIMARY KEY (user_id, command)'
+                       ')')
+    connection.execute('CREATE INDEX IF NOT EXISTS stats_user_command_count '
+                       'ON stats_user_command (user_id, count DESC)')
+    connection.execute('CREATE TABLE IF NOT EXISTS stats_city ('
+                       'city varchar(255) NOT NULL PRIMARY KEY,'
+                       'count int NOT NULL'
+                       ')')
+    connection.execute('CREATE INDEX IF NOT EXISTS stats_city_count ON stats_city (count DESC)')
+
+    # Счетчики для уже накопленной истории рассчитываются один раз
+    if connection.execute('SELECT 1 FROM stats_city LIMIT 1').fetchone() is None:
+        connection.execute('INSERT INTO stats_user_city (user_id, city, count) '
+                           'SELECT user_id, city, COUNT(*) FROM history GROUP BY user_id, city')
+        connection.execute('INSERT INTO stats_user_command (user_id, command, count) '
+                           'SELECT user_id, command, COUNT(*) FROM history GROUP BY user_id, command')
+        connection.execute('INSERT INTO stats_city (city, count) '
+                           'SELECT city, COUNT(*) FROM history GROUP BY city')
+
+
+def create_history_indexes(connection: sqlite3.Connection) -> None:
+    connection.execute('CREATE INDEX IF NOT EXISTS history_user_id ON history (user_id, id)')
+    connection.execute('CREATE INDEX IF NOT EXISTS history_created_at ON history (created_at)')
+    connection.execute('CREATE INDEX IF NOT EXISTS history_daily_day ON history_daily (day)')
+
+
+def enable_incremental_vacuum(connection: sqlite3.Connection) -> None:
+    # Режим auto_vacuum вступает в силу только после полного VACUUM
+    if connection.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+        connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        connection.execute('VACUUM')
+
+
+def create_watch_tables(connection: sqlite3.Connection) -> None:
+    connection.execute('CREATE TABLE IF NOT EXISTS watches ('
+                       'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,'
+                       'user_id int NOT NULL,'
+                       'command varchar(255) NOT NULL,'
+                       'city varchar(255) NOT NULL,'
+                       'destination_id varchar(255) NOT NULL,'
+                       'params text NOT NULL,'
+                       'threshold int NOT NULL,'
+                       'created_at int NOT NULL'
+                       ')')
+    connection.execute('CREATE INDEX IF NOT EXISTS watches_user_id ON watches (user_id)')
+    # Цены отелей ниже порога при последней проверке подписки
+    connection.execute('CREATE TABLE IF NOT EXISTS watch_snapshots ('
+                       'watch_id int NOT NULL,'
+                       'hotel_id varchar(255) NOT NULL,'
+                       'price real NOT NULL,'
+                       'PRIMARY KEY (watch_id, hotel_id)'
+                       ') WITHOUT ROWID')
+    connection.execute('CREATE TRIGGER IF NOT EXISTS watches_delete_snapshots AFTER DELETE ON watches '
+                       'BEGIN DELETE FROM watch_snapshots WHERE watch_id = OLD.id; END')
+
+
+def create_trending_tables(connection: sqlite3.Connection) -> None:
+    # Поиски по городам за день и их сумма за последние TRENDING_DAYS дней
+    connection.execute('CREATE TABLE IF NOT EXISTS stats_city_daily ('
+                       'day char(10) NOT NULL,'
+                       'city varchar(255) NOT NULL,'
+                       'count int NOT NULL,'
+                       'PRIMARY KEY (day, city)'
+                       ') WITHOUT ROWID')
+    connection.execute('CREATE TABLE IF NOT EXISTS stats_city_trending ('
+                       'city varchar(255) NOT NULL PRIMARY KEY,'
+                       'count int NOT NULL'
+                       ')')
+    connection.execute('CREATE INDEX IF NOT EXISTS stats_city_trending_count '
+                       'ON stats_city_trending (count DESC)')
+
+    connection.execute('INSERT INTO stats_city_daily (day, city, count) '
+                       'SELECT day, city, SUM(count) FROM history_daily WHERE day >= ? GROUP BY day, city',
+                       (first_day(TRENDING_DAYS),))
+    connection.execute('INSERT INTO stats_city_trending (city, count) '
+                       'SELECT city, SUM(count) FROM stats_city_daily GROUP BY city')
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, 'users and history tables', create_base_tables),
+    Migration(2, 'history search parameters and snapshots', add_history_search_columns),
+    Migration(3, 'photo file_id cache', create_photo_file_ids_table),
+    Migration(4, 'history rollup tables', create_history_stats_tables),
+    Migration(5, 'history indexes for retention', create_history_indexes),
+    Migration(6, 'incremental vacuum', enable_incremental_vacuum, transactional=False),
+    Migration(7, 'price watches and snapshots', create_watch_tables),
+    Migration(8, 'trending city rollups', create_trending_tables),
+]
+
+
+def migrate(connection: sqlite3.Connection) -> List[Migration]:
+    """
+    Применить к базе данных все недостающие миграции
+
+    Args:
+        connection: соединение с базой данных в режиме autocommit
+            (isolation_level=None), транзакциями управляет сама функция
+
+    Returns:
+        Список примененных миграций
+    """
+    current_version = connection.execute('PRAGMA user_version').fetchone()[0]
+    applied = []
+    for migration in MIGRATIONS:
+        if migration.version <= current_version:
+            continue
+
+        if migration.transactional:
+            connection.execute('BEGIN IMMEDIATE')
+            # Миграцию мог уже применить другой процесс, пока ожидалась блокировка
+            if connection.execute('PRAGMA user_version').fetchone()[0] >= migration.version:
+                connection.execute('ROLLBACK')
+                continue
+            try:
+                migration.apply(connection)
+                connection.execute(f'PRAGMA user_version = {migration.version}')
+            except BaseException:
+                connection.execute('ROLLBACK')
+                raise
+            connection.execute('COMMIT')
+        else:
+            migration.apply(connection)
+            connection.execute(f'PRAGMA user_version = {migration.version}')
+        applied.append(migration)
+    return applied
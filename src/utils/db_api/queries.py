@@ -0,0 +1,286 @@
+"""
+SQL-команды и преобразование результатов, общие для всех реализаций хранилища
+
+Реализации (sqlite.Database, aiosqlite_backend.AsyncDatabase) отличаются
+только способом выполнения команд, поэтому сами команды, проверка
+аргументов и разбор строк результатов находятся здесь.
+"""
+import json
+from datetime import date, timedelta
+from time import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Максимальное количество записей в кэше file_id фотографий
+PHOTO_FILE_IDS_LIMIT = 50000
+# Политика хранения истории по умолчанию
+HISTORY_MAX_ROWS_PER_USER = 100
+HISTORY_MAX_AGE_DAYS = 180
+# Период (в днях), за который считаются набирающие популярность города
+TRENDING_DAYS = 7
+VALID_COMMANDS = ('lowprice', 'highprice', 'bestdeal', 'compare')
+# Команды, на поиски которых можно подписаться (/watch)
+WATCH_COMMANDS = ('lowprice', 'bestdeal')
+# Команды, в которых city – несколько городов через CITIES_SEPARATOR
+MULTI_CITY_COMMANDS = ('compare',)
+CITIES_SEPARATOR = ', '
+
+Command = Tuple[str, tuple]
+
+ADD_USER = 'INSERT or REPLACE INTO users (id, username) VALUES (?, ?)'
+USERS_COLUMNS = 'id, username'
+HISTORY_COLUMNS = 'id, user_id, command, city, destination_id, created_at'
+
+INSERT_HISTORY = 'INSERT INTO history (user_id, command, city, destination_id, params, created_at, results) ' \
+                 'VALUES (?, ?, ?, ?, ?, ?, ?)'
+UPSERT_HISTORY_DAILY = 'INSERT INTO history_daily (day, user_id, command, city, count) VALUES (?, ?, ?, ?, 1) ' \
+                       'ON CONFLICT (day, user_id, command, city) DO UPDATE SET count = count + 1'
+UPSERT_STATS_USER_CITY = 'INSERT INTO stats_user_city (user_id, city, count) VALUES (?, ?, 1) ' \
+                         'ON CONFLICT (user_id, city) DO UPDATE SET count = count + 1'
+UPSERT_STATS_USER_COMMAND = 'INSERT INTO stats_user_command (user_id, command, count) VALUES (?, ?, 1) ' \
+                            'ON CONFLICT (user_id, command) DO UPDATE SET count = count + 1'
+UPSERT_STATS_CITY = 'INSERT INTO stats_city (city, count) VALUES (?, 1) ' \
+                    'ON CONFLICT (city) DO UPDATE SET count = count + 1'
+UPSERT_STATS_CITY_DAILY = 'INSERT INTO stats_city_daily (day, city, count) VALUES (?, ?, 1) ' \
+                          'ON CONFLICT (day, city) DO UPDATE SET count = count + 1'
+UPSERT_STATS_CITY_TRENDING = 'INSERT INTO stats_city_trending (city, count) VALUES (?, 1) ' \
+                             'ON CONFLICT (city) DO UPDATE SET count = count + 1'
+
+SELECT_TOP_CITIES = 'SELECT city, count FROM stats_city ORDER BY count DESC LIMIT ?'
+SELECT_TRENDING_CITIES = 'SELECT city, count FROM stats_city_trending ORDER BY count DESC LIMIT ?'
+SELECT_USER_TOP_CITIES = 'SELECT city, count FROM stats_user_city WHERE user_id = ? ' \
+                         'ORDER BY count DESC LIMIT ?'
+SELECT_USER_RECENT_CITIES = f'SELECT city FROM history ' \
+                            f'WHERE user_id = ? AND command NOT IN ({", ".join(map(repr, MULTI_CITY_COMMANDS))}) ' \
+                            f'GROUP BY city ORDER BY MAX(id) DESC LIMIT ?'
+SELECT_USER_TOP_COMMANDS = 'SELECT command, count FROM stats_user_command WHERE user_id = ? ' \
+                           'ORDER BY count DESC LIMIT ?'
+SELECT_RECENT_HISTORY = f'SELECT {HISTORY_COLUMNS} FROM (' \
+                        f'SELECT {HISTORY_COLUMNS} FROM history WHERE user_id = ? ORDER BY id DESC LIMIT ?' \
+                        f') ORDER BY id'
+SELECT_HISTORY_ENTRY = 'SELECT id, user_id, command, city, destination_id, params, created_at, results ' \
+                       'FROM history WHERE user_id = ?'
+
+WATCHES_COLUMNS = 'id, user_id, command, city, destination_id, params, threshold, created_at'
+INSERT_WATCH = 'INSERT INTO watches (user_id, command, city, destination_id, params, threshold, created_at) ' \
+               'VALUES (?, ?, ?, ?, ?, ?, ?)'
+SELECT_WATCHES = f'SELECT {WATCHES_COLUMNS} FROM watches ORDER BY id'
+SELECT_USER_WATCHES = f'SELECT {WATCHES_COLUMNS} FROM watches WHERE user_id = ? ORDER BY id'
+SELECT_WATCH_SNAPSHOT = 'SELECT hotel_id, price FROM watch_snapshots WHERE watch_id = ?'
+DELETE_WATCH_SNAPSHOT = 'DELETE FROM watch_snapshots WHERE watch_id = ?'
+INSERT_WATCH_SNAPSHOT = 'INSERT INTO watch_snapshots (watch_id, hotel_id, price) VALUES (?, ?, ?)'
+
+DELETE_OLD_HISTORY = 'DELETE FROM history WHERE created_at < ?'
+DELETE_EXCESS_HISTORY = 'DELETE FROM history WHERE id IN (' \
+                        'SELECT id FROM (' \
+                        'SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY id DESC) AS position ' \
+                        'FROM history' \
+                        ') WHERE position > ?' \
+                        ')'
+DELETE_OLD_HISTORY_DAILY = 'DELETE FROM history_daily WHERE day < ?'
+EXPIRE_STATS_CITY_TRENDING = 'UPDATE stats_city_trending SET count = count - (' \
+                             'SELECT SUM(count) FROM stats_city_daily ' \
+                             'WHERE stats_city_daily.city = stats_city_trending.city AND day < ?' \
+                             ') WHERE city IN (SELECT city FROM stats_city_daily WHERE day < ?)'
+DELETE_EXPIRED_STATS_CITY_TRENDING = 'DELETE FROM stats_city_trending WHERE count <= 0'
+DELETE_OLD_STATS_CITY_DAILY = 'DELETE FROM stats_city_daily WHERE day < ?'
+
+SAVE_PHOTO_FILE_ID = 'INSERT OR REPLACE INTO photo_file_ids (url, file_id, last_used) VALUES (?, ?, ?)'
+TOUCH_PHOTO_FILE_ID = 'UPDATE photo_file_ids SET last_used = ? WHERE url = ?'
+EVICT_PHOTO_FILE_IDS = 'DELETE FROM photo_file_ids WHERE last_used < (' \
+                       'SELECT last_used FROM photo_file_ids ' \
+                       'ORDER BY last_used DESC LIMIT 1 OFFSET ?' \
+                       ')'
+
+
+def select_from(table_name: str, parameters: Optional[dict] = None, columns: str = '*') -> str:
+    """
+    Построить команду выборки из таблицы по заданным параметрам
+
+    Args:
+        table_name: имя целевой таблицы в БД
+        parameters: параметры выборки в виде словаря
+        columns: список столбцов выборки через запятую
+    """
+    if not parameters:
+        return f'SELECT {columns} FROM {table_name}'
+    return f'SELECT {columns} FROM {table_name} WHERE {reformat_parameters(parameters)}'
+
+
+def history_commands(user_id: int,
+                     command: str,
+                     city: str,
+                     destination_id: Optional[str] = None,
+                     params: Optional[Dict[str, Any]] = None,
+                     results: Optional[List[Any]] = None,
+                     created_at: Optional[int] = None) -> List[Command]:
+    """
+    Получить команды добавления элемента в историю и обновления счетчиков
+
+    Все команды должны выполняться в одной транзакции. Поиски по
+    нескольким городам учитываются в статистике каждого из городов.
+
+    Raises:
+        ValueError: если команда поиска неизвестна
+        TypeError: если аргументы имеют неверный тип
+    """
+    if command not in VALID_COMMANDS:
+        raise ValueError('invalid value')
+    if not (isinstance(user_id, int) and isinstance(command, str) and isinstance(city, str)):
+        raise TypeError('one or more parameters has invalid type')
+
+    day = date.today().isoformat()
+    cities = city.split(CITIES_SEPARATOR) if command in MULTI_CITY_COMMANDS else [city]
+    commands = [
+        (INSERT_HISTORY, (user_id, command, city, destination_id, to_json(params),
+                          created_at or int(time()), to_json(results))),
+        (UPSERT_STATS_USER_COMMAND, (user_id, command)),
+    ]
+    for elem in cities:
+        commands.extend(((UPSERT_HISTORY_DAILY, (day, user_id, command, elem)),
+                         (UPSERT_STATS_USER_CITY, (user_id, elem)),
+                         (UPSERT_STATS_CITY, (elem,)),
+                         (UPSERT_STATS_CITY_DAILY, (day, elem)),
+                         (UPSERT_STATS_CITY_TRENDING, (elem,))))
+    return commands
+
+
+def watch_parameters(user_id: int,
+                     command: str,
+                     city: str,
+                     destination_id: str,
+                     params: Dict[str, Any],
+                     threshold: int) -> tuple:
+    """
+    Получить параметры команды INSERT_WATCH
+
+    Raises:
+        ValueError: если на поиск этой командой нельзя подписаться или порог не положителен
+        TypeError: если аргументы имеют неверный тип
+    """
+    if command not in WATCH_COMMANDS:
+        raise ValueError('invalid value')
+    if not (isinstance(user_id, int) and isinstance(threshold, int) and isinstance(params, dict)):
+        raise TypeError('one or more parameters has invalid type')
+    if threshold <= 0:
+        raise ValueError('threshold must be positive')
+    return user_id, command, city, destination_id, to_json(params), threshold, int(time())
+
+
+def delete_watches_query(user_id: int, watch_id: Optional[int] = None) -> Command:
+    """
+    Получить команду удаления подписок пользователя (всех или одной)
+
+    Снимки цен удаляются триггером (см. migrations.create_watch_tables).
+    """
+    if watch_id is None:
+        return 'DELETE FROM watches WHERE user_id = ?', (user_id,)
+    return 'DELETE FROM watches WHERE user_id = ? AND id = ?', (user_id, watch_id)
+
+
+def watch_snapshot_commands(watch_id: int, prices: Dict[str, float]) -> List[Command]:
+    """Получить команды замены снимка цен подписки"""
+    return [(DELETE_WATCH_SNAPSHOT, (watch_id,)),
+            *((INSERT_WATCH_SNAPSHOT, (watch_id, hotel_id, price)) for hotel_id, price in prices.items())]
+
+
+def history_entry_query(user_id: int, entry_id: Optional[int] = None) -> Command:
+    """Получить команду выборки элемента истории (None – последний поиск)"""
+    if entry_id is None:
+        return SELECT_HISTORY_ENTRY + ' ORDER BY id DESC LIMIT 1', (user_id,)
+    return SELECT_HISTORY_ENTRY + ' AND id = ?', (user_id, entry_id)
+
+
+def compact_bounds(max_age_days: int) -> Tuple[int, str]:
+    """Получить минимальные допустимые created_at и день для истории"""
+    min_created_at = int(time()) - max_age_days * 24 * 60 * 60
+    return min_created_at, date.fromtimestamp(min_created_at).isoformat()
+
+
+def first_day(days: int) -> str:
+    """Получить первый день периода из days последних дней, включая сегодняшний"""
+    return (date.today() - timedelta(days=max(days, 1) - 1)).isoformat()
+
+
+def expire_trending_commands() -> List[Command]:
+    """
+    Получить команды исключения дней до начала периода TRENDING_DAYS из
+    счетчиков stats_city_trending
+
+    Дневные счетчики вычитаются и удаляются в одной транзакции, поэтому
+    каждый день вычитается ровно один раз.
+    """
+    day = first_day(TRENDING_DAYS)
+    return [(EXPIRE_STATS_CITY_TRENDING, (day, day)),
+            (DELETE_EXPIRED_STATS_CITY_TRENDING, ()),
+            (DELETE_OLD_STATS_CITY_DAILY, (day,))]
+
+
+def photo_file_ids_query(urls: Sequence[str]) -> str:
+    return f'SELECT url, file_id FROM photo_file_ids WHERE url IN ({", ".join("?" * len(urls))})'
+
+
+def touch_photo_file_ids_rows(urls: Iterable[str], last_used: int) -> Iterable[tuple]:
+    return ((last_used, url) for url in urls)
+
+
+def photo_file_ids_rows(file_ids: Dict[str, str]) -> Iterable[tuple]:
+    now = int(time())
+    return ((url, file_id, now) for url, file_id in file_ids.items())
+
+
+def to_json(value: Any) -> Optional[str]:
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')) if value is not None else None
+
+
+def user_row(elem: Sequence[Any]) -> dict:
+    return {'id': elem[0], 'username': elem[1]}
+
+
+def history_row(elem: Sequence[Any]) -> dict:
+    return {'id': elem[0], 'user_id': elem[1], 'command': elem[2], 'city': elem[3],
+            'destination_id': elem[4], 'created_at': elem[5]}
+
+
+def history_entry_row(elem: Optional[Sequence[Any]]) -> Optional[dict]:
+    if elem is None:
+        return None
+    return {'id': elem[0], 'user_id': elem[1], 'command': elem[2], 'city': elem[3],
+            'destination_id': elem[4],
+            'params': json.loads(elem[5]) if elem[5] else None,
+            'created_at': elem[6],
+            'results': json.loads(elem[7]) if elem[7] else None}
+
+
+def watch_row(elem: Sequence[Any]) -> dict:
+    return {'id': elem[0], 'user_id': elem[1], 'command': elem[2], 'city': elem[3],
+            'destination_id': elem[4], 'params': json.loads(elem[5]), 'threshold': elem[6],
+            'created_at': elem[7]}
+
+
+def city_count_row(elem: Sequence[Any]) -> dict:
+    return {'city': elem[0], 'count': elem[1]}
+
+
+def command_count_row(elem: Sequence[Any]) -> dict:
+    return {'command': elem[0], 'count': elem[1]}
+
+
+def reformat_parameters(parameters: dict) -> str:
+    """
+    Переформатировать параметры из словаря в строку
+
+    Пример преобразования:
+    {'id': 1, 'city': 'Москва'} --> 'id="1" AND city="Москва"'
+
+    Args:
+        parameters: параметры для преобразования в виде словаря
+
+    Returns:
+        Строка для подстановки в SQL-команду
+    """
+    if not isinstance(parameters, dict):
+        raise TypeError('parameter has an invalid type, dict expected')
+
+    str_params = (f'{param}="{value}"' for param, value in parameters.items())
+    result = ' AND '.join(str_params)
+    return result
@@ -1,10 +1,20 @@
 import sqlite3
-from typing import Optional, List, Any
+from threading import Lock
+from time import time
+from typing import Optional, List, Any, Dict, Iterable, Set, Tuple
 
+from . import migrations, queries
+from .base import Storage
+from .queries import HISTORY_MAX_AGE_DAYS, HISTORY_MAX_ROWS_PER_USER, PHOTO_FILE_IDS_LIMIT
 
-class Database:
+
+class Database(Storage):
     """
-    Интерфейс взаимодействия с базой данных
+    Хранилище в базе данных SQLite
+
+    Использование сохраненных file_id фотографий запоминается в памяти и
+    записывается в базу при обслуживании (compact), поэтому выборка
+    file_id во время ответа пользователю ничего не изменяет в базе.
 
     Args:
         database_path (str): относительный путь к файлу базы данных
@@ -13,6 +23,8 @@ class Database:
     def __init__(self, database_path: str = 'main.db'):
         """Конструктор класса"""
         self.database_path: str = database_path
+        self.__used_photo_urls: Set[str] = set()
+        self.__used_photo_urls_lock = Lock()
 
     @property
     def __connection(self) -> sqlite3.Connection:
@@ -60,37 +72,111 @@ class Database:
 
         return data
 
-    def __select_from(self, table_name: str, parameters: Optional[dict] = None) -> List[Any]:
+    def execute_many(self, sql_command: str, seq_of_parameters: Iterable[tuple]) -> None:
+        """
+        Выполнить SQL-команду для каждого набора параметров в одной транзакции
+
+        Args:
+            sql_command: строка SQL-команды
+            seq_of_parameters: последовательность параметров для подстановки в команду
+        """
+        connection = self.__connection
+        with connection:
+            connection.executemany(sql_command, seq_of_parameters)
+        connection.close()
+
+    def execute_transaction(self, commands: Iterable[Tuple[str, tuple]]) -> None:
+        """
+        Выполнить несколько SQL-команд в одной транзакции
+
+        Args:
+            commands: последовательность пар (строка SQL-команды, параметры)
+        """
+        connection = self.__connection
+        with connection:
+            for sql_command, parameters in commands:
+                connection.execute(sql_command, parameters)
+        connection.close()
+
+    def migrate(self) -> List[str]:
+        """
+        Привести схему базы данных к актуальной версии
+
+        Returns:
+            Описания примененных миграций
+        """
+        connection = sqlite3.connect(self.database_path, isolation_level=None)
+        try:
+            applied = migrations.migrate(connection)
+        finally:
+            connection.close()
+        return [f'{migration.version}: {migration.description}' for migration in applied]
+
+    def compact(self,
+                max_rows_per_user: int = HISTORY_MAX_ROWS_PER_USER,
+                max_age_days: int = HISTORY_MAX_AGE_DAYS,
+                vacuum_pages: int = 1000) -> int:
+        """
+        Применить политику хранения истории и обслужить файл базы данных
+
+        Удаляет записи history старше max_age_days дней и сверх
+        max_rows_per_user последних записей каждого пользователя, а также
+        устаревшие строки history_daily. Из счетчиков популярных городов за
+        TRENDING_DAYS дней вычитаются дни, вышедшие из периода; остальные
+        итоговые счетчики статистики не затрагиваются. Затем записывает время использования file_id
+        фотографий, выбранных с прошлого обслуживания, и удаляет самые давно
+        использованные file_id сверх PHOTO_FILE_IDS_LIMIT. После удаления
+        обновляет статистику планировщика (PRAGMA optimize) и освобождает
+        до vacuum_pages свободных страниц.
+
+        Args:
+            max_rows_per_user: сколько последних записей истории хранить для пользователя
+            max_age_days: максимальный возраст записи истории в днях
+            vacuum_pages: сколько свободных страниц вернуть файловой системе
+
+        Returns:
+            Количество удаленных записей истории
+        """
+        min_created_at, min_day = queries.compact_bounds(max_age_days)
+        with self.__used_photo_urls_lock:
+            used_photo_urls, self.__used_photo_urls = self.__used_photo_urls, set()
+
+        connection = self.__connection
+        with connection:
+            deleted = connection.execute(queries.DELETE_OLD_HISTORY, (min_created_at,)).rowcount
+            deleted += connection.execute(queries.DELETE_EXCESS_HISTORY, (max_rows_per_user,)).rowcount
+            connection.execute(queries.DELETE_OLD_HISTORY_DAILY, (min_day,))
+            for sql, parameters in queries.expire_trending_commands():
+                connection.execute(sql, parameters)
+        with connection:
+            connection.executemany(queries.TOUCH_PHOTO_FILE_ID,
+                                   queries.touch_photo_file_ids_rows(used_photo_urls, int(time())))
+            connection.execute(queries.EVICT_PHOTO_FILE_IDS, (PHOTO_FILE_IDS_LIMIT,))
+        connection.execute('PRAGMA optimize')
+        connection.execute(f'PRAGMA incremental_vacuum({int(vacuum_pages)})').fetchall()
+        connection.close()
+        return deleted
+
+    def __select_from(self,
+                      table_name: str,
+                      parameters: Optional[dict] = None,
+                      columns: str = '*') -> List[Any]:
         """
         Получить выборку из таблицы по заданным параметрам
 
         Args:
             table_name: имя целевой таблицы в БД
             parameters: параметры выборки в виде списка кортежей
+            columns: список столбцов выборки через запятую
         """
-        if not parameters:
-            sql = f'SELECT * FROM {table_name}'
-        else:
-            sql = f'SELECT * FROM {table_name} WHERE'
-            sql = ' '.join((sql, reformat_parameters(parameters)))
-
+        sql = queries.select_from(table_name, parameters, columns)
         results = self.execute(sql, fetchall=True)
         return results
 
-    def create_users_table(self) -> None:
-        """Создать таблицу пользователей"""
-        sql = 'CREATE TABLE IF NOT EXISTS users (' \
-              'id int NOT NULL PRIMARY KEY,' \
-              'username varchar(255) NOT NULL' \
-              ')'
-        self.execute(sql, is_commit=True)
-
     def add_user(self, user_id: int, username: str) -> None:
         """Добавить пользователя в таблицу users"""
-        sql = 'INSERT or REPLACE INTO users (id, username) ' \
-              'VALUES (?, ?)'
         parameters = (user_id, username)
-        self.execute(sql_command=sql, parameters=parameters, is_commit=True)
+        self.execute(sql_command=queries.ADD_USER, parameters=parameters, is_commit=True)
 
     def select_from_users(self, **parameters) -> List[dict]:
         """
@@ -102,40 +188,110 @@ class Database:
         Returns:
             Список элементов в виде словарей
         """
-        data = self.__select_from(table_name='users', parameters=parameters)
-        data = [{'id': elem[0], 'username': elem[1]}
-                for elem in data]
-        return data
-
-    def create_history_table(self) -> None:
-        """Создать таблицу истории поисковых запросов"""
-        sql = 'CREATE TABLE IF NOT EXISTS history (' \
-              'id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,' \
-              'user_id int NOT NULL,' \
-              'command varchar(255) NOT NULL,' \
-              'city varchar(255) NOT NULL' \
-              ')'
-        self.execute(sql, is_commit=True)
-
-    def add_to_history(self, user_id: int, command: str, city: str) -> None:
+        data = self.__select_from(table_name='users', parameters=parameters,
+                                  columns=queries.USERS_COLUMNS)
+        return [queries.user_row(elem) for elem in data]
+
+    def add_to_history(self,
+                       user_id: int,
+                       command: str,
+                       city: str,
+                       destination_id: Optional[str] = None,
+                       params: Optional[Dict[str, Any]] = None,
+                       results: Optional[List[Any]] = None,
+                       created_at: Optional[int] = None) -> None:
         """
         Добавить элемент в историю поисковых запросов
 
+        В той же транзакции обновляются агрегированные счетчики
+        (см. migrations.create_history_stats_tables).
+
         Args:
             user_id: id Telegram-пользователя, который выполнил запрос
             command: поисковая команда, выполненная пользователем
             city: город поискового запроса
+            destination_id: destinationId города
+            params: параметры поиска (цены, расстояния, количество отелей и фото и т.д.)
+            results: снимок результатов поиска (сериализуемый в JSON список)
+            created_at: время получения результатов (по умолчанию – текущее)
+        """
+        self.execute_transaction(queries.history_commands(user_id, command, city, destination_id,
+                                                          params, results, created_at))
+
+    def select_top_cities(self, limit: int = 10) -> List[dict]:
+        """
+        Получить самые популярные города среди всех пользователей
+
+        Args:
+            limit: количество городов в результате
+
+        Returns:
+            Список словарей с ключами city и count
+        """
+        data = self.execute(queries.SELECT_TOP_CITIES, parameters=(limit,), fetchall=True)
+        return [queries.city_count_row(elem) for elem in data]
+
+    def select_trending_cities(self, limit: int = 10) -> List[dict]:
+        """
+        Получить самые популярные города за последние TRENDING_DAYS дней
+
+        Читает готовые счетчики stats_city_trending: они увеличиваются при
+        добавлении в историю, а дни, вышедшие из периода, вычитаются при
+        обслуживании базы (compact), поэтому период отсчитывается с
+        точностью до интервала обслуживания.
+
+        Args:
+            limit: количество городов в результате
+
+        Returns:
+            Список словарей с ключами city и count
+        """
+        data = self.execute(queries.SELECT_TRENDING_CITIES, parameters=(limit,), fetchall=True)
+        return [queries.city_count_row(elem) for elem in data]
+
+    def select_user_top_cities(self, user_id: int, limit: int = 5) -> List[dict]:
+        """
+        Получить города, которые пользователь искал чаще всего
+
+        Args:
+            user_id: id Telegram-пользователя
+            limit: количество городов в результате
+
+        Returns:
+            Список словарей с ключами city и count
+        """
+        data = self.execute(queries.SELECT_USER_TOP_CITIES, parameters=(user_id, limit), fetchall=True)
+        return [queries.city_count_row(elem) for elem in data]
+
+    def select_user_recent_cities(self, user_id: int, limit: int = 4) -> List[str]:
+        """
+        Получить города последних поисков пользователя без повторов
+
+        Сравнения нескольких городов не учитываются.
+
+        Args:
+            user_id: id Telegram-пользователя
+            limit: количество городов в результате
+
+        Returns:
+            Список городов, начиная с последнего
         """
-        valid_commands = ('lowprice', 'highprice', 'bestdeal')
-        if command not in valid_commands:
-            raise ValueError('invalid value')
-        if not (isinstance(user_id, int) and isinstance(command, str) and isinstance(city, str)):
-            raise TypeError('one or more parameters has invalid type')
+        data = self.execute(queries.SELECT_USER_RECENT_CITIES, parameters=(user_id, limit), fetchall=True)
+        return [elem[0] for elem in data]
 
-        sql = 'INSERT INTO history (user_id, command, city)' \
-              'VALUES (?, ?, ?)'
-        parameters = (user_id, command, city)
-        self.execute(sql_command=sql, parameters=parameters, is_commit=True)
+    def select_user_top_commands(self, user_id: int, limit: int = 3) -> List[dict]:
+        """
+        Получить команды, которые пользователь использовал чаще всего
+
+        Args:
+            user_id: id Telegram-пользователя
+            limit: количество команд в результате
+
+        Returns:
+            Список словарей с ключами command и count
+        """
+        data = self.execute(queries.SELECT_USER_TOP_COMMANDS, parameters=(user_id, limit), fetchall=True)
+        return [queries.command_count_row(elem) for elem in data]
 
     def select_from_history(self, **parameters) -> List[dict]:
         """
@@ -147,29 +303,154 @@ class Database:
         Returns:
             Список элементов в виде словарей
         """
-        data = self.__select_from(table_name='history', parameters=parameters)
-        data = [{'id': elem[0], 'user_id': elem[1], 'command': elem[2], 'city': elem[3]}
-                for elem in data]
+        data = self.__select_from(table_name='history', parameters=parameters,
+                                  columns=queries.HISTORY_COLUMNS)
+        return [queries.history_row(elem) for elem in data]
+
+    def select_recent_history(self, user_id: int, limit: int = 20) -> List[dict]:
+        """
+        Получить последние элементы истории пользователя
+
+        В отличие от select_from_history, количество строк ограничено, поэтому
+        длинная история не загружается в память целиком.
+
+        Args:
+            user_id: id Telegram-пользователя
+            limit: максимальное количество элементов
+
+        Returns:
+            Список элементов в виде словарей в порядке создания
+        """
+        data = self.execute(queries.SELECT_RECENT_HISTORY, parameters=(user_id, limit), fetchall=True)
+        return [queries.history_row(elem) for elem in data]
+
+    def select_history_entry(self, user_id: int, entry_id: Optional[int] = None) -> Optional[dict]:
+        """
+        Получить элемент истории пользователя вместе с параметрами и снимком результатов
+
+        Args:
+            user_id: id Telegram-пользователя
+            entry_id: id элемента истории (None – последний поиск пользователя)
+
+        Returns:
+            Элемент истории в виде словаря или None, если он не найден
+        """
+        sql, parameters = queries.history_entry_query(user_id, entry_id)
+        return queries.history_entry_row(self.execute(sql, parameters=parameters, fetchone=True))
+
+    def select_photo_file_ids(self, urls: List[str]) -> Dict[str, str]:
+        """
+        Получить сохраненные file_id для ссылок на фото
+
+        Найденные записи помечаются как недавно использованные при
+        следующем обслуживании базы (см. compact).
+
+        Args:
+            urls: ссылки на фотографии
 
+        Returns:
+            Словарь "ссылка – file_id" для найденных ссылок
+        """
+        if not urls:
+            return {}
+        data = dict(self.execute(queries.photo_file_ids_query(urls), parameters=tuple(urls), fetchall=True))
+
+        with self.__used_photo_urls_lock:
+            if len(self.__used_photo_urls) < PHOTO_FILE_IDS_LIMIT:
+                self.__used_photo_urls.update(data)
         return data
 
+    def save_photo_file_ids(self, file_ids: Dict[str, str]) -> None:
+        """
+        Сохранить file_id отправленных фотографий
+
+        Записи сверх PHOTO_FILE_IDS_LIMIT удаляются при обслуживании базы
+        (см. compact).
 
-def reformat_parameters(parameters: dict) -> str:
-    """
-    Переформатировать параметры из словаря в строку
+        Args:
+            file_ids: словарь "ссылка – file_id"
+        """
+        if not file_ids:
+            return
+        self.execute_many(queries.SAVE_PHOTO_FILE_ID, queries.photo_file_ids_rows(file_ids))
+
+    def add_watch(self,
+                  user_id: int,
+                  command: str,
+                  city: str,
+                  destination_id: str,
+                  params: Dict[str, Any],
+                  threshold: int) -> int:
+        """
+        Подписать пользователя на снижение цены в сохраненном поиске
 
-    Пример преобразования:
-    {'id': 1, 'city': 'Москва'} --> 'id="1" AND city="Москва"'
+        Args:
+            user_id: id Telegram-пользователя
+            command: поисковая команда (см. queries.WATCH_COMMANDS)
+            city: город поискового запроса
+            destination_id: destinationId города
+            params: параметры поиска из истории
+            threshold: цена за ночь, ниже которой отправляется уведомление
 
-    Args:
-        parameters: параметры для преобразования в виде словаря
+        Returns:
+            id подписки
+        """
+        parameters = queries.watch_parameters(user_id, command, city, destination_id, params, threshold)
+        connection = self.__connection
+        with connection:
+            watch_id = connection.execute(queries.INSERT_WATCH, parameters).lastrowid
+        connection.close()
+        return watch_id
 
-    Returns:
-        Строка для подстановки в SQL-команду
-    """
-    if not isinstance(parameters, dict):
-        raise TypeError('parameter has an invalid type, dict expected')
+    def select_watches(self, user_id: Optional[int] = None) -> List[dict]:
+        """
+        Получить подписки
+
+        Args:
+            user_id: id Telegram-пользователя (None – подписки всех пользователей)
+
+        Returns:
+            Список подписок в виде словарей в порядке создания
+        """
+        if user_id is None:
+            data = self.execute(queries.SELECT_WATCHES, fetchall=True)
+        else:
+            data = self.execute(queries.SELECT_USER_WATCHES, parameters=(user_id,), fetchall=True)
+        return [queries.watch_row(elem) for elem in data]
+
+    def delete_watches(self, user_id: int, watch_id: Optional[int] = None) -> int:
+        """
+        Удалить подписку пользователя вместе со снимком цен
+
+        Args:
+            user_id: id Telegram-пользователя
+            watch_id: id подписки (None – все подписки пользователя)
 
-    str_params = (f'{param}="{value}"' for param, value in parameters.items())
-    result = ' AND '.join(str_params)
-    return result
+        Returns:
+            Количество удаленных подписок
+        """
+        sql, parameters = queries.delete_watches_query(user_id, watch_id)
+        connection = self.__connection
+        with connection:
+            deleted = connection.execute(sql, parameters).rowcount
+        connection.close()
+        return deleted
+
+    def select_watch_snapshot(self, watch_id: int) -> Dict[str, float]:
+        """
+        Получить цены отелей ниже порога при последней проверке подписки
+
+        Returns:
+            Словарь "id отеля – цена"
+        """
+        return dict(self.execute(queries.SELECT_WATCH_SNAPSHOT, parameters=(watch_id,), fetchall=True))
+
+    def save_watch_snapshot(self, watch_id: int, prices: Dict[str, float]) -> None:
+        """
+        Заменить снимок цен подписки
+
+        Args:
+            watch_id: id подписки
+            prices: словарь "id отеля – цена" для отелей ниже порога
+        """
+        self.execute_transaction(queries.watch_snapshot_commands(watch_id, prices))
@@ -0,0 +1,109 @@
+"""
+Асинхронная обертка над синхронным хранилищем
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Dict, List, Optional
+
+from .base import AsyncStorage, Storage
+
+
+class ThreadedStorage(AsyncStorage):
+    """
+    Асинхронное хранилище, выполняющее операции синхронного в пуле потоков
+
+    Позволяет использовать любую реализацию Storage из цикла событий, не
+    блокируя его.
+
+    Args:
+        storage: синхронное хранилище
+        max_workers: размер пула потоков
+    """
+
+    def __init__(self, storage: Storage, max_workers: int = 4):
+        """Конструктор класса"""
+        self.storage: Storage = storage
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='storage')
+
+    async def __call(self, method: str, *args, **kwargs) -> Any:
+        function = partial(getattr(self.storage, method), *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.__executor, function)
+
+    async def close(self) -> None:
+        self.__executor.shutdown(wait=True)
+        self.storage.close()
+
+    async def migrate(self) -> List[str]:
+        return await self.__call('migrate')
+
+    async def compact(self, max_rows_per_user: int, max_age_days: int) -> int:
+        return await self.__call('compact', max_rows_per_user, max_age_days)
+
+    async def add_user(self, user_id: int, username: str) -> None:
+        await self.__call('add_user', user_id, username)
+
+    async def select_from_users(self, **parameters) -> List[dict]:
+        return await self.__call('select_from_users', **parameters)
+
+    async def add_to_history(self,
+                             user_id: int,
+                             command: str,
+                             city: str,
+                             destination_id: Optional[str] = None,
+                             params: Optional[Dict[str, Any]] = None,
+                             results: Optional[List[Any]] = None,
+                             created_at: Optional[int] = None) -> None:
+        await self.__call('add_to_history', user_id, command, city, destination_id,
+                          params, results, created_at)
+
+    async def select_top_cities(self, limit: int = 10) -> List[dict]:
+        return await self.__call('select_top_cities', limit)
+
+    async def select_trending_cities(self, limit: int = 10) -> List[dict]:
+        return await self.__call('select_trending_cities', limit)
+
+    async def select_user_top_cities(self, user_id: int, limit: int = 5) -> List[dict]:
+        return await self.__call('select_user_top_cities', user_id, limit)
+
+    async def select_user_recent_cities(self, user_id: int, limit: int = 4) -> List[str]:
+        return await self.__call('select_user_recent_cities', user_id, limit)
+
+    async def select_user_top_commands(self, user_id: int, limit: int = 3) -> List[dict]:
+        return await self.__call('select_user_top_commands', user_id, limit)
+
+    async def select_from_history(self, **parameters) -> List[dict]:
+        return await self.__call('select_from_history', **parameters)
+
+    async def select_recent_history(self, user_id: int, limit: int = 20) -> List[dict]:
+        return await self.__call('select_recent_history', user_id, limit)
+
+    async def select_history_entry(self, user_id: int, entry_id: Optional[int] = None) -> Optional[dict]:
+        return await self.__call('select_history_entry', user_id, entry_id)
+
+    async def select_photo_file_ids(self, urls: List[str]) -> Dict[str, str]:
+        return await self.__call('select_photo_file_ids', urls)
+
+    async def save_photo_file_ids(self, file_ids: Dict[str, str]) -> None:
+        await self.__call('save_photo_file_ids', file_ids)
+
+    async def add_watch(self,
+                        user_id: int,
+                        command: str,
+                        city: str,
+                        destination_id: str,
+                        params: Dict[str, Any],
+                        threshold: int) -> int:
+        return await self.__call('add_watch', user_id, command, city, destination_id, params, threshold)
+
+    async def select_watches(self, user_id: Optional[int] = None) -> List[dict]:
+        return await self.__call('select_watches', user_id)
+
+    async def delete_watches(self, user_id: int, watch_id: Optional[int] = None) -> int:
+        return await self.__call('delete_watches', user_id, watch_id)
+
+    async def select_watch_snapshot(self, watch_id: int) -> Dict[str, float]:
+        return await self.__call('select_watch_snapshot', watch_id)
+
+    async def save_watch_snapshot(self, watch_id: int, prices: Dict[str, float]) -> None:
+        await self.__call('save_watch_snapshot', watch_id, prices)
@@ -0,0 +1,43 @@
+from time import monotonic
+
+
+class Deadline:
+    """
+    Крайний срок выполнения операции, общий для всех ее этапов
+
+    Каждый этап получает оставшееся время (или его долю, см. split), поэтому
+    медленный этап сокращает время следующих, а не увеличивает общую
+    длительность операции.
+
+    Args:
+        timeout: время на всю операцию в секундах
+    """
+
+    def __init__(self, timeout: float):
+        """Конструктор класса"""
+        self.expires_at: float = monotonic() + timeout
+
+    @property
+    def remaining(self) -> float:
+        """Оставшееся время в секундах (не меньше 0)"""
+        return max(self.expires_at - monotonic(), 0.0)
+
+    @property
+    def expired(self) -> bool:
+        """Истек ли срок"""
+        return monotonic() >= self.expires_at
+
+    def split(self, stages: int) -> 'Deadline':
+        """
+        Выделить срок для очередного из нескольких оставшихся этапов
+
+        Оставшееся время делится поровну между stages этапами; время,
+        не использованное этапом, достается следующим.
+
+        Args:
+            stages: количество оставшихся этапов, включая очередной
+
+        Returns:
+            Срок очередного этапа
+        """
+        return Deadline(self.remaining / max(stages, 1))
@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional
+
+
+class FanOutResult(NamedTuple):
+    """
+    Результат одного вызова FanOut.map
+
+    Attributes:
+        item: аргумент вызова
+        value: возвращенное значение (None при ошибке)
+        error: исключение, возникшее при вызове (None при успехе)
+    """
+    item: Any
+    value: Any
+    error: Optional[BaseException]
+
+
+class FanOut:
+    """
+    Параллельное выполнение однотипных вызовов в общем ограниченном пуле потоков
+
+    Пул общий для всех пользователей, поэтому одновременная рассылка
+    запросов от многих диалогов не создает больше max_workers обращений
+    к внешнему сервису. Вызовы, выполняемые в пуле, не должны сами
+    использовать тот же FanOut: это может привести к взаимной блокировке.
+
+    Args:
+        max_workers: максимальное количество одновременных вызовов
+        name: префикс имен потоков пула
+    """
+
+    def __init__(self, max_workers: int = 4, name: str = 'fan-out'):
+        """Конструктор класса"""
+        self.max_workers: int = max_workers
+        self.__executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+
+    def map(self, function: Callable[[Any], Any], items: Iterable[Any]) -> List[FanOutResult]:
+        """
+        Вызвать функцию для каждого элемента параллельно
+
+        Исключения не прерывают остальные вызовы, а возвращаются в результатах.
+        Вызовы выполняются в копии контекста вызывающего потока (например,
+        с контекстом журнала loguru).
+
+        Args:
+            function: вызываемая функция одного аргумента
+            items: аргументы вызовов
+
+        Returns:
+            Результаты в порядке элементов items
+        """
+        items = list(items)
+        futures = [self.__executor.submit(copy_context().run, function, item) for item in items]
+        results = []
+        for item, future in zip(items, futures):
+            try:
+                results.append(FanOutResult(item, future.result(), None))
+            except Exception as e:
+                results.append(FanOutResult(item, None, e))
+        return results
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Остановить пул потоков"""
+        self.__executor.shutdown(wait=wait)
@@ -0,0 +1,194 @@
+"""
+Настройка журнала бота
+
+Обработчик сообщения не форматирует и не выводит записи журнала сам: он
+только кладет запись в очередь (QueueSink), а форматирование в JSON и
+запись в поток вывода выполняет отдельный поток.
+
+Записи, сделанные во время поиска (см. traced), содержат его идентификатор
+search_id, по которому можно найти все записи одного поиска: команду, шаги
+диалога, запросы к API и отправку результатов. Обработчики команд
+привязывают идентификатор сразу (см. search_context), в том числе команд
+без поиска – каждая из них считается отдельным поиском. Записи поиска
+уровня INFO и ниже сохраняются для доли sample_rate поисков – целиком,
+чтобы сохраненные поиски можно было проследить от начала до конца. Записи
+уровня WARNING и выше сохраняются всегда.
+"""
+import json
+import queue
+import sys
+import threading
+import traceback
+import zlib
+from functools import wraps
+from typing import Any, Callable, ContextManager, Dict, Optional, TextIO
+from uuid import uuid4
+
+from loguru import logger
+
+# Уровень, начиная с которого записи сохраняются без выборки
+ALWAYS_KEPT_LEVEL = logger.level('WARNING').no
+
+
+class SearchSampler:
+    """
+    Фильтр записей журнала: выборка поисков
+
+    Решение принимается по search_id, поэтому все записи одного поиска
+    либо сохраняются, либо отбрасываются вместе.
+
+    Args:
+        rate: доля поисков, записи которых сохраняются (0..1)
+    """
+
+    def __init__(self, rate: float):
+        """Конструктор класса"""
+        self.threshold: int = int(max(0.0, min(rate, 1.0)) * 2 ** 32)
+
+    def __call__(self, record: Dict[str, Any]) -> bool:
+        search_id = record['extra'].get('search_id')
+        if search_id is None or record['level'].no >= ALWAYS_KEPT_LEVEL:
+            return True
+        return zlib.crc32(search_id.encode()) < self.threshold
+
+
+class QueueSink(threading.Thread):
+    """
+    Поток вывода записей журнала из очереди
+
+    loguru вызывает write в потоке, сделавшем запись, а stop – при удалении
+    обработчика (в том числе при завершении процесса): записи, оставшиеся
+    в очереди, выводятся до остановки потока. При переполнении очереди
+    записи ниже WARNING отбрасываются, а предупреждения и ошибки ждут
+    места в очереди.
+
+    Args:
+        stream: поток вывода
+        serialize: выводить записи в формате JSON (по одной на строку)
+        queue_size: максимальная длина очереди
+    """
+
+    def __init__(self, stream: TextIO, serialize: bool, queue_size: int = 10000):
+        """Конструктор класса"""
+        super().__init__(name='log-writer', daemon=True)
+        self.stream = stream
+        self.render: Callable[[Dict[str, Any]], str] = render_json if serialize else render_text
+        self.dropped: int = 0
+        self.__queue: queue.Queue = queue.Queue(maxsize=queue_size)
+
+    def write(self, message) -> None:
+        # loguru вызывает write под блокировкой обработчика, поэтому
+        # счетчик отброшенных записей изменяется одним потоком
+        record = message.record
+        if record['level'].no >= ALWAYS_KEPT_LEVEL:
+            self.__queue.put(record)
+            return
+        try:
+            self.__queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def run(self) -> None:
+        reported = 0
+        while True:
+            record = self.__queue.get()
+            if record is None:
+                return
+            lines = [self.render(record)]
+            if self.dropped > reported:
+                lines.append(f'Очередь журнала переполнена, отброшено записей: {self.dropped - reported}\n')
+                reported = self.dropped
+            try:
+                self.stream.write(''.join(lines))
+                self.stream.flush()
+            except Exception:
+                pass
+
+    def stop(self) -> None:
+        """Вывести записи, оставшиеся в очереди, и остановить поток"""
+        if self.is_alive():
+            self.__queue.put(None)
+            self.join()
+
+
+def format_exception(record: Dict[str, Any]) -> Optional[str]:
+    """Получить текст исключения записи или None, если исключения нет"""
+    if not record['exception']:
+        return None
+    return ''.join(traceback.format_exception(*record['exception']))
+
+
+def render_text(record: Dict[str, Any]) -> str:
+    """Отформатировать запись в виде строки текста"""
+    line = f'{record["time"]:%Y-%m-%d %H:%M:%S}.{record["time"].microsecond // 1000:03d} | ' \
+           f'{record["level"].name: <8} | {record["name"]}:{record["function"]}:{record["line"]} - ' \
+           f'{record["message"]}'
+    if 'search_id' in record['extra']:
+        line += f' | {record["extra"]["search_id"]}'
+    exception = format_exception(record)
+    return f'{line}\n{exception}' if exception else f'{line}\n'
+
+
+def render_json(record: Dict[str, Any]) -> str:
+    """Отформатировать запись в виде строки JSON"""
+    data = {'time': record['time'].isoformat(),
+            'level': record['level'].name,
+            'message': record['message'],
+            'name': record['name'],
+            'function': record['function'],
+            'line': record['line'],
+            'thread': record['thread'].name,
+            'extra': record['extra']}
+    exception = format_exception(record)
+    if exception:
+        data['exception'] = exception
+    return json.dumps(data, ensure_ascii=False, default=str) + '\n'
+
+
+def setup_logging(level: str = 'INFO',
+                  serialize: bool = True,
+                  sample_rate: float = 1.0,
+                  stream: TextIO = sys.stderr) -> None:
+    """
+    Заменить стандартный вывод журнала loguru выводом через QueueSink
+
+    Args:
+        level: минимальный уровень записей
+        serialize: выводить записи в формате JSON (по одной на строку)
+        sample_rate: доля поисков, записи которых уровня INFO и ниже сохраняются
+        stream: поток вывода
+    """
+    sink = QueueSink(stream, serialize)
+    sink.start()
+    logger.remove()
+    # Формат и исключение обрабатывает QueueSink, loguru передает только запись
+    logger.add(sink, level=level, format='{message}', filter=SearchSampler(sample_rate),
+               colorize=False, backtrace=False, diagnose=False)
+
+
+def traced(function: Callable) -> Callable:
+    """
+    Декоратор шагов поиска: привязать к записям журнала search_id
+
+    Идентификатор хранится в параметрах запроса (первый аргумент-словарь)
+    и создается при первом шаге, которому они переданы, поэтому у всех
+    последующих шагов того же поиска он одинаковый.
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        params: Optional[Dict[str, Any]] = next((arg for arg in (*args, *kwargs.values())
+                                                 if isinstance(arg, dict)), None)
+        if params is None:
+            return function(*args, **kwargs)
+        with search_context(params):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def search_context(params: Dict[str, Any]) -> ContextManager:
+    """
+    Привязать к записям журнала search_id поиска с параметрами params
+
+    Идентификатор создается и сохраняется в params, если его там еще нет.
+    """
+    return logger.contextualize(search_id=params.setdefault('search_id', uuid4().hex[:12]))
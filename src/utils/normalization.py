@@ -0,0 +1,94 @@
+import re
+from typing import NamedTuple, Optional
+
+_RU_PATTERN = re.compile(r'[а-яё]', re.IGNORECASE)
+_EN_PATTERN = re.compile(r'[a-z]', re.IGNORECASE)
+_SPACES_PATTERN = re.compile(r'\s+')
+_KEY_SEPARATORS_PATTERN = re.compile(r'[^0-9a-z]+')
+
+_TRANSLITERATION = str.maketrans({
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ё': 'e',
+    'ж': 'zh', 'з': 'z', 'и': 'i', 'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm',
+    'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's', 'т': 't', 'у': 'u',
+    'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'shch',
+    'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'iu', 'я': 'ia',
+})
+
+# Распространенные сокращения и альтернативные названия городов.
+# Ключи записываются в нижнем регистре, с "е" вместо "ё" и одиночными пробелами.
+# Сокращение заменяет весь ввод, а результат кэшируется под ключом города,
+# поэтому сюда добавляются только однозначные сокращения не короче трех
+# букв: "la", "ny" или "нн" пользователь может ввести, имея в виду другое
+CITY_ALIASES = {
+    'спб': 'Санкт-Петербург',
+    'питер': 'Санкт-Петербург',
+    'санкт петербург': 'Санкт-Петербург',
+    'с-петербург': 'Санкт-Петербург',
+    'мск': 'Москва',
+    'екб': 'Екатеринбург',
+    'нск': 'Новосибирск',
+    'н.новгород': 'Нижний Новгород',
+    'spb': 'Saint Petersburg',
+    'st petersburg': 'Saint Petersburg',
+    'st. petersburg': 'Saint Petersburg',
+    'msk': 'Moscow',
+    'nyc': 'New York',
+}
+
+
+class NormalizedCity(NamedTuple):
+    """
+    Нормализованное название города
+
+    Attributes:
+        text: название для запроса к API и отображения пользователю
+        key: канонический ключ (латиница, нижний регистр) для кэширования
+        locale: локаль названия ("ru_RU" или "en_US")
+    """
+    text: str
+    key: str
+    locale: str
+
+
+def detect_locale(string: str) -> Optional[str]:
+    """
+    Определить локаль текста строки
+
+    Args:
+        string: определяемая строка
+
+    Returns:
+        "ru_RU" для русского языка; "en_US" для английского языка;
+        None, если не удалось определить локаль
+    """
+    if _RU_PATTERN.search(string):
+        return 'ru_RU'
+    if _EN_PATTERN.search(string):
+        return 'en_US'
+    return None
+
+
+def normalize_city(string: str) -> Optional[NormalizedCity]:
+    """
+    Нормализовать введенное пользователем название города
+
+    Убирает лишние пробелы, заменяет "ё" на "е", раскрывает сокращения
+    из CITY_ALIASES и строит канонический ключ с транслитерацией
+    кириллицы, чтобы разные написания одного города давали один ключ.
+
+    Args:
+        string: название города в свободном формате
+
+    Returns:
+        Объект NormalizedCity или None, если не удалось определить локаль
+    """
+    text = _SPACES_PATTERN.sub(' ', string).strip().replace('ё', 'е').replace('Ё', 'Е')
+    text = CITY_ALIASES.get(text.lower(), text)
+
+    locale = detect_locale(text)
+    if locale is None:
+        return None
+
+    key = text.lower().translate(_TRANSLITERATION)
+    key = _KEY_SEPARATORS_PATTERN.sub(' ', key).strip()
+    return NormalizedCity(text=text, key=key, locale=locale)
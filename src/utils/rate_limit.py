@@ -0,0 +1,54 @@
+from threading import Lock
+from time import monotonic, sleep
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Потокобезопасный ограничитель частоты по алгоритму "ведро токенов"
+
+    Ведро пополняется со скоростью rate токенов в секунду и вмещает не
+    больше capacity токенов: кратковременный всплеск до capacity операций
+    проходит сразу, а средняя частота не превышает rate.
+
+    Args:
+        rate: скорость пополнения (токенов в секунду)
+        capacity: вместимость ведра (по умолчанию – rate, но не меньше 1)
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """Конструктор класса"""
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        self.rate: float = rate
+        self.capacity: float = capacity if capacity is not None else max(rate, 1.0)
+        self.__tokens: float = self.capacity
+        self.__updated_at: float = monotonic()
+        self.__lock = Lock()
+
+    def __refill(self) -> None:
+        now = monotonic()
+        self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated_at) * self.rate)
+        self.__updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """
+        Попытаться забрать токены без ожидания
+
+        Returns:
+            0, если токены получены, иначе время (сек.), через которое они появятся
+        """
+        with self.__lock:
+            self.__refill()
+            if self.__tokens >= tokens:
+                self.__tokens -= tokens
+                return 0.0
+            return (tokens - self.__tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Забрать токены, при необходимости дождавшись их появления"""
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return
+            sleep(wait)
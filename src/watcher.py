@@ -0,0 +1,258 @@
+"""
+Проверка подписок на снижение цен (/watch)
+
+WatchScheduler периодически проверяет все подписки. Подписки
+группируются по параметрам запроса к API – городу, типу поиска, датам,
+количеству гостей и локали, – и для каждой группы выполняется один
+запрос properties/list, сколько бы пользователей ни подписалось на этот
+поиск. Поэтому количество запросов растет с количеством разных городов,
+а не подписчиков.
+
+Для /bestdeal отели запрашиваются по страницам в порядке удаленности от
+центра, пока не будет пройдено самое большое расстояние среди подписок
+группы, но не больше WATCH_MAX_PAGES страниц. Каждая подписка учитывает
+только отели из своих диапазонов цены и расстояния.
+
+Найденные цены сравниваются со снимком цен подписки в базе данных:
+уведомление отправляется об отелях, которые стали дешевле порога или
+подешевели еще сильнее с прошлой проверки.
+
+Подписки на поиск с конкретными датами удаляются, когда дата заезда
+прошла, а пользователь получает об этом уведомление.
+"""
+import threading
+from collections import defaultdict
+from datetime import date
+from html import escape
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import requests
+from loguru import logger
+
+from src.botrequests import CircuitOpen, HotelsRequester, hotel_price
+from src.handlers.processes.cards import center_distance_km, parse_hotel, render_card
+from src.handlers.processes.stay import stay_expired, stay_windows
+from src.notifications import NotificationSender
+from src.utils.db_api import Storage
+
+# Максимальный размер страницы properties/list
+WATCH_PAGE_SIZE = 25
+# Сколько страниц /bestdeal запрашивать для группы подписок за одну проверку
+WATCH_MAX_PAGES = 4
+# Сколько отелей показывать в одном уведомлении
+NOTIFY_HOTELS_LIMIT = 3
+
+
+class WatchGroup(NamedTuple):
+    """Параметры запроса к API, общие для группы подписок"""
+    destination_id: str
+    command: str
+    check_in: date
+    check_out: date
+    adults: int
+    locale: str
+
+
+def watch_group(watch: Dict[str, Any]) -> WatchGroup:
+    """
+    Получить группу подписки
+
+    В режиме самых дешевых дат проверяется только первое окно дат.
+    """
+    params = watch['params']
+    check_in, check_out = stay_windows(params)[0]
+    return WatchGroup(destination_id=watch['destination_id'],
+                      command=watch['command'],
+                      check_in=check_in,
+                      check_out=check_out,
+                      adults=params.get('adults', 1),
+                      locale=params.get('locale', 'ru_RU'))
+
+
+def matching_prices(watch: Dict[str, Any], hotels: List[Dict[str, Any]]) -> Dict[str, float]:
+    """
+    Отобрать отели, подходящие подписке, с ценой ниже порога
+
+    Returns:
+        Словарь "id отеля – цена"
+    """
+    params = watch['params']
+    prices = {}
+    for hotel in hotels:
+        price = hotel_price(hotel)
+        if price >= watch['threshold']:
+            continue
+        if watch['command'] == 'bestdeal':
+            if not params['min_price'] <= price <= params['max_price']:
+                continue
+            distance = center_distance_km(hotel)
+            if distance is None or not params['min_dist'] <= distance <= params['max_dist']:
+                continue
+        prices[str(hotel['id'])] = price
+    return prices
+
+
+def price_drops(snapshot: Dict[str, float], prices: Dict[str, float]) -> List[str]:
+    """Получить id отелей, которых не было в снимке или которые подешевели"""
+    return [hotel_id for hotel_id, price in prices.items() if price < snapshot.get(hotel_id, float('inf'))]
+
+
+def expired_text(watch: Dict[str, Any]) -> str:
+    """Сформировать текст уведомления об удалении подписки с прошедшими датами"""
+    params = watch['params']
+    check_in, check_out = date.fromisoformat(params['check_in']), date.fromisoformat(params['check_out'])
+    return f'Даты поиска /{watch["command"]} – {escape(watch["city"])}, ' \
+           f'{check_in:%d.%m}–{check_out:%d.%m} – уже прошли, подписка отменена.\n' \
+           f'Выполни поиск на новые даты и отправь <code>/watch &lt;цена&gt;</code>'
+
+
+def notification_text(watch: Dict[str, Any], group: WatchGroup, hotels: List[Dict[str, Any]]) -> str:
+    """Сформировать текст уведомления об отелях, подешевевших ниже порога"""
+    stay = {'checkIn': group.check_in.isoformat(), 'checkOut': group.check_out.isoformat()}
+    hotels = sorted(hotels, key=hotel_price)
+    cards = [render_card(parse_hotel(dict(hotel, stay=stay)), group.locale)
+             for hotel in hotels[:NOTIFY_HOTELS_LIMIT]]
+
+    header = f'📉 <b>{escape(watch["city"])}</b>: нашлись отели дешевле {watch["threshold"]} RUB за ночь'
+    footer = f'Отменить подписку: /unwatch_{watch["id"]}'
+    if len(hotels) > NOTIFY_HOTELS_LIMIT:
+        footer = f'И еще отелей: {len(hotels) - NOTIFY_HOTELS_LIMIT}\n{footer}'
+    return '\n\n'.join((header, *cards, footer))
+
+
+class WatchScheduler(threading.Thread):
+    """
+    Поток периодической проверки подписок
+
+    Args:
+        database: хранилище подписок и снимков цен
+        requester: клиент Hotels API
+        sender: очередь отправки уведомлений
+        interval: интервал между проверками в секундах
+    """
+
+    def __init__(self,
+                 database: Storage,
+                 requester: HotelsRequester,
+                 sender: NotificationSender,
+                 interval: float):
+        """Конструктор класса"""
+        super().__init__(name='watch-scheduler', daemon=True)
+        self.database = database
+        self.requester = requester
+        self.sender = sender
+        self.interval = interval
+        self.__stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.__stopped.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error('Ошибка проверки подписок: {}', e)
+
+    def run_once(self) -> Dict[str, int]:
+        """
+        Проверить все подписки
+
+        Returns:
+            Количество подписок, удаленных подписок с прошедшими датами,
+            запросов к API, ошибок запросов и уведомлений
+        """
+        groups: Dict[WatchGroup, List[Dict[str, Any]]] = defaultdict(list)
+        watches = self.database.select_watches()
+        stats = {'watches': len(watches), 'expired': 0, 'requests': 0, 'errors': 0, 'notifications': 0}
+        for watch in watches:
+            if stay_expired(watch['params']):
+                stats['expired'] += self.expire(watch)
+                continue
+            groups[watch_group(watch)].append(watch)
+
+        for group, members in groups.items():
+            if self.__stopped.is_set():
+                break
+            try:
+                hotels, requests_count = self.fetch(group, members)
+            except (CircuitOpen, requests.RequestException) as e:
+                stats['requests'] += 1
+                stats['errors'] += 1
+                logger.warning('Не удалось проверить подписки на {}: {}', group.destination_id, e)
+                continue
+            stats['requests'] += requests_count
+            for watch in members:
+                stats['notifications'] += self.check(watch, group, hotels)
+
+        logger.info('Проверка подписок: подписок {watches}, истекших {expired}, запросов {requests}, '
+                    'ошибок {errors}, уведомлений {notifications}', **stats)
+        return stats
+
+    def fetch(self, group: WatchGroup, members: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Запросить отели для группы подписок
+
+        Для /bestdeal запрашивается объединение ценовых диапазонов всех
+        подписок группы. Страницы, отсортированные по удаленности от
+        центра, запрашиваются, пока последний отель страницы не окажется
+        дальше самого большого max_dist группы, результаты не закончатся
+        или не будет достигнут WATCH_MAX_PAGES. Диапазоны цены и расстояния
+        каждой подписки применяются при сравнении (см. matching_prices).
+
+        Returns:
+            Отели и количество выполненных запросов к API
+        """
+        stay = dict(check_in=group.check_in, check_out=group.check_out, adults=group.adults, locale=group.locale)
+        if group.command != 'bestdeal':
+            return self.requester.request_by_price('low', group.destination_id, WATCH_PAGE_SIZE, **stay), 1
+
+        max_dist = max(watch['params']['max_dist'] for watch in members)
+        hotels: List[Dict[str, Any]] = []
+        for page in range(1, WATCH_MAX_PAGES + 1):
+            results = self.requester.request_bestdeal(
+                destination_id=group.destination_id,
+                count=WATCH_PAGE_SIZE,
+                min_price=min(watch['params']['min_price'] for watch in members),
+                max_price=max(watch['params']['max_price'] for watch in members),
+                page=page,
+                **stay
+            )
+            hotels.extend(results)
+            if len(results) < WATCH_PAGE_SIZE:
+                return hotels, page
+            distance = center_distance_km(results[-1])
+            if distance is None or distance > max_dist:
+                return hotels, page
+        return hotels, WATCH_MAX_PAGES
+
+    def check(self, watch: Dict[str, Any], group: WatchGroup, hotels: List[Dict[str, Any]]) -> bool:
+        """
+        Сравнить цены подписки со снимком и поставить уведомление в очередь
+
+        Returns:
+            True, если уведомление поставлено в очередь
+        """
+        prices = matching_prices(watch, hotels)
+        snapshot = self.database.select_watch_snapshot(watch['id'])
+        drops = set(price_drops(snapshot, prices))
+        if prices != snapshot:
+            self.database.save_watch_snapshot(watch['id'], prices)
+        if not drops:
+            return False
+        dropped_hotels = [hotel for hotel in hotels if str(hotel['id']) in drops]
+        return self.sender.notify(watch['user_id'], notification_text(watch, group, dropped_hotels))
+
+    def expire(self, watch: Dict[str, Any]) -> bool:
+        """
+        Удалить подписку с прошедшей датой заезда и уведомить пользователя
+
+        Returns:
+            True, если подписка удалена
+        """
+        if not self.database.delete_watches(watch['user_id'], watch['id']):
+            return False
+        logger.info('Подписка {} удалена: даты поиска прошли', watch['id'])
+        self.sender.notify(watch['user_id'], expired_text(watch))
+        return True
+
+    def stop(self) -> None:
+        """Остановить поток после проверки текущей группы"""
+        self.__stopped.set()
@@ -0,0 +1,178 @@
+"""
+Общий сценарий совместимости реализаций хранилища
+
+Каждая реализация выполняет один и тот же сценарий (миграции,
+пользователи, история, статистика, кэш file_id, политика хранения,
+подписки), а его результаты должны совпадать между реализациями.
+Сценарий используют тесты (tests.test_storage) и нагрузочное сравнение
+реализаций (loadtest.storage_benchmark).
+
+Реализации:
+    sqlite-blocking – Database, вызываемая прямо из цикла событий
+    sqlite-threaded – Database в пуле потоков (ThreadedStorage)
+    aiosqlite       – AsyncDatabase (требуется пакет aiosqlite)
+"""
+from typing import Any, Callable, Dict
+
+from src.utils.db_api import AsyncDatabase, AsyncStorage, Database, ThreadedStorage
+from src.utils.db_api.migrations import MIGRATIONS
+
+CITIES = ('Москва', 'Казань', 'Paris', 'Rome')
+
+
+class BlockingStorage:
+    """Синхронное хранилище, методы которого выполняются прямо в цикле событий"""
+
+    def __init__(self, storage: Database):
+        """Конструктор класса"""
+        self.storage = storage
+
+    async def __aenter__(self) -> 'BlockingStorage':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.storage.close()
+
+    def __getattr__(self, name: str) -> Callable:
+        method = getattr(self.storage, name)
+
+        async def call(*args, **kwargs):
+            return method(*args, **kwargs)
+        return call
+
+
+BACKENDS: Dict[str, Callable[[str], Any]] = {
+    'sqlite-blocking': lambda path: BlockingStorage(Database(path)),
+    'sqlite-threaded': lambda path: ThreadedStorage(Database(path)),
+    'aiosqlite': AsyncDatabase,
+}
+
+
+class ConformanceError(Exception):
+    """Реализация хранилища ведет себя не так, как ожидается"""
+
+
+def expect(condition: bool, description: str) -> None:
+    if not condition:
+        raise ConformanceError(description)
+
+
+async def expect_raises(exception: type, coroutine, description: str) -> None:
+    try:
+        await coroutine
+    except exception:
+        return
+    raise ConformanceError(description)
+
+
+async def check_conformance(storage: AsyncStorage) -> Dict[str, Any]:
+    """
+    Выполнить сценарий проверки на пустом хранилище
+
+    Returns:
+        Результаты операций для сравнения с другими реализациями
+
+    Raises:
+        ConformanceError: если результат операции не соответствует ожидаемому
+    """
+    results: Dict[str, Any] = {}
+
+    applied = await storage.migrate()
+    expect(len(applied) == len(MIGRATIONS), 'migrate() must apply all migrations to a new database')
+    expect(await storage.migrate() == [], 'migrate() must be idempotent')
+
+    await storage.add_user(1, 'first')
+    await storage.add_user(1, 'renamed')
+    await storage.add_user(2, 'second')
+    results['users'] = await storage.select_from_users(id=1)
+    expect(results['users'] == [{'id': 1, 'username': 'renamed'}], 'add_user() must replace user')
+
+    await expect_raises(ValueError, storage.add_to_history(1, 'unknown', 'Москва'),
+                        'add_to_history() must reject unknown commands')
+    await expect_raises(TypeError, storage.add_to_history('1', 'lowprice', 'Москва'),
+                        'add_to_history() must reject invalid types')
+
+    for number, city in enumerate(CITIES * 2 + CITIES[:1]):
+        await storage.add_to_history(1, ('lowprice', 'highprice', 'bestdeal')[number % 3], city,
+                                     destination_id=str(1000 + number),
+                                     params={'count': number, 'city': city},
+                                     results=[{'id': number, 'name': f'Отель {number}'}],
+                                     created_at=1_000_000 + number)
+    await storage.add_to_history(2, 'lowprice', 'Paris', created_at=1_000_100)
+
+    history = await storage.select_from_history(user_id=1)
+    results['history'] = history
+    expect(len(history) == len(CITIES) * 2 + 1, 'select_from_history() must return all user entries')
+    recent = await storage.select_recent_history(1, limit=3)
+    results['recent'] = recent
+    expect(recent == history[-3:], 'select_recent_history() must return the latest entries in creation order')
+
+    latest = await storage.select_history_entry(1)
+    results['latest'] = latest
+    expect(latest['params'] == {'count': 8, 'city': 'Москва'} and latest['results'][0]['id'] == 8,
+           'select_history_entry() must decode params and results of the latest entry')
+    first = await storage.select_history_entry(1, history[0]['id'])
+    expect(first['city'] == CITIES[0], 'select_history_entry() must find entry by id')
+    expect(await storage.select_history_entry(2, history[0]['id']) is None,
+           'select_history_entry() must not return entries of other users')
+    expect((await storage.select_history_entry(2))['params'] is None,
+           'select_history_entry() must return None params when they were not saved')
+
+    results['top_cities'] = await storage.select_top_cities(limit=2)
+    expect(results['top_cities'][0] == {'city': 'Москва', 'count': 3}, 'select_top_cities() order')
+    results['trending_cities'] = await storage.select_trending_cities(limit=2)
+    expect(results['trending_cities'] == results['top_cities'],
+           'select_trending_cities() must count today\'s searches')
+    results['user_top_cities'] = await storage.select_user_top_cities(2)
+    expect(results['user_top_cities'] == [{'city': 'Paris', 'count': 1}], 'select_user_top_cities()')
+    results['user_top_commands'] = await storage.select_user_top_commands(1)
+    expect(results['user_top_commands'][0] == {'command': 'lowprice', 'count': 3},
+           'select_user_top_commands() order')
+
+    expect(await storage.select_photo_file_ids([]) == {}, 'select_photo_file_ids([]) must be empty')
+    await storage.save_photo_file_ids({'https://a': 'file-a', 'https://b': 'file-b'})
+    await storage.save_photo_file_ids({'https://b': 'file-b2'})
+    results['file_ids'] = await storage.select_photo_file_ids(['https://a', 'https://b', 'https://c'])
+    expect(results['file_ids'] == {'https://a': 'file-a', 'https://b': 'file-b2'},
+           'select_photo_file_ids() must return saved file_ids')
+
+    results['deleted'] = await storage.compact(max_rows_per_user=3, max_age_days=365 * 100)
+    expect(results['deleted'] == len(CITIES) * 2 + 1 - 3, 'compact() must keep max_rows_per_user entries')
+    remaining = await storage.select_from_history(user_id=1)
+    expect([elem['id'] for elem in remaining] == [elem['id'] for elem in history[-3:]],
+           'compact() must keep the latest entries')
+    expect(await storage.compact(max_rows_per_user=3, max_age_days=1) == 4,
+           'compact() must delete entries older than max_age_days')
+    expect((await storage.select_top_cities(limit=1))[0]['count'] == 3,
+           'compact() must not change aggregated counters')
+
+    await storage.add_to_history(3, 'compare', 'Казань, Rome', destination_id='1002,1003')
+    results['compare_cities'] = sorted(elem['city'] for elem in await storage.select_user_top_cities(3))
+    expect(results['compare_cities'] == ['Rome', 'Казань'],
+           'add_to_history() must count every city of a multi-city search')
+    await storage.add_to_history(3, 'lowprice', 'Paris')
+    await storage.add_to_history(3, 'lowprice', 'Rome')
+    await storage.add_to_history(3, 'bestdeal', 'Paris')
+    results['recent_cities'] = await storage.select_user_recent_cities(3, limit=3)
+    expect(results['recent_cities'] == ['Paris', 'Rome'],
+           'select_user_recent_cities() must return distinct cities, latest first, without comparisons')
+
+    await expect_raises(ValueError, storage.add_watch(1, 'highprice', 'Paris', '1001', {}, 1000),
+                        'add_watch() must reject commands without watch support')
+    first_watch = await storage.add_watch(1, 'lowprice', 'Москва', '1000', {'locale': 'ru_RU'}, 3000)
+    second_watch = await storage.add_watch(1, 'bestdeal', 'Paris', '1001', {'min_price': 0}, 5000)
+    await storage.add_watch(2, 'lowprice', 'Москва', '1000', {'locale': 'ru_RU'}, 2000)
+    results['watches'] = [dict(elem, created_at=None) for elem in await storage.select_watches()]
+    expect([elem['id'] for elem in await storage.select_watches(1)] == [first_watch, second_watch],
+           'select_watches() must return user watches in creation order')
+    expect(results['watches'][0]['params'] == {'locale': 'ru_RU'}, 'select_watches() must decode params')
+
+    await storage.save_watch_snapshot(first_watch, {'1': 2500.0, '2': 2900.0})
+    await storage.save_watch_snapshot(first_watch, {'2': 2800.0})
+    results['snapshot'] = await storage.select_watch_snapshot(first_watch)
+    expect(results['snapshot'] == {'2': 2800.0}, 'save_watch_snapshot() must replace the snapshot')
+    expect(await storage.delete_watches(2, first_watch) == 0, 'delete_watches() must not delete watches of others')
+    expect(await storage.delete_watches(1, first_watch) == 1, 'delete_watches() must delete one watch by id')
+    expect(await storage.select_watch_snapshot(first_watch) == {}, 'delete_watches() must delete snapshots')
+    expect(await storage.delete_watches(1) == 1, 'delete_watches() must delete all user watches')
+    return results
@@ -0,0 +1,32 @@
+"""
+Тесты автоматического выключателя
+
+Пример:
+    python -m unittest tests.test_circuit_breaker
+"""
+import time
+import unittest
+
+from src.botrequests.circuit_breaker import HALF_OPEN, OPEN, CircuitBreaker
+
+
+class OpenStateTest(unittest.TestCase):
+    """Результаты запросов, завершившихся в разомкнутом состоянии"""
+
+    def setUp(self) -> None:
+        self.breaker = CircuitBreaker('test', min_calls=2, reset_timeout=0.2, half_open_calls=1)
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.on_failure(0.1)
+
+    def test_late_results_do_not_extend_open_period(self) -> None:
+        self.assertEqual(self.breaker.state, OPEN)
+        time.sleep(0.15)
+        for _ in range(3):
+            self.breaker.on_failure(0.1)
+        time.sleep(0.1)
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+"""
+Тесты нормализации названий городов
+
+Пример:
+    python -m unittest tests.test_normalization
+"""
+import unittest
+
+from src.utils.normalization import CITY_ALIASES, normalize_city
+
+
+class CityAliasesTest(unittest.TestCase):
+    """Сокращения названий городов"""
+
+    def test_alias_expands(self) -> None:
+        self.assertEqual(normalize_city('  СПб ').text, 'Санкт-Петербург')
+        self.assertEqual(normalize_city('Питер').key, normalize_city('санкт петербург').key)
+
+    def test_short_input_is_kept(self) -> None:
+        for text in ('la', 'ny', 'нн'):
+            with self.subTest(text=text):
+                self.assertEqual(normalize_city(text).text, text)
+
+    def test_aliases_are_not_too_short(self) -> None:
+        self.assertEqual([alias for alias in CITY_ALIASES if len(alias) < 3], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
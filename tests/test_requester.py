@@ -0,0 +1,73 @@
+"""
+Тесты учета запросов к Hotels API автоматическим выключателем
+
+Пример:
+    python -m unittest tests.test_requester
+"""
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from src.botrequests import CircuitOpen, DeadlineExceeded, HotelsRequester
+from src.botrequests.circuit_breaker import OPEN
+from src.utils.deadline import Deadline
+
+# Время (сек.), в течение которого зависший эндпоинт не отвечает
+HANG_TIME = 1.0
+
+
+class HungHandler(BaseHTTPRequestHandler):
+    """Эндпоинт, который принимает соединение, но не отвечает"""
+
+    def do_GET(self) -> None:
+        time.sleep(HANG_TIME)
+        try:
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b'{}')
+        except OSError:
+            pass
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class DeadlineTimeoutTest(unittest.TestCase):
+    """Таймауты, сокращенные крайним сроком поиска"""
+
+    def setUp(self) -> None:
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), HungHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.requester = HotelsRequester('test', f'http://127.0.0.1:{self.server.server_port}',
+                                         min_calls=3, slow_call_duration=0.2, reset_timeout=60)
+
+    def tearDown(self) -> None:
+        self.requester.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def state(self, endpoint: str) -> str:
+        return next(circuit['state'] for circuit in self.requester.circuit_states()
+                    if circuit['name'] == endpoint)
+
+    def test_hung_endpoint_opens_breaker(self) -> None:
+        endpoint = 'properties/list'
+        for _ in range(3):
+            with self.assertRaises(DeadlineExceeded):
+                self.requester.make_request(endpoint, {}, Deadline(0.4))
+        self.assertEqual(self.state(endpoint), OPEN)
+        with self.assertRaises(CircuitOpen):
+            self.requester.make_request(endpoint, {}, Deadline(0.4))
+
+    def test_short_deadline_is_not_counted(self) -> None:
+        endpoint = 'properties/list'
+        for _ in range(3):
+            with self.assertRaises(DeadlineExceeded):
+                self.requester.make_request(endpoint, {}, Deadline(0.15))
+        self.assertNotEqual(self.state(endpoint), OPEN)
+
+
+if __name__ == '__main__':
+    unittest.main()
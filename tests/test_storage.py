@@ -0,0 +1,114 @@
+"""
+Тесты реализаций хранилища
+
+Каждая реализация проходит общий сценарий совместимости из
+tests.storage_conformance, а его результаты должны совпадать между
+реализациями. Тесты AsyncDatabase пропускаются, если пакет aiosqlite не
+установлен.
+
+Пример:
+    python -m unittest discover tests
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from src.utils.db_api import Database
+from src.utils.db_api import aiosqlite_backend
+from tests.storage_conformance import BACKENDS, ConformanceError, check_conformance
+
+
+class StorageConformanceTest(unittest.IsolatedAsyncioTestCase):
+    """Сценарий совместимости на каждой реализации хранилища"""
+
+    async def run_scenario(self, name: str) -> dict:
+        if name == 'aiosqlite' and aiosqlite_backend.aiosqlite is None:
+            self.skipTest('aiosqlite is not installed')
+        with tempfile.TemporaryDirectory() as directory:
+            async with BACKENDS[name](os.path.join(directory, 'test.db')) as storage:
+                try:
+                    return await check_conformance(storage)
+                except ConformanceError as e:
+                    self.fail(f'{name}: {e}')
+
+    async def test_sqlite_blocking(self) -> None:
+        await self.run_scenario('sqlite-blocking')
+
+    async def test_sqlite_threaded(self) -> None:
+        await self.run_scenario('sqlite-threaded')
+
+    async def test_aiosqlite(self) -> None:
+        await self.run_scenario('aiosqlite')
+
+    async def test_backends_agree(self) -> None:
+        reference = await self.run_scenario('sqlite-blocking')
+        for name in ('sqlite-threaded', 'aiosqlite'):
+            with self.subTest(backend=name):
+                self.assertEqual(await self.run_scenario(name), reference)
+
+
+class PhotoFileIdsTest(unittest.TestCase):
+    """Кэш file_id фотографий обновляется только при обслуживании базы"""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.db')
+        self.database = Database(self.path)
+        self.database.migrate()
+
+    def tearDown(self) -> None:
+        self.database.close()
+        self.directory.cleanup()
+
+    def last_used(self, url: str) -> int:
+        connection = sqlite3.connect(self.path)
+        try:
+            return connection.execute('SELECT last_used FROM photo_file_ids WHERE url = ?', (url,)).fetchone()[0]
+        finally:
+            connection.close()
+
+    def test_select_is_read_only_until_compact(self) -> None:
+        self.database.save_photo_file_ids({'https://a': 'file-a'})
+        connection = sqlite3.connect(self.path)
+        connection.execute('UPDATE photo_file_ids SET last_used = 0')
+        connection.commit()
+        connection.close()
+
+        self.assertEqual(self.database.select_photo_file_ids(['https://a', 'https://b']), {'https://a': 'file-a'})
+        self.assertEqual(self.last_used('https://a'), 0)
+
+        self.database.compact(max_rows_per_user=10, max_age_days=1)
+        self.assertGreater(self.last_used('https://a'), 0)
+
+
+class TrendingCitiesTest(unittest.TestCase):
+    """Счетчики популярных городов за последние TRENDING_DAYS дней"""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'test.db')
+        self.database = Database(self.path)
+        self.database.migrate()
+
+    def tearDown(self) -> None:
+        self.database.close()
+        self.directory.cleanup()
+
+    def test_days_out_of_period_expire_on_compact(self) -> None:
+        for city in ('Москва', 'Москва', 'Казань'):
+            self.database.add_to_history(user_id=1, command='lowprice', city=city)
+        connection = sqlite3.connect(self.path)
+        connection.execute("UPDATE stats_city_daily SET day = '2000-01-01' WHERE city = 'Москва'")
+        connection.commit()
+        connection.close()
+
+        self.assertEqual([elem['city'] for elem in self.database.select_trending_cities()], ['Москва', 'Казань'])
+        self.database.compact(max_rows_per_user=10, max_age_days=1)
+        self.assertEqual(self.database.select_trending_cities(), [{'city': 'Казань', 'count': 1}])
+        self.database.compact(max_rows_per_user=10, max_age_days=1)
+        self.assertEqual(self.database.select_trending_cities(), [{'city': 'Казань', 'count': 1}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+"""
+Тесты проверки подписок на снижение цен
+
+Пример:
+    python -m unittest tests.test_watcher
+"""
+import os
+import tempfile
+import unittest
+from datetime import date, timedelta
+from typing import Any, Dict, List, Tuple
+
+from src.utils.db_api import Database
+from src.watcher import WatchScheduler
+
+HOTEL = {'id': 1,
+         'name': 'Hotel',
+         'address': {'streetAddress': 'Тверская, 1', 'locality': 'Москва', 'countryName': 'Россия'},
+         'landmarks': [{'label': 'Центр города', 'distance': '1,2 км'}],
+         'ratePlan': {'price': {'current': '1 000 RUB', 'exactCurrent': 1000}}}
+
+
+class FakeRequester:
+    """Клиент Hotels API, возвращающий один отель и запоминающий запросы"""
+
+    def __init__(self):
+        self.calls: List[Dict[str, Any]] = []
+
+    def request_by_price(self, sort_order: str, destination_id: str, count: int, **stay) -> List[Dict[str, Any]]:
+        self.calls.append(dict(stay, destination_id=destination_id))
+        return [HOTEL]
+
+
+class FakeSender:
+    """Очередь уведомлений, запоминающая уведомления"""
+
+    def __init__(self):
+        self.notifications: List[Tuple[int, str]] = []
+
+    def notify(self, chat_id: int, text: str) -> bool:
+        self.notifications.append((chat_id, text))
+        return True
+
+
+class ExpiredWatchTest(unittest.TestCase):
+    """Подписки на поиск с прошедшими датами"""
+
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.database = Database(os.path.join(self.directory.name, 'test.db'))
+        self.database.migrate()
+        self.requester = FakeRequester()
+        self.sender = FakeSender()
+        self.scheduler = WatchScheduler(self.database, self.requester, self.sender, interval=60)
+
+    def tearDown(self) -> None:
+        self.database.close()
+        self.directory.cleanup()
+
+    def add_watch(self, user_id: int, check_in: date, flexible: bool = False) -> int:
+        params = {'check_in': check_in.isoformat(),
+                  'check_out': (check_in + timedelta(days=3)).isoformat(),
+                  'flexible': flexible,
+                  'hotels_count': 5}
+        return self.database.add_watch(user_id=user_id, command='lowprice', city='Москва',
+                                       destination_id='1153093', params=params, threshold=5000)
+
+    def test_past_fixed_dates_expire(self) -> None:
+        today = date.today()
+        self.add_watch(1, today - timedelta(days=2))
+        active_id = self.add_watch(2, today + timedelta(days=10))
+
+        stats = self.scheduler.run_once()
+
+        self.assertEqual(stats['expired'], 1)
+        self.assertEqual([watch['id'] for watch in self.database.select_watches()], [active_id])
+        self.assertEqual([call['check_in'] for call in self.requester.calls], [today + timedelta(days=10)])
+        self.assertEqual([chat_id for chat_id, _ in self.sender.notifications], [1, 2])
+        self.assertIn('подписка отменена', self.sender.notifications[0][1])
+
+    def test_flexible_dates_do_not_expire(self) -> None:
+        self.add_watch(1, date.today() - timedelta(days=2), flexible=True)
+
+        stats = self.scheduler.run_once()
+
+        self.assertEqual(stats['expired'], 0)
+        self.assertEqual(len(self.database.select_watches()), 1)
+        self.assertEqual([call['check_in'] for call in self.requester.calls], [date.today()])
+
+
+if __name__ == '__main__':
+    unittest.main()